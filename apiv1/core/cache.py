@@ -1,62 +1,271 @@
 # Cache Decorator
 import json
-from typing import List
+import logging
+import time
+import uuid
+from typing import Callable, Iterable, List
 
-from django.db import models
+import redis
+from django.db import models, transaction
 from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from rest_framework import status
 from rest_framework.renderers import JSONRenderer
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from apiv1.core.constants import REDIS_CACHE_TAG, REDIS_CACHE_METRICS, REDIS_CACHE_TAG_TTL
 from apiv1.core.utils import serialize_response_into_str_dict
 from reef.settings import redis_connect, REEF_USE_CACHE
 
+logger = logging.getLogger(__name__)
+
 json_render = JSONRenderer()
 
+CACHE_FIELDS = ["data", "content_type", "status", "headers"]
+# 等待其它请求重新计算缓存时，读取缓存的间隔
+CACHE_LOCK_POLL_INTERVAL = 0.05
+
 
 def cache_dcr(key_leading: str = "cache", ttl_in_second: int = 86400 * 7,
-              ignore: List[str] = None):
+              ignore: List[str] = None, tags: Callable[[Request], Iterable[str]] = None,
+              stale_while_revalidate: int = 0, refresh_func: Callable[[dict], dict] = None,
+              lock_timeout: int = 30, lock_wait: float = 3):
     """
     緩存裝飾器，會以request.query_param的内容作爲緩存key
     裝飾器會忽略ignore内的query param, 將其視爲對輸出結果沒有影響的參數
+    tags 根据request返回该缓存所依赖的tag(见cache_tag)，写入缓存时记录各tag的版本，
+    读取时版本不一致(数据写入时经invalidate_cache更新了tag)即视为失效，因此可以使用较长的ttl
+
+    缓存失效时以redis锁(lock_timeout秒后自动释放)保证同一个key只有一个请求重新计算，
+    其它请求直接返回旧缓存，没有旧缓存时最多等待lock_wait秒取得重新计算的结果
+    stale_while_revalidate 大于0时，缓存失效后仍保留stale_while_revalidate秒，期间的请求直接返回旧缓存，
+    由celery任务在后台以refresh_func(模块层级的函数，以query_params为参数回传接口数据)重新计算
     """
     if ignore is None:
         ignore = []
+    assert not stale_while_revalidate or refresh_func is not None, (
+        'stale_while_revalidate requires refresh_func'
+    )
+    refresh_func_path = f'{refresh_func.__module__}.{refresh_func.__qualname__}' if refresh_func else None
+    # tag版本的有效期需长于缓存，避免tag过期后缓存被误判为有效
+    ttl_in_second = min(ttl_in_second, REDIS_CACHE_TAG_TTL - stale_while_revalidate)
 
     def decorator(func):
         if not REEF_USE_CACHE:
             return func
 
+        def compute(self: APIView, request: Request, cache_key: str, tag_versions: dict) -> Response:
+            ret: Response = func(self, request)
+            ret = self.finalize_response(request, response=ret)
+            _write_cache(cache_key, serialize_response_into_str_dict(ret), tag_versions,
+                         ttl_in_second, stale_while_revalidate)
+            return ret
+
         def wrapper(self: APIView, request: Request):
             # request.query_params QueryDict 类型数据在cython 编译后会报错，转为dict type
             cache_key = prepare_cache_key(key_leading, request.query_params, ignore)
+            lock_key = f'{cache_key}:lock'
+            tag_keys = [f'{REDIS_CACHE_TAG}:{tag}' for tag in tags(request)] if tags is not None else []
 
-            result: List = redis_connect.hmget(cache_key, ["data", "content_type", "status", "headers"])
+            cached, fresh, tag_versions = _read_cache(cache_key, tag_keys)
+            if fresh:  # hit
+                _incr_cache_metrics(key_leading, 'hit')
+                return _cached_response(cached)
 
-            non_exists = len([0 for item in result if item is not None]) == 0
+            # 只有成功的结果在后台重新计算，错误的结果(e.g. 参数错误)依旧同步计算
+            if cached is not None and stale_while_revalidate and int(cached[2]) == status.HTTP_200_OK:
+                lock_token = _acquire_lock(lock_key, lock_timeout)
+                if lock_token is not None:
+                    from apiv1.module.system.tasks.tasks import refresh_view_cache
+                    refresh_view_cache.delay(
+                        refresh_func_path, request.query_params.dict(), cache_key, tag_keys,
+                        ttl_in_second, stale_while_revalidate, lock_token
+                    )
+                _incr_cache_metrics(key_leading, 'stale_served')
+                return _cached_response(cached)
 
-            if not non_exists:  # hit
-                headers: List[List[str:str]] = json.loads(result.pop())
-                response = HttpResponse(*result)
-                for header in headers:
-                    response[header[0]] = header[1]
+            # single-flight: 取得锁的请求负责重新计算
+            lock_token = _acquire_lock(lock_key, lock_timeout)
+            if lock_token is not None:
+                try:
+                    ret = compute(self, request, cache_key, tag_versions)
+                finally:
+                    _release_lock(lock_key, lock_token)
+                _incr_cache_metrics(key_leading, 'miss' if cached is None else 'stale')
+                return ret
 
-                return response
+            if cached is not None:
+                _incr_cache_metrics(key_leading, 'stale_served')
+                return _cached_response(cached)
 
-            ret: Response = func(self, request)
-            ret = self.finalize_response(request, response=ret)
-
-            redis_connect.hmset(cache_key, serialize_response_into_str_dict(ret))
-            redis_connect.expire(cache_key, ttl_in_second)
+            deadline = time.monotonic() + lock_wait
+            while time.monotonic() < deadline:
+                time.sleep(CACHE_LOCK_POLL_INTERVAL)
+                cached, fresh, tag_versions = _read_cache(cache_key, tag_keys)
+                if fresh:
+                    _incr_cache_metrics(key_leading, 'hit')
+                    return _cached_response(cached)
 
-            return ret
+            # 等待超时，自行计算
+            _incr_cache_metrics(key_leading, 'miss')
+            return compute(self, request, cache_key, tag_versions)
 
         return wrapper
 
     return decorator
 
 
+def refresh_cache(refresh_func_path: str, query_params: dict, cache_key: str, tag_keys: List[str],
+                  ttl_in_second: int, stale_while_revalidate: int, lock_token: str):
+    """
+    cache_dcr stale-while-revalidate: 以refresh_func重新计算接口数据写入缓存，完成后释放锁
+    content_type及headers沿用旧缓存
+    """
+    try:
+        cached, _, tag_versions = _read_cache(cache_key, tag_keys)
+        data = import_string(refresh_func_path)(query_params)
+        content_type, headers = (cached[1], cached[3]) if cached is not None else \
+            (b'application/json', json_render.render([['Content-Type', 'application/json']]))
+        cache_data = {
+            "data": json_render.render(data),
+            "content_type": content_type,
+            "status": status.HTTP_200_OK,
+            "headers": headers
+        }
+        _write_cache(cache_key, cache_data, tag_versions, ttl_in_second, stale_while_revalidate)
+    finally:
+        _release_lock(f'{cache_key}:lock', lock_token)
+
+
+def _write_cache(cache_key: str, cache_data: dict, tag_versions: dict, ttl_in_second: int,
+                 stale_while_revalidate: int):
+    cache_data["tags"] = json.dumps(tag_versions)
+    cache_data["expire_at"] = time.time() + ttl_in_second
+    pipe = redis_connect.pipeline(transaction=False)
+    pipe.hmset(cache_key, cache_data)
+    pipe.expire(cache_key, ttl_in_second + stale_while_revalidate)
+    pipe.execute()
+
+
+# 只删除自己持有的锁，避免计算超过lock_timeout后删除了其它请求取得的锁
+RELEASE_LOCK_SCRIPT = redis_connect.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+
+def _acquire_lock(lock_key: str, lock_timeout: int):
+    """
+    取得锁时回传token，用于释放锁；锁已被其它请求持有时回传None
+    """
+    token = uuid.uuid4().hex
+    return token if redis_connect.set(lock_key, token, nx=True, ex=lock_timeout) else None
+
+
+def _release_lock(lock_key: str, token: str):
+    RELEASE_LOCK_SCRIPT(keys=[lock_key], args=[token])
+
+
+def _read_cache(cache_key: str, tag_keys: List[str]):
+    """
+    缓存内容与tag版本在同一次往返中取得
+    返回 (缓存内容(不存在时为None), 缓存是否有效, 当前的tag版本)
+    """
+    pipe = redis_connect.pipeline(transaction=False)
+    pipe.hmget(cache_key, CACHE_FIELDS + ["tags", "expire_at"])
+    if tag_keys:
+        pipe.mget(tag_keys)
+    result, *tag_versions = pipe.execute()
+    tag_versions = {
+        key: None if version is None else version.decode()
+        for key, version in zip(tag_keys, tag_versions[0] if tag_versions else [])
+    }
+
+    expire_at = result.pop()
+    cached_tag_versions = result.pop()
+    if len([0 for item in result if item is not None]) == 0:
+        return None, False, tag_versions
+
+    fresh = json.loads(cached_tag_versions or '{}') == tag_versions and \
+        (expire_at is None or time.time() < float(expire_at))
+    return result, fresh, tag_versions
+
+
+def _cached_response(cached: List) -> HttpResponse:
+    headers: List[List[str:str]] = json.loads(cached[-1])
+    response = HttpResponse(*cached[:-1])
+    for header in headers:
+        response[header[0]] = header[1]
+    return response
+
+
+def _incr_cache_metrics(key_leading: str, kind: str):
+    redis_connect.hincrby(REDIS_CACHE_METRICS, f'{key_leading}:{kind}')
+
+
+def cache_tag(resource: str, **lookup) -> str:
+    """
+    缓存tag，resource为缓存所依赖的数据(如rds/devicepower)，lookup为该数据的筛选条件
+    e.g. cache_tag('rds') -> 'rds'    cache_tag('rds', tboard=1) -> 'rds:tboard=1'
+    """
+    return ''.join([resource] + [f':{field}={value}' for field, value in sorted(lookup.items())])
+
+
+def invalidate_cache(resource: str, **lookups):
+    """
+    resource数据写入后调用，更新相关tag的版本使依赖它们的缓存失效
+    lookups为写入数据关联的实体id，可为单个值或多个值
+    e.g. invalidate_cache('rds', tboard=1, device=[2, 3], job=4) 会更新
+         rds, rds:tboard=1, rds:device=2, rds:device=3, rds:job=4
+    在事务提交后才更新tag，避免提交前有请求以旧数据重新写入缓存
+    """
+    if not REEF_USE_CACHE:
+        return
+
+    tags = [cache_tag(resource)]
+    for field, values in lookups.items():
+        if not isinstance(values, (list, tuple, set)):
+            values = [values]
+        tags.extend(cache_tag(resource, **{field: value}) for value in set(values) if value is not None)
+
+    transaction.on_commit(lambda: _bump_cache_tags(resource, tags))
+
+
+def _bump_cache_tags(resource: str, tags: List[str]):
+    # tag的值只需与之前不同，使用uuid避免tag过期后重新计数产生相同的版本
+    try:
+        pipe = redis_connect.pipeline(transaction=False)
+        for tag in tags:
+            pipe.set(f'{REDIS_CACHE_TAG}:{tag}', uuid.uuid4().hex, ex=REDIS_CACHE_TAG_TTL)
+        pipe.hincrby(REDIS_CACHE_METRICS, f'invalidation:{resource}')
+        pipe.execute()
+    except redis.RedisError:
+        # 数据已提交，tag更新失败不应影响写入结果
+        logger.exception(f'invalidate cache tags failed: {tags}')
+
+
+def get_cache_metrics() -> dict:
+    """
+    缓存统计: 各缓存的命中(hit)/未命中(miss)/失效后重新计算(stale)/失效后返回旧缓存(stale_served)次数，
+    及各resource的失效(invalidation)次数
+    """
+    metrics = {'cache': {}, 'invalidation': {}}
+    for field, value in redis_connect.hgetall(REDIS_CACHE_METRICS).items():
+        name, kind = field.decode().rsplit(':', 1)
+        if name == 'invalidation':
+            metrics['invalidation'][kind] = int(value)
+            continue
+        metrics['cache'].setdefault(name, {'hit': 0, 'miss': 0, 'stale': 0, 'stale_served': 0})[kind] = int(value)
+    for item in metrics['cache'].values():
+        total = item['hit'] + item['miss'] + item['stale'] + item['stale_served']
+        item['hit_ratio'] = round(item['hit'] / total, 3) if total else 0
+    return metrics
+
+
 def prepare_cache_key(key_leading: str, param, ignore: List[str] = None):
     if ignore is None:
         ignore = []
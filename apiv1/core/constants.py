@@ -32,6 +32,8 @@ DEVICE_STATUS_OCCUPIED = "occupied"
 DEVICE_OCCUPY_TYPE_JOB_EDITOR = "job_editor"
 DEVICE_TYPE_TEST_BOX = 'test_box'
 DEVICE_TYPE_ADB = 'adb'
+# DevicePower/DeviceTemperature原始数据保留天数，超过的数据按分钟汇总
+DEVICE_SAMPLE_RAW_RETENTION_DAYS = 30
 
 # PowerPort Status
 POWER_PORT_STATUS_BUSY = 'busy'
@@ -53,6 +55,23 @@ WOODENBOX_TYPE_TEMP = "temp"
 
 RDS_FILTER_SERIOUS = 'serious'
 
+# RdsScreenShot Thumb Status
+RDS_SCREENSHOT_THUMB_PENDING = 'pending'
+RDS_SCREENSHOT_THUMB_READY = 'ready'
+RDS_SCREENSHOT_THUMB_FAILED = 'failed'
+# 每个celery任务处理的截图数量
+RDS_SCREENSHOT_THUMB_BATCH_SIZE = 20
+
+# RdsLog建立ES索引时每次读取的大小，超过RDS_LOG_ES_MAX_CONTENT_SIZE的部分截断不索引
+RDS_LOG_ES_READ_CHUNK_SIZE = 64 * 1024
+RDS_LOG_ES_MAX_CONTENT_SIZE = 5 * 1024 * 1024
+# streaming_bulk每次送出的文档数量及大小上限
+RDS_LOG_ES_BULK_CHUNK_SIZE = 50
+RDS_LOG_ES_BULK_MAX_BYTES = 50 * 1024 * 1024
+# 补建索引时每批读取的RdsLog数量，及每个celery任务处理的批数
+RDS_LOG_ES_BACKFILL_BATCH_SIZE = 500
+RDS_LOG_ES_BACKFILL_BATCHES_PER_TASK = 20
+
 POWER_CONSUMPTION_ERROR_CODE = "-101"
 TEMP_CONSUMPTION_ERROR_CODE = "-999.99"
 
@@ -61,16 +80,36 @@ REEF_DEFAULT_MANUFACTURER = "Xiaomi"
 JOB_RESOURCE_FILE_TYPE = ['txt', 'json', 'java', 'lua', 'py', 'pl', 'png', 'jpg',
                           'bmp', 'jpeg', 'gif', 'mp4', 'mov', 'mp3', 'apk', 'img', 'log', 'zip']
 
+# Coral
+# 并发通知Coral主机的线程数及每个Coral主机的连接池大小
+CORAL_FAN_OUT_MAX_WORKERS = 32
+CORAL_POOL_MAXSIZE = 4
+# scp刷机包到Coral主机的线程数
+CORAL_TRANSFER_MAX_WORKERS = 8
+
 # channel group
 TBOARD_DELETE_GROUP = 'tboard_delete'
 TBOARD_DELETE_FAIL_GROUP = 'tboard_deleted_fail'
 LOG_DELETE_GROUP = 'log_delete'
+DEVICE_POWER_GROUP = 'device_power'
 
 # redis
 REDIS_TBOARD_DELETE = 'tboard:delete'
 REDIS_TBOARD_DELETE_FAIL = 'tboard:deleted_fail'
 REDIS_LOG_DELETE = 'log:delete'
 REDIS_COOLPAD_POWER_LAST_TIME = 'coolpad:power_last'
+# hash, field为device id，value为该设备最新一笔DevicePower
+REDIS_DEVICE_LATEST_POWER = 'device:latest_power'
+# hash, field为job id，value为该job下发coral所需的信息(manifest)
+REDIS_JOB_DISPATCH_MANIFEST = 'job:dispatch_manifest'
+# string, 补建RdsLog ES索引已完成的最后一笔RdsLog id
+REDIS_RDS_LOG_ES_CHECKPOINT = 'rds_log:es_checkpoint'
+# 计算job资源文件hash时每次读取的大小
+JOB_BLOB_READ_SIZE = 1024 * 1024
+# 计入用例用时统计(JobRuntimeStats)的rds结果
+JOB_RUNTIME_ASSESSMENT_VALUES = ('0', '1', '-2', '-3', '-4', '-5', '-6', '-7')
+# 统计用例最先/最近使用时间时排除的tboard创建者
+JOB_RUNTIME_EXCLUDE_AUTHOR = 'AITester'
 
 # cache leading key
 REDIS_CACHE_GET_DATA_VIEW = 'cache:get_data_view'
@@ -80,6 +119,11 @@ REDIS_CACHE_GET_DEVICE_TEMPERATURE_RAPID = 'cache:get_device_temperature_rapid'
 REDIS_CACHE_GET_DEVICE_POWER_RAPID = 'cache:get_device_power_rapid'
 REDIS_CACHE_GET_RDS_RAPID = 'cache:get_rds_rapid'
 REDIS_CACHE_GET_DATA_VIEW_CALENDAR = 'cache:get_data_view_calendar'
+REDIS_CACHE_GET_SIMILARITY_MATRIX = 'cache:get_similarity_matrix'
+# 缓存tag版本号及缓存命中统计
+REDIS_CACHE_TAG = 'cache:tag'
+REDIS_CACHE_METRICS = 'cache:metrics'
+REDIS_CACHE_TAG_TTL = 86400 * 30
 
 # celery delayed task
 REDIS_DEVICE_PREFIX = 'device'
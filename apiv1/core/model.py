@@ -52,7 +52,7 @@ class CustomPatternCharField(RelatedField):
         return str(getattr(obj, 'id'))
 
 
-from django.db.models import Func, Value
+from django.db.models import Aggregate, FloatField, Func, Value
 
 
 class Convert(Func):
@@ -66,3 +66,15 @@ class Convert(Func):
      # self.template = f'{self.function}({self.expression},{self.transcoding_name})'
      return super(Convert, self).as_sql(compiler, connection)
 
+
+class Percentile(Aggregate):
+    """
+    postgres percentile_cont，percentile=0.5即为中位数，忽略NULL
+    """
+    function = 'percentile_cont'
+    name = 'Percentile'
+    template = '%(function)s(%(percentile)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, expression, percentile=0.5, **extra):
+        super().__init__(expression, percentile=float(percentile), **extra)
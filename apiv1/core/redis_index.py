@@ -0,0 +1,86 @@
+import time
+
+from reef.settings import redis_pool_connect
+
+# 按score由大至小取出index中的hash，过期的hash顺便从index移除
+# KEYS[1]: index  ARGV[1]: hash key前缀  ARGV[2]: 取出的最后一个位置(-1为全部)
+_FETCH_ALL_SCRIPT = """
+local ids = redis.call('ZREVRANGE', KEYS[1], 0, tonumber(ARGV[2]))
+local result = {}
+for _, id in ipairs(ids) do
+    local data = redis.call('HGETALL', ARGV[1] .. id)
+    if #data == 0 then
+        redis.call('ZREM', KEYS[1], id)
+    else
+        table.insert(result, data)
+    end
+end
+return result
+"""
+
+
+def _decode_hash(data):
+    return {key.decode(): val.decode() for key, val in data.items()}
+
+
+class RedisHashIndex:
+    """
+    以sorted set记录同一类hash的id，取代KEYS扫描
+    index: {prefix}:index  member: id  score: 写入时间
+    hash:  {prefix}:{id}
+    hash过期后index中的id在下一次all()时移除
+    """
+
+    def __init__(self, prefix, connect=redis_pool_connect):
+        self.prefix = prefix
+        self.index_key = f'{prefix}:index'
+        self.connect = connect
+        self._fetch_all = connect.register_script(_FETCH_ALL_SCRIPT)
+
+    def hash_key(self, item_id):
+        return f'{self.prefix}:{item_id}'
+
+    def set(self, item_id, mapping, expire=None):
+        with self.connect.pipeline() as pipe:
+            pipe.hmset(self.hash_key(item_id), mapping)
+            if expire:
+                pipe.expire(self.hash_key(item_id), expire)
+            pipe.zadd(self.index_key, {item_id: time.time()})
+            pipe.execute()
+
+    def update(self, item_id, expire=None, **fields) -> dict:
+        """
+        更新hash中的栏位，回传更新后的完整内容
+        """
+        with self.connect.pipeline() as pipe:
+            pipe.hmset(self.hash_key(item_id), fields)
+            if expire:
+                pipe.expire(self.hash_key(item_id), expire)
+            pipe.hgetall(self.hash_key(item_id))
+            data = pipe.execute()[-1]
+        return _decode_hash(data)
+
+    def pop(self, item_id) -> dict:
+        with self.connect.pipeline() as pipe:
+            pipe.hgetall(self.hash_key(item_id))
+            pipe.delete(self.hash_key(item_id))
+            pipe.zrem(self.index_key, item_id)
+            data = pipe.execute()[0]
+        return _decode_hash(data)
+
+    def delete(self, *item_ids):
+        if not item_ids:
+            return
+        with self.connect.pipeline() as pipe:
+            pipe.delete(*[self.hash_key(item_id) for item_id in item_ids])
+            pipe.zrem(self.index_key, *item_ids)
+            pipe.execute()
+
+    def all(self, count=None) -> list:
+        """
+        一次调用取出最新写入的count笔(None为全部)hash
+        """
+        rows = self._fetch_all(keys=[self.index_key], args=[self.hash_key(''), -1 if count is None else count - 1])
+        return [
+            {row[index].decode(): row[index + 1].decode() for index in range(0, len(row), 2)} for row in rows
+        ]
@@ -1,5 +1,10 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
 import requests
+from requests.adapters import HTTPAdapter
 
+from apiv1.core.constants import CORAL_FAN_OUT_MAX_WORKERS, CORAL_POOL_MAXSIZE, CORAL_TRANSFER_MAX_WORKERS
 from apiv1.core.utils import ReefLogger
 from apiv1.module.system.models import Cabinet
 from reef import settings
@@ -50,16 +55,88 @@ class ReefRequest:
         return rep
 
 
+class CoralTimeout(Exception):
+    """
+    coral_fan_out整体超过deadline仍未完成(含仍在排队未开始)的请求
+    """
+    pass
+
+
+_coral_session = None
+_coral_session_lock = threading.Lock()
+_coral_executor = ThreadPoolExecutor(max_workers=CORAL_FAN_OUT_MAX_WORKERS, thread_name_prefix='coral')
+# scp刷机包等耗时无法预估的传输使用独立线程池，避免占满_coral_executor阻塞其它coral请求
+coral_transfer_executor = ThreadPoolExecutor(
+    max_workers=CORAL_TRANSFER_MAX_WORKERS, thread_name_prefix='coral_transfer'
+)
+
+
+def get_coral_session() -> requests.Session:
+    """
+    所有Coral请求共用的Session，每个Coral主机保持连接池，避免每次请求重新建立连接
+    """
+    global _coral_session
+    if _coral_session is None:
+        with _coral_session_lock:
+            if _coral_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=CORAL_FAN_OUT_MAX_WORKERS, pool_maxsize=CORAL_POOL_MAXSIZE)
+                session.mount('http://', adapter)
+                _coral_session = session
+    return _coral_session
+
+
+def coral_request(ip, method, path, **kwargs) -> requests.Response:
+    return get_coral_session().request(method, f"http://{ip}:{settings.CORAL_PORT}{path}", **kwargs)
+
+
+def coral_fan_out(func, ips, deadline=None, executor=None) -> dict:
+    """
+    以线程池并发对每个Coral主机执行func(ip)，自调用起整体等待不超过deadline秒(None为不限)
+    回传 {ip: func(ip)的回传值}，func抛出异常或超过deadline时值为该异常(CoralTimeout)
+    线程池为所有调用共用，超过deadline仍在排队的请求不再送出，同样记为CoralTimeout
+    func在其它线程中执行，不应访问数据库；耗时无法预估的func应传入独立的executor
+    """
+    executor = executor or _coral_executor
+    started_ips = set()
+
+    def run(ip):
+        started_ips.add(ip)
+        return func(ip)
+
+    futures = {ip: executor.submit(run, ip) for ip in ips}
+    done, _ = wait(futures.values(), timeout=deadline)
+    results = {}
+    for ip, future in futures.items():
+        if future not in done:
+            if future.cancel() or ip not in started_ips:
+                results[ip] = CoralTimeout(f'coral {ip} not started in {deadline}s')
+            else:
+                results[ip] = CoralTimeout(f'coral {ip} not respond in {deadline}s')
+            continue
+        exception = future.exception()
+        results[ip] = exception if exception is not None else future.result()
+    return results
+
+
 def sync_info_to_coral(body_data, log_info=Empty):
     """
     通知reef下的所有corl主机
     """
-    for ip_address in Cabinet.objects.filter(is_delete=False).values_list('ip_address', flat=True):
-        url = f"http://{ip_address}:{settings.CORAL_PORT}/door/door_info/"
-        parameter = {"json": body_data, "timeout": 0.2}
-        req = ReefRequest(url, **parameter)
+    def post(ip_address):
         dict_data = {"coral_ip": ip_address, "body": body_data}
         if log_info is not Empty:
             dict_data.update(log_info)
-        req.post(dict_data)
+        try:
+            coral_request(ip_address, 'post', '/door/door_info/', json=body_data, timeout=0.2)
+        except Exception as e:
+            reef_logger = ReefLogger('debug')
+            reef_logger.debug(
+                f"\n"
+                f"{'-' * 50}\n"
+                f"Info: {dict_data}\n"
+                f"Exception info: {e}\n"
+            )
+
+    coral_fan_out(post, Cabinet.objects.filter(is_delete=False).values_list('ip_address', flat=True), deadline=1)
 
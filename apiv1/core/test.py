@@ -2,7 +2,13 @@
 这是Reef项目的单元测试工具模块
 提供各类测试工具，协助撰写单元测试
 """
+import os
+from contextlib import contextmanager
+from unittest import skipUnless
+
 from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.db import connection
+from django.test import tag
 from django.utils import timezone
 
 from apiv1.core.constants import PANESLOT_STATUS_EMPTY, NORMAL_JOB_FLOW
@@ -219,6 +225,36 @@ class TestTool:
         elif operate == 'delete':
             cabinet.delete()
 
+    @staticmethod
+    def create_benchmark_devices(num: int, rom_version: RomVersion) -> [Device]:
+        """
+        批量创建性能测试使用的Device
+        :param num: 创建的数量
+        :param rom_version: Device关联的RomVersion
+        """
+        return Device.objects.bulk_create([
+            Device(device_label=f'benchmark_device_{index}', cpu_id=f'benchmark_cpu_{index}', rom_version=rom_version)
+            for index in range(num)
+        ])
+
+    @staticmethod
+    @contextmanager
+    def capture_on_commit_callbacks(execute=True):
+        """
+        测试在事务中执行，transaction.on_commit登记的回调不会执行，
+        以此取得with区块中登记的回调，execute为True时离开区块后依序执行
+        """
+        start = len(connection.run_on_commit)
+        callbacks = []
+        try:
+            yield callbacks
+        finally:
+            callbacks.extend(func for _, func in connection.run_on_commit[start:])
+            del connection.run_on_commit[start:]
+            if execute:
+                for callback in callbacks:
+                    callback()
+
     @classmethod
     def create_memory_uploaded_file(cls, path, filename):
         f = open(path)
@@ -258,3 +294,12 @@ def tccounter(name: str, method: str, enable: bool):
             return original_func
 
     return wrapper
+
+
+# Benchmark
+def benchmark(cls):
+    """
+    性能测试用例装饰器，性能测试会写入大量数据，只在设置环境变量REEF_BENCHMARK时执行
+    单独执行: REEF_BENCHMARK=1 python manage.py test --tag benchmark
+    """
+    return tag('benchmark')(skipUnless(os.environ.get('REEF_BENCHMARK'), 'REEF_BENCHMARK is not set')(cls))
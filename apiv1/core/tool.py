@@ -1,14 +1,12 @@
 import copy
 import ftplib
 import os
-import zipfile
 
 from django.db.models import ManyToManyRel, ManyToOneRel, OneToOneRel, OneToOneField
 from django.db.models.fields.related import RelatedField
 
 from apiv1.core.constants import JOB_TYPE_INNER_JOB
 from apiv1.core.response import reef_400_response
-from reef.settings import JOB_RES_FILE_EXPORT_PATH
 
 
 class Checkout:
@@ -21,38 +19,27 @@ class Checkout:
             self.error_list = []
 
         def get_job_zip_file_path(self):
+            # job及inner job的zip是否正常记录在manifest中，以一次redis查询取得，不再逐一打开zip
+            from apiv1.module.job.business import get_job_manifests_with_inner_job
+            from apiv1.module.job.models import Job
+
+            manifests = get_job_manifests_with_inner_job(self.job_list)
+            error_job_ids = set()
             # job 列表不做去重处理。job选取多次此信息，返给前端,用于执行多次此job.
             for job in self.job_list:
-                zip_path_list = [job]
-                inner_job_label_list = list(set([
-                    inner_flow.job
-                    for job_flow in job.job_flow.all()
-                    for inner_flow in job_flow.inner_flow.all()
-                ]))
-                zip_path_list.extend(inner_job_label_list)
-                error_exists = self.is_exist(zip_path_list)
-                if not error_exists:
+                job_ids = [job.id] + manifests[job.id]['inner_job_ids']
+                invalid_job_ids = [
+                    job_id for job_id in job_ids if not manifests.get(job_id, {}).get('zip_valid', False)
+                ]
+                if invalid_job_ids:
+                    error_job_ids.update(invalid_job_ids)
+                else:
                     # job and inner_job zip file not have error
                     self.correct_list.append(job)
-
-        def is_exist(self, zip_path_list):
-            error_exists = False
-            for job in zip_path_list:
-                if not os.path.exists(os.path.join(JOB_RES_FILE_EXPORT_PATH, f'{job.job_label}.zip')):
-                    self.error_list.append(job)
-                    error_exists = True
-                else:
-                    # zip is empty
-                    try:
-                        with zipfile.ZipFile(
-                                os.path.join(JOB_RES_FILE_EXPORT_PATH, f'{job.job_label}.zip'), 'r'
-                         ) as z:
-                            if not z.namelist():
-                                self.error_list.append(job)
-                                error_exists = True
-                    except Exception as e:
-                        self.error_list.append(job)
-            return error_exists
+            if error_job_ids:
+                jobs = {job.id: job for job in self.job_list}
+                jobs.update(Job.objects.filter(id__in=error_job_ids - jobs.keys()).in_bulk())
+                self.error_list = [jobs[job_id] for job_id in error_job_ids]
 
         def error_job_set(self):
             # job error execute set
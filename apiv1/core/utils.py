@@ -1,4 +1,4 @@
-import itertools, logging
+import logging
 import os.path
 
 import numpy as np
@@ -7,9 +7,9 @@ from datetime import timedelta, date, datetime
 from distutils.util import strtobool
 
 import pytz
+from django.apps import apps
 from django.utils import timezone
 from django.db.models.query import QuerySet
-from django.db.models.manager import Manager
 from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
@@ -185,33 +185,55 @@ class SimilarityMatrixMonitor:
 
         if not all([isinstance(self.device_queryset, QuerySet), isinstance(self.job_queryset, QuerySet)]):
             return np.zeros(shape=(0, 0)), [], []
-        matrix = np.zeros(shape=(self.device_queryset.count(), self.job_queryset.count()))
-        device_label_list = list(self.device_queryset.values_list('device_label', flat=True))
-        job_label_list = list(self.job_queryset.values_list('job_label', flat=True))
-        for rds in rds_queryset:
-            if rds.job not in self.job_queryset:  # remove deleted&sysJob
-                continue
-            job_first_use_time = rds.job.earliest_used_time
-            job_last_using_time = rds.job.recently_used_time
-
-            if not all([job_first_use_time, job_last_using_time]):
-                continue
-            rds_create_time = timezone.datetime.strftime(timezone.localtime(rds.start_time),
-                                              settings.REST_FRAMEWORK['DATETIME_FORMAT'])
-            matrix[device_label_list.index(rds.device.device_label)][job_label_list.index(rds.job.job_label)]\
-                += self.cal_time_weight(job_first_use_time, job_last_using_time,rds_create_time)
+        device_ids, device_label_list = self._id_label_list(self.device_queryset, 'device_label')
+        job_ids, job_label_list = self._id_label_list(self.job_queryset, 'job_label')
+        matrix = np.zeros(shape=(len(device_ids), len(job_ids)))
+        device_index = {device_id: index for index, device_id in enumerate(device_ids)}
+        job_index = {job_id: index for index, job_id in enumerate(job_ids)}
+
+        # job最先/最近被使用的时间(同Job.earliest_used_time/recently_used_time)，由JobRuntimeStats一次查询取得
+        job_used_time = np.full(shape=(len(job_ids), 2), fill_value=np.nan)
+        for job_id, first_use_time, last_using_time in apps.get_model('apiv1', 'JobRuntimeStats').objects.filter(
+                job_id__in=job_ids, first_run__isnull=False
+        ).values_list('job_id', 'first_run', 'last_run'):
+            job_used_time[job_index[job_id]] = first_use_time.timestamp(), last_using_time.timestamp()
+
+        # deleted&sysJob及没有使用时间的job不在job_index中
+        used_job_ids = [job_id for job_id in job_ids if not np.isnan(job_used_time[job_index[job_id], 0])]
+        rds_rows = [
+            (device_index[device_id], job_index[job_id], start_time.timestamp())
+            for device_id, job_id, start_time in rds_queryset.filter(job_id__in=used_job_ids).values_list(
+                'device_id', 'job_id', 'start_time'
+            ) if device_id in device_index
+        ]
+        if not rds_rows:
+            return matrix, device_label_list, job_label_list
+
+        device_idx, job_idx, rds_create_time = (np.array(column) for column in zip(*rds_rows))
+        # 与原先以秒为单位的时间字符串计算结果一致
+        job_used_time, rds_create_time = np.floor(job_used_time), np.floor(rds_create_time)
+        weight = self.cal_time_weight(job_used_time[job_idx, 0], job_used_time[job_idx, 1], rds_create_time)
+        # 同一个(device, job)的权重累加
+        matrix = np.bincount(
+            device_idx * len(job_ids) + job_idx, weights=weight, minlength=matrix.size
+        ).reshape(matrix.shape)
         return matrix, device_label_list, job_label_list
 
+    @staticmethod
+    def _id_label_list(queryset, label_field):
+        rows = list(queryset.values_list('id', label_field))
+        return [row[0] for row in rows], [row[1] for row in rows]
+
     def cal_time_weight(self, job_first_use_time, job_last_using_time, rds_create_time):
+        """
+        参数为秒级时间戳，可以是ndarray
+        """
         # todo verify this function when back to company
         k = 1  # auto set this k&a when we have feedback data
         a = 4
-        job_time_interval = (self.strftTime(job_last_using_time) - self.strftTime(rds_create_time))
-        job_life_time = (self.strftTime(job_last_using_time) - self.strftTime(job_first_use_time))
-        return k * np.exp(a * (-job_time_interval / (job_life_time + timedelta(seconds=1))))
-
-    def strftTime(self, timeStr):
-        return datetime.strptime(timeStr, "%Y-%m-%d %H:%M:%S")
+        job_time_interval = job_last_using_time - rds_create_time
+        job_life_time = job_last_using_time - job_first_use_time
+        return k * np.exp(a * (-job_time_interval / (job_life_time + 1)))
 
     def form_job_feature_matrix(self):
         """
@@ -228,21 +250,22 @@ class SimilarityMatrixMonitor:
             job-e7a0a491-c1ab-4159-a806-c62796d4cd98  user-default000000000001                 [machBrain]
 
         """
-        feature_matrix = []
-        job_label_list = []
-        for job in self.job_queryset:
-            inside_list = []
-            for feature, name in self._useful_feature.items():
-                job_fields_obj = getattr(job, feature)
-                if isinstance(job_fields_obj, Manager):
-                    content = [i.strip() for i in job_fields_obj.all().values_list(name, flat=True)]
-                else:
-                    field = getattr(job_fields_obj, name)
-                    content = field.strip() if field is not None and isinstance(field, str) else None
-                inside_list.append(content)
-            feature_matrix.append(inside_list)
-            job_label_list.append(job.job_label)
-        self.job_feature_df = pd.DataFrame(feature_matrix, index=job_label_list, columns=self._useful_feature)
+        job_ids, job_label_list = self._id_label_list(self.job_queryset, 'job_label')
+        # 每个feature一次查询，不逐个job读取关联数据
+        feature_columns = []
+        for feature, name in self._useful_feature.items():
+            rows = self.job_queryset.order_by().values_list('id', f'{feature}__{name}')
+            if self.job_queryset.model._meta.get_field(feature).many_to_many:
+                content = {job_id: [] for job_id in job_ids}
+                for job_id, value in rows:
+                    if value is not None:
+                        content[job_id].append(value.strip())
+            else:
+                content = {job_id: value.strip() if isinstance(value, str) else None for job_id, value in rows}
+            feature_columns.append([content[job_id] for job_id in job_ids])
+        self.job_feature_df = pd.DataFrame(
+            dict(zip(self._useful_feature, feature_columns)), index=job_label_list, columns=self._useful_feature
+        )
         return self.job_feature_df, job_label_list
 
     def deal_with_multi_item(self, feature_list, job_label_list):
@@ -253,14 +276,11 @@ class SimilarityMatrixMonitor:
         job-1911c35b-fb8d-47fa-9676-f6db02d341d5   tingting  ...              0           1
         job-4a5977fa-c309-4984-9456-45b5f6b9ad00   tingting  ...              0           0
         """
-        # list all feature's name
-        all_item_list = list(itertools.chain.from_iterable(feature_list))
-        for name in set(all_item_list):
-            # set 1 if this line have this feature
-            featurValue = [1 if name in i else 0 for i in feature_list]
-            self.job_feature_df = pd.concat(
-                [self.job_feature_df, pd.DataFrame({"have_" + name: featurValue}, index=job_label_list)],
-                join="outer", axis=1)
+        # 每个job的每个item展开为一行，以get_dummies一次产生所有have_xxx栏位
+        items = pd.Series(list(feature_list), index=job_label_list).explode().dropna()
+        have_item = pd.get_dummies(items, prefix='have').groupby(level=0).max()
+        have_item = have_item.reindex(job_label_list, fill_value=0).astype(int)
+        self.job_feature_df = pd.concat([self.job_feature_df, have_item], join="outer", axis=1)
         self.job_feature_df = self.job_feature_df.drop(self._muti_item_name, axis=1)
 
     def deal_with_str_item(self, series, colunm_name):
@@ -1,12 +1,13 @@
 import copy
 import re
 from collections import namedtuple
+from functools import lru_cache
 
 import time
 from django.contrib.auth.models import Group
 from django.db.models import Func, Value
 from django.core.exceptions import FieldError, FieldDoesNotExist
-from django.db.models import Model
+from django.db.models import Model, Prefetch
 from django.db.models.fields.related_descriptors import ReverseManyToOneDescriptor, ReverseOneToOneDescriptor
 from rest_framework import status, mixins
 from rest_framework import generics, serializers
@@ -32,7 +33,9 @@ from apiv1.core.response import reef_400_response
 # helper class and function                             #
 #########################################################
 
+@lru_cache(maxsize=None)
 def _get_model_fields(model: Model):
+    # 遍历dir(model)的开销较大，model的字段在运行期间不会改变，按model缓存结果
     model_properties = []
     for attr in dir(model):
         attr_obj = getattr(model, attr)
@@ -62,6 +65,111 @@ def _get_model_fields(model: Model):
     )
 
 
+def _concrete_field_names(model: Model, prefix=''):
+    return [f'{prefix}{field.name}' for field in model._meta.concrete_fields]
+
+
+def _plan_query(serializer, model: Model):
+    """
+    根据serializer裁剪后的字段树规划查询:
+    正向外键/一对一(嵌套serializer)使用select_related，反向外键/多对多使用Prefetch，
+    并只读取需要的字段(only)，使查询数量固定，不随回传的数据量增加
+    返回 (select_related, prefetch_related, only)
+    """
+    select_related, prefetch_related, only = [], [], []
+    # 回传model的property时无法得知其依赖的字段，该层不做字段裁剪
+    prunable = True
+    for field in serializer.fields.values():
+        source = field.source
+        if source == '*' or '.' in source:
+            prunable = False
+            continue
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            prunable = False
+            # property读取的关联对象由model的property_select_related声明，一并取得
+            related = getattr(model, 'property_select_related', {}).get(source)
+            if related is not None and related not in select_related:
+                select_related.append(related)
+                only.extend(_concrete_field_names(model._meta.get_field(related).related_model, f'{related}__'))
+            continue
+
+        if isinstance(field, (ListSerializer, ManyRelatedField)):
+            prefetch_related.append(Prefetch(source, queryset=_plan_related_queryset(field, model_field)))
+        elif isinstance(field, ModelSerializer):
+            related_model = model_field.related_model
+            sub_select_related, sub_prefetch_related, sub_only = _plan_query(field, related_model)
+            select_related.append(source)
+            select_related.extend(f'{source}__{path}' for path in sub_select_related)
+            prefetch_related.extend(
+                Prefetch(f'{source}__{prefetch.prefetch_through}', queryset=prefetch.queryset)
+                for prefetch in sub_prefetch_related
+            )
+            if model_field.concrete:
+                only.append(source)
+            only.extend(f'{source}__{name}' for name in sub_only)
+        elif model_field.is_relation and not model_field.concrete:
+            # 反向一对一以pk呈现时，仍需读取关联的对象
+            select_related.append(source)
+            only.extend(_concrete_field_names(model_field.related_model, f'{source}__'))
+        else:
+            only.append(source)
+
+    if not prunable:
+        only.extend(name for name in _concrete_field_names(model) if name not in only)
+    return select_related, prefetch_related, only
+
+
+def _plan_related_queryset(field, model_field):
+    """
+    反向外键/多对多字段预取时使用的queryset
+    """
+    related_model = model_field.related_model
+    queryset = related_model._default_manager.all()
+    if isinstance(field, ListSerializer):
+        select_related, prefetch_related, only = _plan_query(field.child, related_model)
+    else:
+        select_related, prefetch_related, only = [], [], []
+    if model_field.one_to_many:
+        # 预取时需要以外键将结果对应回父对象
+        only.append(model_field.field.name)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset.only(*only) if only else queryset.only(related_model._meta.pk.name)
+
+
+def apply_query_plan(queryset, serializer):
+    """
+    依serializer需要回传的字段为queryset加上select_related/prefetch_related/only
+    """
+    select_related, prefetch_related, only = _plan_query(serializer, queryset.model)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset.only(*only)
+
+
+def _lookup_span_multi_valued(model: Model, lookup: str):
+    """
+    过滤条件是否经过反向外键/多对多关系，经过时结果可能重复，需要distinct
+    """
+    for part in lookup.split('__'):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return False
+        if field.many_to_many or field.one_to_many:
+            return True
+        if not field.is_relation:
+            return False
+        model = field.related_model
+    return False
+
+
 class HelperModelSerializer(ModelSerializer):
     def __init__(self, *args, **kwargs):
         assert 'model' in kwargs, 'Need argument model'
@@ -172,12 +280,15 @@ class ListModelMixin:
                 {"field_error": f"query filtering error for input: {query_params} \nError detail: {e}"},
                 code=status.HTTP_400_BAD_REQUEST)
 
+        distinct = any(_lookup_span_multi_valued(queryset.model, lookup) for lookup in query_params)
         for k, func in queryset_filter.items():
             if k not in queryset_filter_vals:
                 continue
             queryset = func(queryset, queryset_filter_vals[k])
+            # 自定义的过滤方法无法得知是否关联多值关系，保留distinct
+            distinct = True
 
-        return queryset.distinct()
+        return queryset.distinct() if distinct else queryset
 
     def list(self, request):
         self._check_mixin_class()
@@ -210,14 +321,20 @@ class ListModelMixin:
             filter_ordering = OrderingFilter()
             queryset = filter_ordering.filter_queryset(request, queryset, self)
 
-        if 'limit' in request.query_params.dict() or 'offset' in request.query_params.dict():
-            pagination = LimitOffsetPagination()
-            queryset = pagination.paginate_queryset(queryset, request, view=None)
         try:
             serializer = HelperModelSerializer(
                 queryset, many=True, wanted_fields=wanted_fields, model=model, depth=depth,exclude_fields=exclude_fields)
         except FieldDoesNotExist as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = apply_query_plan(queryset, serializer.child)
+
+        if 'limit' in request.query_params.dict() or 'offset' in request.query_params.dict():
+            # 总数已在上方取得，直接切片，避免LimitOffsetPagination再执行一次count
+            pagination = LimitOffsetPagination()
+            limit = pagination.get_limit(request)
+            offset = pagination.get_offset(request)
+            queryset = queryset[offset:offset + limit] if limit is not None else []
+        serializer.instance = queryset
         return Response({return_key: serializer.data}, headers={"Total-Count": count})
 
 
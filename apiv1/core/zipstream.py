@@ -0,0 +1,74 @@
+import os
+import zipfile
+
+# 读取源文件及产生输出时每次处理的大小
+ZIP_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class _ZipStreamBuffer:
+    """
+    不可seek的输出，ZipFile写入的数据暂存在此，由stream_zip取出后交给response
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _write_entries(z, entries):
+    """
+    entries: [(zip内路径, 源文件路径或bytes)]
+    源文件分块读入并直接压缩写出，每写完一块yield一次
+    """
+    for arcname, source in entries:
+        if isinstance(source, bytes):
+            z.writestr(arcname, source, compress_type=zipfile.ZIP_DEFLATED)
+            yield
+            continue
+        zinfo = zipfile.ZipInfo.from_file(source, arcname)
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        # file_size已知，超过4G时ZipFile会自动使用zip64
+        with open(source, 'rb') as src, z.open(zinfo, 'w') as dst:
+            for chunk in iter(lambda: src.read(ZIP_STREAM_CHUNK_SIZE), b''):
+                dst.write(chunk)
+                yield
+
+
+def stream_zip(entries):
+    """
+    以generator产生zip内容，用于StreamingHttpResponse
+    不产生临时目录，也不会将整个zip放在内存中，每个源文件只读取一次
+    """
+    buffer = _ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as z:
+        for _ in _write_entries(z, entries):
+            data = buffer.pop()
+            if data:
+                yield data
+    yield buffer.pop()
+
+
+def write_zip(zip_path, entries):
+    """
+    将entries直接写入zip_path，先写入临时文件完成后再rename
+    """
+    tmp_path = f'{zip_path}.part'
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as z:
+            for _ in _write_entries(z, entries):
+                pass
+        os.replace(tmp_path, zip_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
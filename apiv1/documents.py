@@ -2,16 +2,17 @@ from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
 
 from apiv1.module.rds.models import RdsLog
+from reef.settings import ELASTICSEARCH_INDEX_REPLICAS
 
 
-# @registry.register_document
+@registry.register_document
 class RdsLogDocument(Document):
     rds = fields.ObjectField(properties={
         'start_time': fields.DateField(),
         'device_id': fields.IntegerField(),
         'job_id': fields.IntegerField(),
     })
-    file_content = fields.TextField(attr='log_content')
+    file_content = fields.TextField()
 
     class Index:
         # Name of the Elasticsearch index
@@ -20,7 +21,7 @@ class RdsLogDocument(Document):
         settings = {
             "highlight.max_analyzed_offset": 60000000,
             'number_of_shards': 3,
-            'number_of_replicas': 1
+            'number_of_replicas': ELASTICSEARCH_INDEX_REPLICAS
         }
 
     class Django:
@@ -31,3 +32,16 @@ class RdsLogDocument(Document):
             'file_name',
             'log_file'
         ]
+        # 不在上传请求中同步建立索引，由celery任务(index_rds_logs_task)以streaming_bulk分批送出
+        ignore_signals = True
+        queryset_pagination = 500
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('rds')
+
+    def prepare_file_content(self, instance):
+        from apiv1.module.rds.business import read_rds_log_content
+
+        if not instance.log_file:
+            return ''
+        return read_rds_log_content(instance.log_file.path)
@@ -3,11 +3,17 @@ from django_elasticsearch_dsl.management.commands.search_index import Command as
 from django_elasticsearch_dsl.registries import registry
 from elasticsearch_dsl import Index
 
+from apiv1.core.constants import RDS_LOG_ES_BACKFILL_BATCH_SIZE
+from apiv1.module.rds.business import backfill_rds_log_index, get_rds_log_index_checkpoint, \
+    set_rds_log_index_checkpoint
+from apiv1.module.rds.tasks.tasks import backfill_rds_log_index_task
+
 
 class Command(ES_Command):
     """
     扩展原有command，方便部署
     documents可以registry多个index，此command create只能传一个index，如需多个分多次即可
+    -b/--backfill 从checkpoint继续补建rds_logs索引(默认交由celery执行)，--reset 从头开始，--inline 在当前进程执行
     """
     def add_arguments(self, parser: CommandParser):
         parser.add_argument('-c', '--create',
@@ -17,8 +23,27 @@ class Command(ES_Command):
                             help='强制创建, 注意: 使用此选项如果索引存在会删除再重建',
                             action='store_true',
                             default=False)
+        parser.add_argument('-b', '--backfill',
+                            help='从checkpoint继续补建rds_logs索引',
+                            action='store_true',
+                            default=False)
+        parser.add_argument('--reset',
+                            help='补建前清除checkpoint，从第一笔RdsLog开始',
+                            action='store_true',
+                            default=False)
+        parser.add_argument('--inline',
+                            help='补建在当前进程执行，不提交celery任务',
+                            action='store_true',
+                            default=False)
+        parser.add_argument('--batch-size',
+                            type=int,
+                            help='补建时每批处理的RdsLog数量',
+                            default=RDS_LOG_ES_BACKFILL_BATCH_SIZE)
 
     def handle(self, *args, **options):
+        if options.get('backfill'):
+            return self._backfill(options)
+
         index_name = 'rds_logs' if 'create' not in options \
             else options.get('create')
         force = options.get('force')
@@ -59,3 +84,20 @@ class Command(ES_Command):
                     index.create()
 
         return
+
+    def _backfill(self, options):
+        if options.get('reset'):
+            set_rds_log_index_checkpoint(0)
+        batch_size = options.get('batch_size')
+        self.stdout.write(f'Backfill rds_logs from checkpoint {get_rds_log_index_checkpoint()}')
+        if not options.get('inline'):
+            backfill_rds_log_index_task.delay(batch_size)
+            self.stdout.write('Backfill task submitted')
+            return
+
+        _, errors = backfill_rds_log_index(batch_size)
+        for error in errors:
+            self.stdout.write(self.style.WARNING(f'Index error: {error}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Backfill done, checkpoint {get_rds_log_index_checkpoint()}, error num: {len(errors)}'
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apiv1.module.job.business import rebuild_job_runtime_stats
+
+
+class Command(BaseCommand):
+    """
+    根据Rds重建JobRuntimeStats(用例运行次数、平均/最大用时、最早/最近运行时间)
+    """
+    help = 'Rebuild job runtime statistics from rds table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-j', '--job', type=int, nargs='*',
+                            help='只处理指定的job id，不传则处理全部job')
+
+    def handle(self, *args, **options):
+        job_ids = options.get('job') or None
+        with transaction.atomic():
+            rebuild_job_runtime_stats(job_ids)
+        self.stdout.write(self.style.SUCCESS('Rebuild job runtime statistics done'))
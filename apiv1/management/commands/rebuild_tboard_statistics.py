@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+
+from apiv1.module.tboard.business import rebuild_tboard_statistics, rebuild_rds_daily_statistics
+from apiv1.module.tboard.models import TBoard, TBoardStatistics
+
+
+class Command(BaseCommand):
+    """
+    根据Rds重建TBoardStatistics计数及RdsDailyStatistics每日计数
+    --check 只比对计数与Rds实际统计结果，输出不一致的TBoard，不做修改
+    """
+    help = 'Rebuild tboard rds statistics from rds table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-t', '--tboard', type=int, nargs='*',
+                            help='只处理指定的tboard id，不传则处理全部tboard')
+        parser.add_argument('--check', action='store_true', default=False,
+                            help='只检查计数是否一致，不重建')
+
+    def handle(self, *args, **options):
+        tboard_ids = options.get('tboard') or None
+
+        if options.get('check'):
+            mismatch = self._check(tboard_ids)
+            for tboard_id, expect, actual in mismatch:
+                self.stdout.write(self.style.WARNING(f'tboard {tboard_id}: expect {expect}, actual {actual}'))
+            self.stdout.write(self.style.SUCCESS(f'Mismatch tboard num: {len(mismatch)}'))
+            return
+
+        with transaction.atomic():
+            rebuild_tboard_statistics(tboard_ids)
+            rebuild_rds_daily_statistics(tboard_ids)
+        self.stdout.write(self.style.SUCCESS('Rebuild tboard statistics done'))
+
+    @staticmethod
+    def _check(tboard_ids):
+        finished = Q(rds__end_time__isnull=False)
+        tboard_queryset = TBoard.objects.all()
+        if tboard_ids is not None:
+            tboard_queryset = tboard_queryset.filter(id__in=tboard_ids)
+        expects = tboard_queryset.values('id').annotate(
+            total=Count('rds'),
+            finished=Count('rds', filter=finished),
+            success=Count('rds', filter=finished & Q(rds__job_assessment_value='0')),
+            fail=Count('rds', filter=finished & Q(rds__job_assessment_value='1')),
+            na=Count('rds', filter=finished & ~Q(rds__job_assessment_value__in=['0', '1'])),
+        )
+        fields = ('total', 'finished', 'success', 'fail', 'na')
+        actuals = {
+            item[0]: item[1:] for item in
+            TBoardStatistics.objects.filter(tboard__in=tboard_queryset).values_list('tboard_id', *fields)
+        }
+        mismatch = []
+        for expect in expects:
+            expect_value = tuple(expect[field] for field in fields)
+            actual_value = actuals.get(expect['id'], (0,) * len(fields))
+            if expect_value != actual_value:
+                mismatch.append((expect['id'], expect_value, actual_value))
+        return mismatch
@@ -0,0 +1,45 @@
+# Generated by Django 2.2 on 2026-10-18 18:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiv1', '0115_auto_20221128_1450'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TBoardStatistics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0, verbose_name='rds总数')),
+                ('finished', models.IntegerField(default=0, verbose_name='已结束rds数量')),
+                ('success', models.IntegerField(default=0, verbose_name='通过rds数量')),
+                ('fail', models.IntegerField(default=0, verbose_name='失败rds数量')),
+                ('na', models.IntegerField(default=0, verbose_name='无效rds数量')),
+                ('tboard', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='apiv1.TBoard', verbose_name='任务关联')),
+            ],
+            options={
+                'verbose_name_plural': '任务统计',
+            },
+        ),
+        # 根据现有Rds初始化计数，之后由Rds signal增量维护
+        migrations.RunSQL(
+            sql="""
+            INSERT INTO apiv1_tboardstatistics (tboard_id, total, finished, success, fail, na)
+            SELECT t.id,
+                   COUNT(r.id),
+                   COUNT(r.id) FILTER (WHERE r.end_time IS NOT NULL),
+                   COUNT(r.id) FILTER (WHERE r.end_time IS NOT NULL AND r.job_assessment_value = '0'),
+                   COUNT(r.id) FILTER (WHERE r.end_time IS NOT NULL AND r.job_assessment_value = '1'),
+                   COUNT(r.id) FILTER (WHERE r.end_time IS NOT NULL AND r.job_assessment_value NOT IN ('0', '1'))
+            FROM apiv1_tboard t
+            LEFT JOIN apiv1_rds r ON r.tboard_id = t.id
+            GROUP BY t.id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
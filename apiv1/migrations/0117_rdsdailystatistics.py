@@ -0,0 +1,48 @@
+# Generated by Django 2.2 on 2026-10-18 18:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiv1', '0116_tboardstatistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RdsDailyStatistics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='日期')),
+                ('success', models.IntegerField(default=0, verbose_name='通过rds数量')),
+                ('fail', models.IntegerField(default=0, verbose_name='失败rds数量')),
+                ('na', models.IntegerField(default=0, verbose_name='无效rds数量')),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rds_daily_statistics', to='apiv1.Device', verbose_name='装置')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rds_daily_statistics', to='apiv1.Job', verbose_name='用例')),
+                ('tboard', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rds_daily_statistics', to='apiv1.TBoard', verbose_name='任务')),
+            ],
+            options={
+                'verbose_name_plural': '测试结果每日统计',
+                'unique_together': {('day', 'tboard', 'device', 'job')},
+            },
+        ),
+        # 根据现有Rds初始化每日计数，之后由Rds signal增量维护
+        migrations.RunSQL(
+            sql=f"""
+            INSERT INTO apiv1_rdsdailystatistics (day, tboard_id, device_id, job_id, success, fail, na)
+            SELECT (start_time AT TIME ZONE '{settings.TIME_ZONE}')::date,
+                   tboard_id,
+                   device_id,
+                   job_id,
+                   COUNT(*) FILTER (WHERE job_assessment_value = '0'),
+                   COUNT(*) FILTER (WHERE job_assessment_value = '1'),
+                   COUNT(*) FILTER (WHERE job_assessment_value NOT IN ('0', '1'))
+            FROM apiv1_rds
+            GROUP BY 1, 2, 3, 4;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 2.2 on 2026-10-18 18:39
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiv1', '0117_rdsdailystatistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DevicePowerMinute',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_datetime', models.DateTimeField(verbose_name='记录时间(分钟)')),
+                ('battery_level', models.PositiveSmallIntegerField(verbose_name='电量值')),
+                ('battery_level_min', models.PositiveSmallIntegerField(verbose_name='最低电量值')),
+                ('battery_level_max', models.PositiveSmallIntegerField(verbose_name='最高电量值')),
+                ('battery_level_avg', models.FloatField(verbose_name='平均电量值')),
+                ('charging', models.BooleanField(verbose_name='是否在充电')),
+                ('sample_count', models.IntegerField(verbose_name='原始记录数量')),
+            ],
+            options={
+                'verbose_name_plural': '装置电量(分钟汇总)',
+            },
+        ),
+        migrations.CreateModel(
+            name='DeviceTemperatureMinute',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.CharField(max_length=50, verbose_name='描述')),
+                ('record_datetime', models.DateTimeField(verbose_name='记录时间(分钟)')),
+                ('temperature', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='温度值')),
+                ('temperature_min', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='最低温度值')),
+                ('temperature_max', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='最高温度值')),
+                ('temperature_avg', models.FloatField(verbose_name='平均温度值')),
+                ('sample_count', models.IntegerField(verbose_name='原始记录数量')),
+            ],
+            options={
+                'verbose_name_plural': '装置温度(分钟汇总)',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='devicepower',
+            index=django.contrib.postgres.indexes.BrinIndex(autosummarize=True, fields=['record_datetime'], name='apiv1_devic_record__8de8ea_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='devicetemperature',
+            index=django.contrib.postgres.indexes.BrinIndex(autosummarize=True, fields=['record_datetime'], name='apiv1_devic_record__81a866_brin'),
+        ),
+        migrations.AddField(
+            model_name='devicetemperatureminute',
+            name='cabinet',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='devicetemperatureminute', to='apiv1.Cabinet', verbose_name='机柜'),
+        ),
+        migrations.AddField(
+            model_name='devicetemperatureminute',
+            name='device',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='devicetemperatureminute', to='apiv1.Device', verbose_name='装置'),
+        ),
+        migrations.AddField(
+            model_name='devicetemperatureminute',
+            name='temp_port',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='devicetemperatureminute', to='apiv1.TempPort', verbose_name='温度端口'),
+        ),
+        migrations.AddField(
+            model_name='devicepowerminute',
+            name='cabinet',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='devicepowerminute', to='apiv1.Cabinet', verbose_name='机柜'),
+        ),
+        migrations.AddField(
+            model_name='devicepowerminute',
+            name='device',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='devicepowerminute', to='apiv1.Device', verbose_name='装置'),
+        ),
+        migrations.AddField(
+            model_name='devicepowerminute',
+            name='power_port',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='devicepowerminute', to='apiv1.PowerPort', verbose_name='电量端口号'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='devicetemperatureminute',
+            unique_together={('device', 'temp_port', 'record_datetime')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='devicepowerminute',
+            unique_together={('device', 'record_datetime')},
+        ),
+    ]
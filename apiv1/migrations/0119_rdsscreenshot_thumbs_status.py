@@ -0,0 +1,26 @@
+# Generated by Django 2.2 on 2026-10-18 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiv1', '0118_device_sample_minute'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rdsscreenshot',
+            name='thumbs_status',
+            field=models.CharField(choices=[('pending', 'pending'), ('ready', 'ready'), ('failed', 'failed')], default='pending', max_length=10, verbose_name='缩略图状态'),
+        ),
+        # 既有数据的缩略图已在上传时产生，没有缩略图的视为失败
+        migrations.RunSQL(
+            sql="""
+            UPDATE apiv1_rdsscreenshot
+            SET thumbs_status = CASE WHEN thumbs_file IS NOT NULL AND thumbs_file <> '' THEN 'ready' ELSE 'failed' END
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
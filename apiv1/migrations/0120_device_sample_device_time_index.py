@@ -0,0 +1,21 @@
+# Generated by Django 2.2 on 2026-10-18 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiv1', '0119_rdsscreenshot_thumbs_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='devicepower',
+            index=models.Index(fields=['device', 'record_datetime'], name='apiv1_devic_device__9626e6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='devicetemperature',
+            index=models.Index(fields=['device', 'record_datetime'], name='apiv1_devic_device__673ba2_idx'),
+        ),
+    ]
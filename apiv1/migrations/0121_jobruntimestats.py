@@ -0,0 +1,52 @@
+# Generated by Django 2.2 on 2026-10-18 19:10
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiv1', '0120_device_sample_device_time_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobRuntimeStats',
+            fields=[
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='runtime_stats', serialize=False, to='apiv1.Job', verbose_name='用例')),
+                ('run_count', models.IntegerField(default=0, verbose_name='计入用时统计的rds数量')),
+                ('total_duration', models.DurationField(default=datetime.timedelta(0), verbose_name='总用时')),
+                ('max_duration', models.DurationField(null=True, verbose_name='最大用时')),
+                ('first_run', models.DateTimeField(null=True, verbose_name='最早运行时间')),
+                ('last_run', models.DateTimeField(null=True, verbose_name='最近运行时间')),
+            ],
+            options={
+                'verbose_name_plural': '用例运行统计',
+            },
+        ),
+        # 根据现有Rds初始化运行统计，之后由Rds signal增量维护
+        migrations.RunSQL(
+            sql="""
+            INSERT INTO apiv1_jobruntimestats (job_id, run_count, total_duration, max_duration, first_run, last_run)
+            SELECT j.id,
+                   COUNT(r.id) FILTER (WHERE counted),
+                   COALESCE(SUM(r.end_time - r.start_time) FILTER (WHERE counted), INTERVAL '0'),
+                   MAX(r.end_time - r.start_time) FILTER (WHERE counted),
+                   MIN(r.start_time) FILTER (WHERE used),
+                   MAX(r.start_time) FILTER (WHERE used)
+            FROM apiv1_job j
+            LEFT JOIN apiv1_rds r ON r.job_id = j.id
+            LEFT JOIN apiv1_tboard t ON t.id = r.tboard_id
+            LEFT JOIN apiv1_reefuser u ON u.id = t.author_id
+            CROSS JOIN LATERAL (
+                SELECT r.end_time >= r.start_time
+                       AND r.job_assessment_value IN ('0', '1', '-2', '-3', '-4', '-5', '-6', '-7') AS counted,
+                       r.id IS NOT NULL AND u.username IS DISTINCT FROM 'AITester' AS used
+            ) c
+            GROUP BY j.id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
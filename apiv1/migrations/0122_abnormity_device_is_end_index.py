@@ -0,0 +1,17 @@
+# Generated by Django 2.2 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiv1', '0121_jobruntimestats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='abnormity',
+            index=models.Index(fields=['device', 'is_end', 'start_time'], name='apiv1_abnor_device__ee6a28_idx'),
+        ),
+    ]
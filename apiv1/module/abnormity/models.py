@@ -85,6 +85,10 @@ class Abnormity(AbsBase):
 
     class Meta:
         verbose_name_plural = "异常概要"
+        indexes = [
+            # 每笔电量数据写入时查找该device未结束的异常
+            models.Index(fields=['device', 'is_end', 'start_time']),
+        ]
 
 
 class AbnormityDetail(AbsDescribe):
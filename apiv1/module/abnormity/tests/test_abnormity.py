@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apiv1.core.test import TestTool, tccounter
+from apiv1.module.abnormity.models import Abnormity, AbnormityType, AbnormityDetail, AbnormityLog
+from apiv1.module.device.models import Device, DevicePower, DevicePowerMinute
+from reef.settings import ENABLE_TCCOUNTER
+
+
+class TestAbnormity(APITestCase):
+    def setUp(self):
+        self.default_data = TestTool.load_default_data()
+        self.device = self.default_data['device']
+        self.other_device = Device.objects.create(device_label='abnormity_device', cpu_id='abnormity_cpu',
+                                                  device_name='abnormity_device', rom_version=self.device.rom_version)
+        self.power_type = AbnormityType.objects.get(code=1)
+        self.anr_type = AbnormityType.objects.get(code=2)
+        self.now = timezone.now().replace(microsecond=0)
+        self.start_time = self.now - timedelta(hours=2)
+
+        self.power_abnormity = self.create_abnormity(self.power_type, self.device, minutes=10, end_minutes=20)
+        self.create_abnormity(self.power_type, self.other_device, minutes=30, end_minutes=40)
+        # 尚未结束的电量异常不计入
+        self.create_abnormity(self.power_type, self.device, minutes=50)
+        for minutes in (10, 20):
+            anr = self.create_abnormity(self.anr_type, self.device, minutes=minutes)
+            detail = AbnormityDetail.objects.create(abnormity=anr, time=anr.start_time,
+                                                    result_data={'anr': minutes})
+            AbnormityLog.objects.create(abnormity_detail=detail, name=f'anr_{minutes}.log', type='log',
+                                        file=SimpleUploadedFile(f'anr_{minutes}.log', b'anr'))
+        # 时间范围之外
+        self.create_abnormity(self.anr_type, self.device, minutes=-10)
+
+    def create_abnormity(self, abnormity_type, device, minutes, end_minutes=None):
+        return Abnormity.objects.create(
+            abnormity_type=abnormity_type, device=device,
+            start_time=self.start_time + timedelta(minutes=minutes),
+            end_time=None if end_minutes is None else self.start_time + timedelta(minutes=end_minutes)
+        )
+
+    def time_params(self, **kwargs):
+        return {
+            'start_time': timezone.localtime(self.start_time).strftime('%Y-%m-%d %H:%M:%S'),
+            'end_time': timezone.localtime(self.now).strftime('%Y-%m-%d %H:%M:%S'),
+            'devices': f'{self.device.id},{self.other_device.id}',
+            **kwargs
+        }
+
+    @tccounter("get_abnormity_count", "get", ENABLE_TCCOUNTER)
+    def test_get_abnormity_count(self):
+        # 两个Device的参数验证及一次分组计数
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('get_abnormity_count'), self.time_params())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        counts = {item['code']: (item['abnm_num'], item['abnm_device_num']) for item in response.data['results']}
+        self.assertEqual(counts[1], (2, 2))
+        self.assertEqual(counts[2], (2, 1))
+        self.assertEqual(counts[3], (0, 0))
+
+    @tccounter("get_abnormity_list", "get", ENABLE_TCCOUNTER)
+    def test_get_power_abnormity_list(self):
+        response = self.client.get(reverse('get_abnormity_list'), self.time_params(abnormity_type=1))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['device_id'] for item in response.data], sorted([self.device.id, self.other_device.id]))
+        for item in response.data:
+            self.assertEqual(item['count'], 1)
+            self.assertEqual(len(item['time_section'][0]['data']), 1)
+
+    @tccounter("get_abnormity_list", "get", ENABLE_TCCOUNTER)
+    def test_get_anr_abnormity_list(self):
+        # 异常、详情、日志各一次查询，另有AbnormityType及两个Device的参数验证
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('get_abnormity_list'), self.time_params(abnormity_type=2))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        device_data, = response.data
+        self.assertEqual(device_data['device_id'], self.device.id)
+        time_info_list = device_data['time_section'][0]['data']
+        self.assertEqual([time_info['result_data'] for time_info in time_info_list], [{'anr': 10}, {'anr': 20}])
+        self.assertEqual(time_info_list[0]['log_list'][0]['name'], 'anr_10.log')
+
+    @tccounter("get_abnormity_list", "get", ENABLE_TCCOUNTER)
+    def test_get_abnormity_list_empty(self):
+        response = self.client.get(reverse('get_abnormity_list'), self.time_params(abnormity_type=3))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {})
+
+    @tccounter("power_abnormity_chart", "get", ENABLE_TCCOUNTER)
+    def test_power_abnormity_chart_without_raw_power(self):
+        # 异常前的原始数据已汇总到分钟表，异常后没有电量数据
+        DevicePowerMinute.objects.create(
+            device=self.device, cabinet=self.default_data['cabinet'], record_datetime=self.start_time,
+            battery_level=80, battery_level_min=80, battery_level_max=80, battery_level_avg=80, charging=False,
+            sample_count=1
+        )
+        DevicePower.objects.filter(device=self.device).delete()
+        response = self.client.get(reverse('power_abnormity_chart'), {'abnormity': self.power_abnormity.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        start_time = timezone.localtime(self.start_time).strftime('%Y-%m-%d %H:%M:%S')
+        self.assertEqual(response.data['data'], [[start_time, 80]])
@@ -1,15 +1,18 @@
 from datetime import datetime
+from itertools import groupby
+from operator import attrgetter
 
+from django.db.models import Count, Prefetch, Q
 from rest_framework import status, generics
 from rest_framework.response import Response
 
 from apiv1.core.response import ReefResponse
 from apiv1.core.utils import date_format_transverter
 from apiv1.core.view.generic import AutoExecuteSerializerGenericAPIView
-from apiv1.module.abnormity.models import AbnormityType, Abnormity, AbnormityDetail
+from apiv1.module.abnormity.models import AbnormityType, Abnormity, AbnormityDetail, AbnormityLog
 from apiv1.module.abnormity.serializer import GetAbnormityCountSerializer, AbnormityListSerializer, \
     CreateExceptionSerializer
-from apiv1.module.device.models import DevicePower
+from apiv1.module.device.business import get_nearest_power
 from apiv1.module.tboard.models import TBoard
 
 
@@ -37,25 +40,21 @@ class GetAbnormityCountView(generics.GenericAPIView):
             if not all([start_time, end_time, device_list]):
                 return Response({'message': 'missing parameter'}, status=status.HTTP_400_BAD_REQUEST)
 
-        abnm_type_queryset = AbnormityType.objects.all()
-        results = []
-        for abnm_type_obj in abnm_type_queryset:
-            # 没有结束时间的异常区分查找
-            if abnm_type_obj.code in [1]:
-                abnm_queryset = Abnormity.objects.filter(device_id__in=device_list, abnormity_type=abnm_type_obj,
-                                                         start_time__gte=start_time, end_time__lte=end_time)
-            else:
-                abnm_queryset = Abnormity.objects.filter(device_id__in=device_list, abnormity_type=abnm_type_obj,
-                                                         start_time__gte=start_time, start_time__lte=end_time)
-            abnm_device_num = abnm_queryset.values('device').distinct().count()
-            abnm_num = abnm_queryset.count()
-            result = {
+        # 每种异常类型的异常数量及设备数量，一次分组查询取得
+        in_range = abnormity_type_count_q(start_time, end_time, device_list)
+        abnm_type_queryset = AbnormityType.objects.annotate(
+            abnm_num=Count('abnormity', filter=in_range),
+            abnm_device_num=Count('abnormity__device', distinct=True, filter=in_range)
+        ).order_by('id')
+        results = [
+            {
                 'abnm_type_name': abnm_type_obj.title,
-                'abnm_num': abnm_num,
-                'abnm_device_num': abnm_device_num,
+                'abnm_num': abnm_type_obj.abnm_num,
+                'abnm_device_num': abnm_type_obj.abnm_device_num,
                 'code': abnm_type_obj.code
             }
-            results.append(result)
+            for abnm_type_obj in abnm_type_queryset
+        ]
         return Response({'results': results}, status=status.HTTP_200_OK)
 
 
@@ -86,56 +85,39 @@ class AbnormityListView(generics.GenericAPIView):
             abnm_queryset = Abnormity.objects.filter(
                 abnormity_type=abnormity_type, start_time__gte=start_time, device_id__in=device_list,
                 start_time__lt=end_time
-            )
+            ).select_related('device').order_by('device_id', 'date', 'start_time')
             # 有结束时间的异常添加筛选条件
-            if abnormity_type.code in [1]:
-                abnm_queryset.filter(end_time__lte=end_time)
-            else:
-                abnm_queryset.filter(start_time__lt=end_time)
-
+            if abnormity_type.code in ABNORMITY_CODE_WITH_END_TIME:
+                abnm_queryset = abnm_queryset.filter(end_time__lte=end_time)
+            # ANR, Crash, Exception 异常需要回传第一笔详情及其日志，一并预取
+            if abnormity_type.code in ABNORMITY_CODE_WITH_DETAIL:
+                abnm_queryset = abnm_queryset.prefetch_related(Prefetch(
+                    'abnm_detail',
+                    queryset=AbnormityDetail.objects.order_by('id').prefetch_related(
+                        Prefetch('abnormitylog', queryset=AbnormityLog.objects.order_by('id').only(
+                            'abnormity_detail', 'file', 'name'
+                        ))
+                    )
+                ))
+            abnm_list = list(abnm_queryset)
         except Exception as e:
             return Response({'error_message': f'Get abnm_queryset failed: {str(e)}' }, status=status.HTTP_400_BAD_REQUEST)
-        if not abnm_queryset.exists():
+        if not abnm_list:
             return Response({}, status=status.HTTP_200_OK)
+
         results = []
-        abnm_device_queryset = abnm_queryset.distinct('device')
-        for abnm_device_obj in abnm_device_queryset:
-            result = {'device_name': abnm_device_obj.device.device_name, 'device_id': abnm_device_obj.device.id,
-                      'time_section': [], 'device_label': abnm_device_obj.device.device_label}
-            abnm_data_queryset = abnm_queryset.filter(device_id=abnm_device_obj.device).order_by('date', 'start_time')
-            # 这里使用
-            time_template = []
-            for abnm_data in abnm_data_queryset:
-                if abnm_data.date in time_template:
-                    time_info = {'abnm_id': abnm_data.id,
-                                 'abnm_start_time': date_format_transverter(abnm_data.start_time),
-                                 'abnm_end_time': date_format_transverter(abnm_data.end_time)}
-                    # ANR, Crash, Exception 异常添加数据
-                    if abnm_data.abnormity_type.code in [2, 3, 4]:
-                        abnm_detail = abnm_data.abnm_detail.first()
-                        time_info["result_data"] = abnm_detail.result_data
-                        time_info["log_list"] = [
-                            {"log_file": "/media/" + data[0], "name": data[1]}
-                            for data in abnm_detail.abnormitylog.all().values_list('file', 'name')
-                        ]
-                    # 将数据添加到指定日期内
-                    [data['data'].append(time_info) for data in result['time_section'] if data['time'] == abnm_data.date]
-                else:
-                    time_template.append(abnm_data.date)
-                    time_info = {
-                         'abnm_id': abnm_data.id,
-                         'abnm_start_time': date_format_transverter(abnm_data.start_time),
-                         'abnm_end_time': date_format_transverter(abnm_data.end_time)
-                    }
-                    # ANR, Crash, Exception 异常添加数据
-                    if abnm_data.abnormity_type.code in [2, 3, 4]:
-                        abnm_detail = abnm_data.abnm_detail.first()
-                        time_info["result_data"] = abnm_detail.result_data
-                        time_info["log_list"] = [
-                            {"log_file": '/media/' + data[0], "name": data[1]}
-                            for data in abnm_detail.abnormitylog.all().values_list('file', 'name')
-                        ]
-                    result['time_section'].append({'time': abnm_data.date, "data": [time_info]})
+        # 已按device、日期排序，依序分组
+        for _, device_abnm_group in groupby(abnm_list, key=attrgetter('device_id')):
+            device_abnm_list = list(device_abnm_group)
+            device = device_abnm_list[0].device
+            result = {'device_name': device.device_name, 'device_id': device.id,
+                      'time_section': [], 'device_label': device.device_label}
+            # 同一日期的异常放在同一个time_section中
+            for date, date_abnm_list in groupby(device_abnm_list, key=attrgetter('date')):
+                result['time_section'].append({
+                    'time': date,
+                    'data': [abnormity_time_info(abnm_data, abnormity_type) for abnm_data in date_abnm_list]
+                })
             result['count'] = len(result['time_section'])
             results.append(result)
 
@@ -152,18 +134,22 @@ class PowerAbnormityChartView(generics.GenericAPIView):
         except Exception as e:
             return Response({'error_message': f'Get Abnormity obj failed: {e}'}, status=status.HTTP_400_BAD_REQUEST)
         abnm_detail_queryset = AbnormityDetail.objects.filter(abnormity_id=abnormity_id).order_by('time')
-        # 电量数据
+        # 电量数据，异常前后的原始数据可能已汇总到分钟表或不存在
         abnm_data_list = []
-        device_poser_lt = DevicePower.objects.filter(record_datetime__lt=abnm_obj.start_time,
-                                                     device=abnm_obj.device).order_by('record_datetime').last()
-        abnm_data_list.append([date_format_transverter(device_poser_lt.record_datetime), device_poser_lt.battery_level])
+        device_power_lt = get_nearest_power(abnm_obj.device_id, abnm_obj.start_time, before=True)
+        if device_power_lt is not None:
+            abnm_data_list.append([date_format_transverter(device_power_lt.record_datetime),
+                                   device_power_lt.battery_level])
         results = {'data': abnm_data_list, 'abnormity': [date_format_transverter(abnm_obj.start_time), date_format_transverter(abnm_obj.end_time)]}
         for abnm_deail in abnm_detail_queryset:
             result = [date_format_transverter(abnm_deail.time), abnm_deail.result_data.get('power', 0)]
             abnm_data_list.append(result)
-        device_poser_gt = DevicePower.objects.filter(record_datetime__gt=abnm_obj.end_time,
-                                                     device=abnm_obj.device).order_by('record_datetime').first()
-        abnm_data_list.append([date_format_transverter(device_poser_gt.record_datetime), device_poser_gt.battery_level])
+        # 未结束的异常没有end_time，以start_time之后的数据为准
+        device_power_gt = get_nearest_power(abnm_obj.device_id, abnm_obj.end_time or abnm_obj.start_time,
+                                            before=False)
+        if device_power_gt is not None:
+            abnm_data_list.append([date_format_transverter(device_power_gt.record_datetime),
+                                   device_power_gt.battery_level])
         return Response(results, status=status.HTTP_200_OK)
 
 
@@ -208,6 +194,40 @@ class CreateExceptionView(AutoExecuteSerializerGenericAPIView):
 # Helper function                  #
 ####################################
 
+# 有结束时间的异常类型，以结束时间判断是否在时间范围内
+ABNORMITY_CODE_WITH_END_TIME = [1]
+# 需要回传详情及日志的异常类型: ANR, Crash, Exception
+ABNORMITY_CODE_WITH_DETAIL = [2, 3, 4]
+
+
+def abnormity_type_count_q(start_time, end_time, device_list):
+    """
+    由AbnormityType统计异常数量时，异常在时间范围内的筛选条件
+    有结束时间的异常类型要求结束时间不晚于end_time，其它类型以开始时间判断
+    """
+    return Q(abnormity__device_id__in=device_list, abnormity__start_time__gte=start_time) & (
+        Q(code__in=ABNORMITY_CODE_WITH_END_TIME, abnormity__end_time__lte=end_time)
+        | (~Q(code__in=ABNORMITY_CODE_WITH_END_TIME) & Q(abnormity__start_time__lte=end_time))
+    )
+
+
+def abnormity_time_info(abnm_data, abnormity_type):
+    time_info = {
+        'abnm_id': abnm_data.id,
+        'abnm_start_time': date_format_transverter(abnm_data.start_time),
+        'abnm_end_time': date_format_transverter(abnm_data.end_time)
+    }
+    if abnormity_type.code in ABNORMITY_CODE_WITH_DETAIL:
+        abnm_detail = next(iter(abnm_data.abnm_detail.all()), None)
+        if abnm_detail is not None:
+            time_info["result_data"] = abnm_detail.result_data
+            time_info["log_list"] = [
+                {"log_file": "/media/" + log.file.name, "name": log.name}
+                for log in abnm_detail.abnormitylog.all()
+            ]
+    return time_info
+
+
 def get_tboard_info(tboard: TBoard):
 
     if tboard.finished_flag:
@@ -217,12 +237,3 @@ def get_tboard_info(tboard: TBoard):
 
     device_id_list = tboard.device.all().values_list('id', flat=True)
     return tboard.board_stamp, end_time, device_id_list
-
-
-
-
-
-
-
-
-
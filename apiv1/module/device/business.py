@@ -0,0 +1,233 @@
+import json
+import logging
+from datetime import datetime, timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from redis.exceptions import RedisError
+
+from apiv1.core.constants import REDIS_DEVICE_LATEST_POWER, DEVICE_POWER_GROUP
+from reef import settings
+from reef.settings import redis_connect
+
+logger = logging.getLogger(__name__)
+
+# 将[start, end)时间范围内的DevicePower原始数据按(设备, 分钟)汇总，删除与写入在同一条语句中完成
+# 带有battery_file的记录保留原始数据，避免文件失去关联
+COMPACT_DEVICE_POWER_SQL = """
+WITH moved AS (
+    DELETE FROM apiv1_devicepower
+    WHERE record_datetime >= %s AND record_datetime < %s
+    AND (battery_file IS NULL OR battery_file = '')
+    RETURNING device_id, cabinet_id, power_port_id, record_datetime, battery_level, charging
+)
+INSERT INTO apiv1_devicepowerminute (
+    device_id, cabinet_id, power_port_id, record_datetime,
+    battery_level, battery_level_min, battery_level_max, battery_level_avg, charging, sample_count
+)
+SELECT device_id,
+       (array_agg(cabinet_id ORDER BY record_datetime DESC))[1],
+       (array_agg(power_port_id ORDER BY record_datetime DESC))[1],
+       date_trunc('minute', record_datetime),
+       (array_agg(battery_level ORDER BY record_datetime DESC))[1],
+       min(battery_level),
+       max(battery_level),
+       avg(battery_level),
+       (array_agg(charging ORDER BY record_datetime DESC))[1],
+       count(*)
+FROM moved
+GROUP BY device_id, date_trunc('minute', record_datetime)
+ON CONFLICT (device_id, record_datetime) DO UPDATE SET
+    cabinet_id = EXCLUDED.cabinet_id,
+    power_port_id = EXCLUDED.power_port_id,
+    battery_level = EXCLUDED.battery_level,
+    battery_level_min = LEAST(apiv1_devicepowerminute.battery_level_min, EXCLUDED.battery_level_min),
+    battery_level_max = GREATEST(apiv1_devicepowerminute.battery_level_max, EXCLUDED.battery_level_max),
+    battery_level_avg = (apiv1_devicepowerminute.battery_level_avg * apiv1_devicepowerminute.sample_count
+                         + EXCLUDED.battery_level_avg * EXCLUDED.sample_count)
+                        / (apiv1_devicepowerminute.sample_count + EXCLUDED.sample_count),
+    charging = EXCLUDED.charging,
+    sample_count = apiv1_devicepowerminute.sample_count + EXCLUDED.sample_count
+RETURNING device_id
+"""
+
+COMPACT_DEVICE_TEMPERATURE_SQL = """
+WITH moved AS (
+    DELETE FROM apiv1_devicetemperature
+    WHERE record_datetime >= %s AND record_datetime < %s
+    RETURNING device_id, cabinet_id, temp_port_id, description, record_datetime, temperature
+)
+INSERT INTO apiv1_devicetemperatureminute (
+    device_id, cabinet_id, temp_port_id, description, record_datetime,
+    temperature, temperature_min, temperature_max, temperature_avg, sample_count
+)
+SELECT device_id,
+       (array_agg(cabinet_id ORDER BY record_datetime DESC))[1],
+       temp_port_id,
+       (array_agg(description ORDER BY record_datetime DESC))[1],
+       date_trunc('minute', record_datetime),
+       (array_agg(temperature ORDER BY record_datetime DESC))[1],
+       min(temperature),
+       max(temperature),
+       avg(temperature),
+       count(*)
+FROM moved
+GROUP BY device_id, temp_port_id, date_trunc('minute', record_datetime)
+ON CONFLICT (device_id, temp_port_id, record_datetime) DO UPDATE SET
+    cabinet_id = EXCLUDED.cabinet_id,
+    description = EXCLUDED.description,
+    temperature = EXCLUDED.temperature,
+    temperature_min = LEAST(apiv1_devicetemperatureminute.temperature_min, EXCLUDED.temperature_min),
+    temperature_max = GREATEST(apiv1_devicetemperatureminute.temperature_max, EXCLUDED.temperature_max),
+    temperature_avg = (apiv1_devicetemperatureminute.temperature_avg * apiv1_devicetemperatureminute.sample_count
+                       + EXCLUDED.temperature_avg * EXCLUDED.sample_count)
+                      / (apiv1_devicetemperatureminute.sample_count + EXCLUDED.sample_count),
+    sample_count = apiv1_devicetemperatureminute.sample_count + EXCLUDED.sample_count
+RETURNING device_id
+"""
+
+
+def compact_device_samples(model, compact_sql, cutoff: datetime) -> set:
+    """
+    将model中record_datetime早于cutoff的原始数据按分钟汇总，
+    以天为单位分批执行，每一批在独立的事务中完成，避免长事务及大量数据同时锁定
+    返回有数据被汇总的device id，用于清除对应的图表缓存
+    """
+    oldest = model.objects.filter(record_datetime__lt=cutoff).order_by('record_datetime') \
+        .values_list('record_datetime', flat=True).first()
+    if oldest is None:
+        return set()
+
+    device_ids = set()
+    start = oldest
+    while start < cutoff:
+        end = min(start + timedelta(days=1), cutoff)
+        with transaction.atomic(), connection.cursor() as sql:
+            sql.execute(compact_sql, [start, end])
+            device_ids.update(row[0] for row in sql.fetchall())
+        start = end
+    return device_ids
+
+
+def get_nearest_power(device_id, record_datetime, before=True):
+    """
+    取得device在record_datetime之前(before=True)或之后最接近的一笔电量记录，
+    原始数据超过保留期限后已汇总到DevicePowerMinute，两个表都查询后取时间最接近的一笔
+    回传DevicePower或DevicePowerMinute(均有record_datetime, battery_level)，都没有数据时回传None
+    """
+    from apiv1.module.device.models import DevicePower, DevicePowerMinute
+
+    if before:
+        lookup, ordering = {'record_datetime__lt': record_datetime}, '-record_datetime'
+    else:
+        lookup, ordering = {'record_datetime__gt': record_datetime}, 'record_datetime'
+    candidates = [
+        model.objects.filter(device_id=device_id, **lookup).order_by(ordering).first()
+        for model in (DevicePower, DevicePowerMinute)
+    ]
+    candidates = [candidate for candidate in candidates if candidate is not None]
+    if not candidates:
+        return None
+    return (max if before else min)(candidates, key=lambda candidate: candidate.record_datetime)
+
+
+# 只有记录时间不早于已存的值时才更新，避免客户端补传的旧数据覆盖最新电量
+SET_LATEST_POWER_SCRIPT = redis_connect.register_script("""
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if current and cjson.decode(current)['timestamp'] > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+return 1
+""")
+
+
+def _latest_power_value(device_power) -> dict:
+    record_datetime = device_power.record_datetime
+    if isinstance(record_datetime, str):
+        record_datetime = parse_datetime(record_datetime)
+    return {
+        'device': device_power.device_id,
+        'battery_level': device_power.battery_level,
+        'charging': device_power.charging,
+        'record_datetime': timezone.localtime(record_datetime).strftime(
+            settings.REST_FRAMEWORK.get('DATETIME_FORMAT', '%Y-%m-%d %H:%M:%S')),
+        'timestamp': record_datetime.timestamp()
+    }
+
+
+def set_latest_power(device_power):
+    """
+    更新device的最新电量，有更新时通过websocket(DEVICE_POWER_GROUP)推送给订阅者
+    在电量写入的事务提交后执行，redis写入失败时只记录日志并尽量删除旧值，电量数据仍已写入数据库，
+    get_latest_power取不到时会从数据库补齐
+    """
+    value = _latest_power_value(device_power)
+    try:
+        updated = SET_LATEST_POWER_SCRIPT(
+            keys=[REDIS_DEVICE_LATEST_POWER],
+            args=[device_power.device_id, value['timestamp'], json.dumps(value)]
+        )
+    except RedisError:
+        logger.exception(f'set latest power failed: device {device_power.device_id}')
+        # 移除已过时的值，读取时改由数据库补齐；redis仍不可用时读取同样会改用数据库
+        try:
+            redis_connect.hdel(REDIS_DEVICE_LATEST_POWER, device_power.device_id)
+        except RedisError:
+            pass
+        return
+    if updated:
+        try:
+            async_to_sync(get_channel_layer().group_send)(DEVICE_POWER_GROUP, {
+                "type": "send_message",
+                "message": [value]
+            })
+        except Exception:
+            # channel layer(aioredis)的异常不继承RedisError
+            logger.exception(f'send latest power failed: device {device_power.device_id}')
+
+
+def _latest_power_from_db(device_ids=None) -> dict:
+    """
+    以一次查询从数据库取得device(None为全部)的最新电量
+    """
+    from apiv1.module.device.models import DevicePower
+
+    device_powers = DevicePower.objects.all()
+    if device_ids is not None:
+        device_powers = device_powers.filter(device_id__in=device_ids)
+    device_powers = device_powers.order_by('device_id', '-record_datetime').distinct('device_id')
+    return {device_power.device_id: _latest_power_value(device_power) for device_power in device_powers}
+
+
+def get_latest_power(device_ids: list) -> dict:
+    """
+    以HMGET一次取得多个device的最新电量，redis中没有的device(如redis数据被清除或写入的事务尚未提交)
+    再从数据库以一次查询补齐，redis不可用时全部从数据库取得
+    返回 {device_id: {'device', 'battery_level', 'charging', 'record_datetime', 'timestamp'}}
+    """
+    if not device_ids:
+        return {}
+    try:
+        values = redis_connect.hmget(REDIS_DEVICE_LATEST_POWER, device_ids)
+    except RedisError:
+        logger.exception('get latest power from redis failed')
+        values = [None] * len(device_ids)
+    result = {
+        device_id: json.loads(value) for device_id, value in zip(device_ids, values) if value is not None
+    }
+    missing = [device_id for device_id in device_ids if device_id not in result]
+    if missing:
+        result.update(_latest_power_from_db(missing))
+    return result
+
+
+def get_all_latest_power() -> list:
+    try:
+        return [json.loads(value) for value in redis_connect.hvals(REDIS_DEVICE_LATEST_POWER)]
+    except RedisError:
+        logger.exception('get all latest power from redis failed')
+        return list(_latest_power_from_db().values())
@@ -0,0 +1,35 @@
+import json
+
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import WebsocketConsumer
+
+from apiv1.core.constants import DEVICE_POWER_GROUP
+from apiv1.module.device.business import get_all_latest_power
+
+
+class DevicePowerConsumer(WebsocketConsumer):
+    def connect(self):
+        # Join group
+        async_to_sync(self.channel_layer.group_add)(
+            DEVICE_POWER_GROUP,
+            self.channel_name
+        )
+        self.accept()
+
+        # 连接后先发送一次所有device的最新电量，之后只推送有更新的device
+        self.send_message({"message": get_all_latest_power()})
+
+    def disconnect(self, close_code):
+        # Leave group
+        async_to_sync(self.channel_layer.group_discard)(
+            DEVICE_POWER_GROUP,
+            self.channel_name
+        )
+
+    def receive(self, text_data):
+        pass
+
+    def send_message(self, event):
+        self.send(text_data=json.dumps({
+            "message": event["message"]
+        }))
@@ -1,7 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.postgres.fields import JSONField
-from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
 
 from apiv1.core.constants import PANEVIEW_TYPE_MATRIX, PANEVIEW_TYPE_MAP, PANESLOT_STATUS_OK, PANESLOT_STATUS_EMPTY, \
     PANESLOT_STATUS_ERROR, DEVICE_OCCUPY_TYPE_JOB_EDITOR, PANEVIEW_TYPE_TEST_BOX, DEVICE_TYPE_TEST_BOX, DEVICE_TYPE_ADB
@@ -273,17 +273,26 @@ class DevicePower(models.Model):
 
     class Meta:
         verbose_name_plural = "装置电量"
+        indexes = [
+            BrinIndex(
+                autosummarize=True,
+                fields=['record_datetime'],
+            ),
+            # 查询某device在某时间点前后最接近的一笔数据(e.g. 计算Rds耗电量)
+            models.Index(fields=['device', 'record_datetime']),
+        ]
 
     def save(self, **kwargs):
         # devicepower表中power_port字段可以为null，如果表中device字段有关联到powerport
         # 则在保存的时候会将device的powerport填入power_port字段中
         super(DevicePower, self).save()
-        if self.power_port is not None:
-            return
-        if not hasattr(self.device, 'powerport'):
-            return
-        self.power_port = self.device.powerport
-        self.save()
+        if self.power_port is None and hasattr(self.device, 'powerport'):
+            self.power_port = self.device.powerport
+            super(DevicePower, self).save()
+
+        # 事务提交后再更新最新电量，避免回滚的数据被推送
+        from apiv1.module.device.business import set_latest_power
+        transaction.on_commit(lambda: set_latest_power(self))
 
 
 class DeviceScreenshot(models.Model):
@@ -313,6 +322,60 @@ class DeviceTemperature(models.Model):
 
     class Meta:
         verbose_name_plural = "装置温度"
+        indexes = [
+            BrinIndex(
+                autosummarize=True,
+                fields=['record_datetime'],
+            ),
+            models.Index(fields=['device', 'record_datetime']),
+        ]
+
+
+class DevicePowerMinute(models.Model):
+    """
+    超过保留期限的DevicePower原始数据，由定时任务compact_device_power_temperature按分钟汇总到此表，
+    battery_level/charging为该分钟内最后一笔记录的值，与DevicePower的字段对应，供图表接口合并查询
+    """
+    device = models.ForeignKey("Device", on_delete=models.CASCADE, related_name='devicepowerminute', verbose_name='装置')
+    cabinet = models.ForeignKey("Cabinet", on_delete=models.CASCADE, related_name='devicepowerminute',
+                                verbose_name='机柜')
+    power_port = models.ForeignKey("PowerPort", on_delete=models.PROTECT, related_name='devicepowerminute', null=True,
+                                   verbose_name='电量端口号')
+    record_datetime = models.DateTimeField(verbose_name='记录时间(分钟)')
+    battery_level = models.PositiveSmallIntegerField(verbose_name='电量值')
+    battery_level_min = models.PositiveSmallIntegerField(verbose_name='最低电量值')
+    battery_level_max = models.PositiveSmallIntegerField(verbose_name='最高电量值')
+    battery_level_avg = models.FloatField(verbose_name='平均电量值')
+    charging = models.BooleanField(verbose_name='是否在充电')
+    sample_count = models.IntegerField(verbose_name='原始记录数量')
+
+    class Meta:
+        verbose_name_plural = "装置电量(分钟汇总)"
+        unique_together = [['device', 'record_datetime']]
+
+
+class DeviceTemperatureMinute(models.Model):
+    """
+    超过保留期限的DeviceTemperature原始数据，按(设备, 温度端口, 分钟)汇总到此表，
+    temperature为该分钟内最后一笔记录的值
+    """
+    device = models.ForeignKey("Device", on_delete=models.CASCADE, related_name='devicetemperatureminute',
+                               verbose_name='装置')
+    cabinet = models.ForeignKey("Cabinet", on_delete=models.CASCADE, related_name='devicetemperatureminute',
+                                verbose_name='机柜')
+    description = models.CharField(max_length=50, verbose_name='描述')
+    temp_port = models.ForeignKey("TempPort", on_delete=models.PROTECT, related_name='devicetemperatureminute',
+                                  verbose_name='温度端口')
+    record_datetime = models.DateTimeField(verbose_name='记录时间(分钟)')
+    temperature = models.DecimalField(max_digits=5, decimal_places=2, verbose_name='温度值')
+    temperature_min = models.DecimalField(max_digits=5, decimal_places=2, verbose_name='最低温度值')
+    temperature_max = models.DecimalField(max_digits=5, decimal_places=2, verbose_name='最高温度值')
+    temperature_avg = models.FloatField(verbose_name='平均温度值')
+    sample_count = models.IntegerField(verbose_name='原始记录数量')
+
+    class Meta:
+        verbose_name_plural = "装置温度(分钟汇总)"
+        unique_together = [['device', 'temp_port', 'record_datetime']]
 
 
 class MonitorPort(models.Model):
@@ -1,9 +1,10 @@
 from django.apps import apps
 from django.db import connection
 from django.db import models
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import Signal, receiver
 
+from apiv1.core.cache import invalidate_cache
 from apiv1.core.constants import DEVICE_STATUS_BUSY, DEVICE_STATUS_IDLE
 from apiv1.core.utils import ReefLogger
 
@@ -48,6 +49,17 @@ def subsidiary_device_handler(sender, instance=None, **kwargs):
         )
 
 
+@receiver([post_save, post_delete], sender='apiv1.DevicePower', dispatch_uid='device_power_cache_invalidate')
+def device_power_cache_invalidate_handler(sender, instance=None, **kwargs):
+    invalidate_cache('devicepower', device=instance.device_id)
+
+
+@receiver([post_save, post_delete], sender='apiv1.DeviceTemperature',
+          dispatch_uid='device_temperature_cache_invalidate')
+def device_temperature_cache_invalidate_handler(sender, instance=None, **kwargs):
+    invalidate_cache('devicetemperature', device=instance.device_id)
+
+
 class UpdateDeviceStatus:
     """
     设备，僚机状态修改统一管理。
@@ -165,7 +177,7 @@ update、post_bulk_create更新数据都是直接作用数据库，update的时
 bulk_create 批量创建一定数量时，每一笔都触发signal，会影响性能，所以先去除
 """
 
-post_update = Signal(providing_args=['queryset'])
+post_update = Signal(providing_args=['queryset', 'fields'])
 post_bulk_create = Signal()
 
 
@@ -184,7 +196,7 @@ def post_bulk_create_callback(sender, instance=None, **kwargs):
 class QuerySet(models.query.QuerySet):
     def update(self, **kwargs):
         super(QuerySet, self).update(**kwargs)
-        post_update.send(sender=self.model, queryset=self)
+        post_update.send(sender=self.model, queryset=self, fields=tuple(kwargs))
 
     # def bulk_create(self, objs, batch_size=None, **kwargs):
     #     super(QuerySet, self).bulk_create(objs, **kwargs)
@@ -15,3 +15,29 @@ def sync_device_paneslot_status(*args, **kwargs):
         else:
             paneslot.status = constants.PANESLOT_STATUS_OK
         paneslot.save()
+
+
+@celery_app.task
+def compact_device_power_temperature(*args, **kwargs):
+    """
+    将超过保留期限(DEVICE_SAMPLE_RAW_RETENTION_DAYS)的DevicePower/DeviceTemperature原始数据按分钟汇总，
+    汇总后原始数据删除，图表接口会同时查询原始数据与汇总数据
+    """
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    from apiv1.core.cache import invalidate_cache
+    from apiv1.module.device.business import compact_device_samples, COMPACT_DEVICE_POWER_SQL, \
+        COMPACT_DEVICE_TEMPERATURE_SQL
+    from apiv1.models import DevicePower, DeviceTemperature
+
+    cutoff = timezone.now() - timedelta(days=constants.DEVICE_SAMPLE_RAW_RETENTION_DAYS)
+    # 只汇总完整的分钟，避免同一分钟的数据被拆到原始表和汇总表中
+    cutoff = cutoff.replace(second=0, microsecond=0)
+    device_ids = compact_device_samples(DevicePower, COMPACT_DEVICE_POWER_SQL, cutoff)
+    if device_ids:
+        invalidate_cache('devicepower', device=list(device_ids))
+    device_ids = compact_device_samples(DeviceTemperature, COMPACT_DEVICE_TEMPERATURE_SQL, cutoff)
+    if device_ids:
+        invalidate_cache('devicetemperature', device=list(device_ids))
@@ -1,9 +1,14 @@
+from datetime import timedelta
+
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from apiv1.core.constants import DEVICE_SAMPLE_RAW_RETENTION_DAYS
 from apiv1.core.test import TestTool, tccounter
-from apiv1.module.device.models import Device, PowerPort
+from apiv1.module.device.models import Device, PowerPort, DevicePower, DevicePowerMinute
+from apiv1.module.device.tasks.periodtasks import compact_device_power_temperature
 from reef.settings import ENABLE_TCCOUNTER
 
 
@@ -134,6 +139,27 @@ class TestDevicePower(APITestCase):
         response = self.client.get(f"{reverse('devicepower_list')}?fields=device,device.id,battery_level")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    @tccounter("devicepower_list", "get", ENABLE_TCCOUNTER)
+    def test_get_only_raw_retention_window(self):
+        """
+        超过保留期限的数据汇总到DevicePowerMinute后，不再由此接口回传
+        """
+        old_power = DevicePower.objects.create(
+            device=self.default_data['device'],
+            cabinet=self.default_data['cabinet'],
+            battery_level=60,
+            charging=False,
+            record_datetime=timezone.now() - timedelta(days=DEVICE_SAMPLE_RAW_RETENTION_DAYS + 1)
+        )
+        compact_device_power_temperature()
+        self.assertTrue(DevicePowerMinute.objects.filter(device=self.default_data['device']).exists())
+
+        response = self.client.get(f"{reverse('devicepower_list')}?fields=id")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        power_ids = [power['id'] for power in response.data['devicepowers']]
+        self.assertIn(self.default_id, power_ids)
+        self.assertNotIn(old_power.id, power_ids)
+
     @tccounter("devicepower_detail", "get", ENABLE_TCCOUNTER)
     def test_get_instance_by_id(self):
         """
@@ -1,4 +1,7 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from rest_framework import status
 from rest_framework.test import APITestCase
 
 from apiv1.core.test import TestTool, tccounter
@@ -42,3 +45,29 @@ class TestGetDevicePowerBatterLevel(APITestCase):
         )
         self.assertEqual(response.data, [{'device': device.id,
                                           'battery_level': self.default_data['device_power'].battery_level}])
+
+    @tccounter("get_device_power_battery_level", "get", ENABLE_TCCOUNTER)
+    def test_multi_device_single_lookup(self):
+        """
+        多个device的电量以一次查询取得，不存在的device回传None
+        """
+        device = self.default_data['device']
+        device.status = 'idle'
+        device.save()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('get_device_power_battery_level')
+                + f'?device_id={device.id},{device.id + 1000}'
+            )
+        self.assertEqual(response.data, [
+            {'device': device.id, 'battery_level': self.default_data['device_power'].battery_level},
+            {'device': device.id + 1000, 'battery_level': None}
+        ])
+        self.assertLessEqual(
+            len([query for query in queries.captured_queries if '"apiv1_devicepower"' in query['sql']]), 1
+        )
+
+    @tccounter("get_device_power_battery_level", "get", ENABLE_TCCOUNTER)
+    def test_invalid_device_id(self):
+        response = self.client.get(reverse('get_device_power_battery_level') + '?device_id=1,a')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,9 +1,13 @@
+from datetime import datetime, timedelta
+
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from apiv1.core.test import TestTool, tccounter
-from apiv1.module.device.models import DevicePower
+from apiv1.module.device.models import DevicePower, DevicePowerMinute
+from apiv1.module.device.tasks.periodtasks import compact_device_power_temperature
 from reef.settings import ENABLE_TCCOUNTER
 
 
@@ -50,3 +54,110 @@ class TestGetDevicePowerRapid(APITestCase):
         )
         record_datetime = response.data['devicepowers'][0]['record_datetime']
         self.assertEqual(record_datetime, '2018-05-05 20:00:00')
+
+    @tccounter("get_device_power_rapid", "get", ENABLE_TCCOUNTER)
+    def test_downsample_keep_peak(self):
+        """
+        数据量超过points时降采样，回传点数不超过points且保留峰值
+        """
+        start = datetime(2018, 6, 1, tzinfo=timezone.utc)
+        DevicePower.objects.bulk_create([
+            DevicePower(
+                device=self.default_data['device'],
+                cabinet=self.default_data['cabinet'],
+                power_port=self.default_data['power_port'],
+                battery_level=100 if index == 333 else 50,
+                record_datetime=start + timedelta(seconds=index),
+                charging=False
+            ) for index in range(1000)
+        ])
+        response = self.client.get(
+            reverse('get_device_power_rapid'),
+            {
+                'record_datetime__gt': '2018-06-01T00:00:00Z',
+                'device_id': self.default_data["device"].id,
+                'points': 40
+            }
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        battery_levels = [power['battery_level'] for power in response.data['devicepowers']]
+        self.assertLessEqual(len(battery_levels), 40)
+        self.assertIn(100, battery_levels)
+
+    @tccounter("get_device_power_rapid", "get", ENABLE_TCCOUNTER)
+    def test_downsample_compacted_keep_peak_minute(self):
+        """
+        汇总数据降采样时以每分钟的最小/最大值选取记录，保留峰值所在的分钟
+        """
+        start = datetime(2018, 6, 1, tzinfo=timezone.utc)
+        peaks = {333: (50, 100), 666: (1, 50)}
+        DevicePowerMinute.objects.bulk_create([
+            DevicePowerMinute(
+                device=self.default_data['device'],
+                cabinet=self.default_data['cabinet'],
+                power_port=self.default_data['power_port'],
+                battery_level=50,
+                battery_level_min=peaks.get(index, (50, 50))[0],
+                battery_level_max=peaks.get(index, (50, 50))[1],
+                battery_level_avg=50,
+                charging=False,
+                sample_count=60,
+                record_datetime=start + timedelta(minutes=index)
+            ) for index in range(1000)
+        ])
+        response = self.client.get(
+            reverse('get_device_power_rapid'),
+            {
+                'record_datetime__gt': '2018-05-31T00:00:00Z',
+                'record_datetime__lt': '2018-06-02T00:00:00Z',
+                'device_id': self.default_data["device"].id,
+                'points': 40
+            }
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        record_datetimes = [power['record_datetime'] for power in response.data['devicepowers']]
+        self.assertLessEqual(len(record_datetimes), 40)
+        for index in peaks:
+            self.assertIn(
+                timezone.localtime(start + timedelta(minutes=index)).strftime('%Y-%m-%d %H:%M:%S'), record_datetimes
+            )
+
+    @tccounter("get_device_power_rapid", "get", ENABLE_TCCOUNTER)
+    def test_query_across_raw_and_compacted(self):
+        """
+        超过保留期限的数据按分钟汇总后，接口同时回传汇总数据与原始数据
+        """
+        start = datetime(2018, 6, 1, tzinfo=timezone.utc)
+        recent = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        DevicePower.objects.bulk_create([
+            DevicePower(
+                device=self.default_data['device'],
+                cabinet=self.default_data['cabinet'],
+                power_port=self.default_data['power_port'],
+                battery_level=battery_level,
+                record_datetime=record_datetime,
+                charging=False
+            ) for battery_level, record_datetime in (
+                (60, start), (40, start + timedelta(seconds=20)), (50, start + timedelta(seconds=40)), (30, recent)
+            )
+        ])
+        compact_device_power_temperature()
+
+        minute = DevicePowerMinute.objects.get(device=self.default_data['device'], record_datetime=start)
+        self.assertEqual(
+            (minute.battery_level, minute.battery_level_min, minute.battery_level_max, minute.sample_count),
+            (50, 40, 60, 3)
+        )
+        self.assertAlmostEqual(minute.battery_level_avg, 50)
+        self.assertFalse(DevicePower.objects.filter(record_datetime__lt=recent).exists())
+
+        response = self.client.get(
+            reverse('get_device_power_rapid'),
+            {
+                'record_datetime__gt': '2018-05-31T00:00:00Z',
+                'device_id': self.default_data["device"].id
+            }
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        battery_levels = [power['battery_level'] for power in response.data['devicepowers']]
+        self.assertEqual(battery_levels, [50, 30])
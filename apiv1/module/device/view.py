@@ -4,6 +4,8 @@ import re
 import asyncio
 
 from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.db.models.expressions import RawSQL
 from django.http import FileResponse
 from django.utils import timezone
 from drf_yasg import openapi
@@ -15,7 +17,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from collections import defaultdict
 
-from apiv1.core.cache import cache_dcr
+from apiv1.core.cache import cache_dcr, cache_tag
 from apiv1.core.constants import REDIS_CACHE_GET_DEVICE_TEMPERATURE_RAPID, REDIS_CACHE_GET_DEVICE_POWER_RAPID, \
     PANEVIEW_TYPE_TEST_BOX, DEVICE_STATUS_IDLE, DEVICE_STATUS_OFFLINE, DEVICE_STATUS_BUSY
 from apiv1.core.request import ReefRequest, sync_info_to_coral
@@ -24,8 +26,9 @@ from apiv1.core.status import StatusCode
 from apiv1.core.tool import CleanObjRelated
 from apiv1.core.utils import ReefLogger
 from apiv1.core.view.generic import AutoExecuteSerializerGenericAPIView
+from apiv1.module.device.business import get_latest_power
 from apiv1.module.device.models import DeviceTemperature, DevicePower, DeviceScreenshot, Device, DeviceCoordinate, \
-    PaneSlot, DeviceCutCoordinate, SubsidiaryDevice, PhoneModel, RomVersion, AndroidVersion, Manufacturer, \
+    DeviceTemperatureMinute, DevicePowerMinute, PaneSlot, DeviceCutCoordinate, SubsidiaryDevice, PhoneModel, RomVersion, AndroidVersion, Manufacturer, \
     PhoneModelCustomCoordinate, PowerStrategy
 from apiv1.module.device.models import PowerPort, TempPort
 from apiv1.module.device.serializer import CreateDeviceScreenshotSerializer, CoralDeviceSerializer, \
@@ -52,17 +55,123 @@ def _swagger_extra_param():
     return [record_datetime__gt, record_datetime__lt, device_id]
 
 
+def _swagger_downsample_param():
+    points = openapi.Parameter('points', openapi.IN_QUERY, description="max number of points, default 2000",
+                               type=openapi.TYPE_INTEGER)
+    return [points]
+
+
+def device_cache_tag(resource, request):
+    """
+    电量/温度图表缓存的tag，指定device_id时只依赖该设备的数据
+    """
+    device_id = request.query_params.get('device_id', None)
+    return cache_tag(resource) if device_id is None else cache_tag(resource, device=device_id)
+
+
+def device_power_rapid_data(query_params) -> dict:
+    """
+    电量图表数据，由GetDevicePowerRapidView及cache_dcr后台刷新缓存时调用
+    """
+    record_datetime__gt = query_params.get('record_datetime__gt', None)
+    record_datetime__lt = query_params.get('record_datetime__lt', None)
+    device_id = query_params.get('device_id', None)
+
+    filters = {}
+
+    if record_datetime__gt is not None:
+        filters['record_datetime__gt'] = record_datetime__gt
+
+    if record_datetime__lt is not None:
+        filters['record_datetime__lt'] = record_datetime__lt
+
+    if device_id is not None:
+        filters['device_id'] = device_id
+
+    queryset = tiered_time_series(
+        DevicePower.objects.filter(**filters),
+        DevicePowerMinute.objects.filter(**filters),
+        'battery_level',
+        ('device_id', 'record_datetime', 'power_port__port', 'battery_level', 'charging'),
+        get_downsample_threshold(query_params)
+    )
+
+    return_data = {
+        'devicepowers': [
+            {
+                'device': {
+                    'id': power['device_id']
+                },
+                'record_datetime': power['record_datetime'].astimezone(timezone.get_current_timezone()).strftime(
+                    settings.REST_FRAMEWORK.get('DATETIME_FORMAT', '%Y-%m-%d %H:%M:%S')),
+                'power_port': {
+                    'port': power['power_port__port']
+                },
+                'battery_level': power['battery_level'],
+                'charging': power['charging']
+            } for power in queryset]
+    }
+
+    return return_data
+
+
+def device_temperature_rapid_data(query_params) -> dict:
+    """
+    温度图表数据，由GetDeviceTemperatureRapidView及cache_dcr后台刷新缓存时调用
+    """
+    record_datetime__gt = query_params.get('record_datetime__gt', None)
+    record_datetime__lt = query_params.get('record_datetime__lt', None)
+    device_id = query_params.get('device_id', None)
+
+    filters = {}
+
+    if record_datetime__gt is not None:
+        filters['record_datetime__gt'] = record_datetime__gt
+
+    if record_datetime__lt is not None:
+        filters['record_datetime__lt'] = record_datetime__lt
+
+    if device_id is not None:
+        filters['device_id'] = device_id
+
+    queryset = tiered_time_series(
+        DeviceTemperature.objects.filter(**filters),
+        DeviceTemperatureMinute.objects.filter(**filters),
+        'temperature',
+        ('device_id', 'record_datetime', 'temp_port__port', 'temperature'),
+        get_downsample_threshold(query_params)
+    )
+
+    return_data = {
+        'devicetemperatures': [
+            {
+                'device': {
+                    'id': temp['device_id']
+                },
+                'record_datetime': temp['record_datetime'].astimezone(timezone.get_current_timezone()).strftime(
+                    settings.REST_FRAMEWORK.get('DATETIME_FORMAT', '%Y-%m-%d %H:%M:%S'))
+                ,
+                'temp_port': {
+                    'port': temp['temp_port__port']
+                },
+                'temperature': temp['temperature']
+            } for temp in queryset]
+    }
+    return return_data
+
+
 class GetDevicePowerRapidView(generics.GenericAPIView):
     """
     提供设备电量信息，以供图表绘制
     """
 
-    @swagger_auto_schema(manual_parameters=_swagger_extra_param())
+    @swagger_auto_schema(manual_parameters=_swagger_extra_param() + _swagger_downsample_param())
     @action(detail=True, methods=['get'])
-    @cache_dcr(key_leading=REDIS_CACHE_GET_DEVICE_POWER_RAPID, ttl_in_second=300)
+    @cache_dcr(key_leading=REDIS_CACHE_GET_DEVICE_POWER_RAPID, ttl_in_second=60, stale_while_revalidate=300,
+               refresh_func=device_power_rapid_data, tags=lambda request: [device_cache_tag('devicepower', request)])
     def get(self, request):
         """
-        :param request: device_id/record_datetime__gt/record_datetime__lt(3个参数可传可不传)
+        :param request: device_id/record_datetime__gt/record_datetime__lt/points(4个参数可传可不传)
         :return:
             {
                 'devicepowers': [
@@ -75,49 +184,7 @@ class GetDevicePowerRapidView(generics.GenericAPIView):
                     }]
             }
         """
-        query_params = request.query_params
-        record_datetime__gt = query_params.get('record_datetime__gt', None)
-        record_datetime__lt = query_params.get('record_datetime__lt', None)
-        device_id = query_params.get('device_id', None)
-
-        queryset = DevicePower.objects.all()
-
-        if record_datetime__gt is not None:
-            queryset = queryset.filter(record_datetime__gt=record_datetime__gt)
-
-        if record_datetime__lt is not None:
-            queryset = queryset.filter(record_datetime__lt=record_datetime__lt)
-
-        if device_id is not None:
-            queryset = queryset.filter(device_id=device_id)
-
-        queryset = queryset.values(
-            'device_id',
-            'record_datetime',
-            'power_port__port',
-            'battery_level',
-            'charging'
-        ).order_by('record_datetime')
-
-        queryset = data_reduce(queryset)
-
-        return_data = {
-            'devicepowers': [
-                {
-                    'device': {
-                        'id': power['device_id']
-                    },
-                    'record_datetime': power['record_datetime'].astimezone(timezone.get_current_timezone()).strftime(
-                        settings.REST_FRAMEWORK.get('DATETIME_FORMAT', '%Y-%m-%d %H:%M:%S')),
-                    'power_port': {
-                        'port': power['power_port__port']
-                    },
-                    'battery_level': power['battery_level'],
-                    'charging': power['charging']
-                } for power in queryset]
-        }
-
-        return Response(return_data, status=status.HTTP_200_OK)
+        return Response(device_power_rapid_data(request.query_params), status=status.HTTP_200_OK)
 
 
 class GetDevicePowerBatteryLevel(generics.GenericAPIView):
@@ -140,18 +207,24 @@ class GetDevicePowerBatteryLevel(generics.GenericAPIView):
         if device_id == '':
             return Response({'error': 'device_id field cannot be blank'}, status=status.HTTP_400_BAD_REQUEST)
 
-        return_data = []
-
-        for dev_id in device_id.split(','):
-            device_power = DevicePower.objects.filter(device_id=dev_id).order_by('-record_datetime').first()
-
-            if not hasattr(device_power, 'device'):
-                return_data.append({'device': int(dev_id), 'battery_level': None})
-            else:
-                if device_power.device.status in ['busy', 'idle']:
-                    return_data.append({'device': device_power.device.id, 'battery_level': device_power.battery_level})
-                else:
-                    return_data.append({'device': int(dev_id), 'battery_level': None})
+        try:
+            device_ids = [int(dev_id) for dev_id in device_id.split(',')]
+        except ValueError:
+            return Response({'error': 'device_id should be integers separated by comma'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # 最新电量由DevicePower.save写入redis，一次取得所有device的电量及状态
+        latest_power = get_latest_power(device_ids)
+        online_devices = set(Device.objects.filter(
+            id__in=latest_power.keys(), status__in=[DEVICE_STATUS_BUSY, DEVICE_STATUS_IDLE]
+        ).values_list('id', flat=True))
+
+        return_data = [
+            {
+                'device': dev_id,
+                'battery_level': latest_power[dev_id]['battery_level'] if dev_id in online_devices else None
+            } for dev_id in device_ids
+        ]
 
         return Response(return_data, status=status.HTTP_200_OK)
 
@@ -196,12 +269,14 @@ class GetDeviceTemperatureRapidView(generics.GenericAPIView):
     提供设备温度信息，以供图表绘制
     """
 
-    @swagger_auto_schema(manual_parameters=_swagger_extra_param())
+    @swagger_auto_schema(manual_parameters=_swagger_extra_param() + _swagger_downsample_param())
     @action(detail=True, methods=['get'])
-    @cache_dcr(key_leading=REDIS_CACHE_GET_DEVICE_TEMPERATURE_RAPID, ttl_in_second=300)
+    @cache_dcr(key_leading=REDIS_CACHE_GET_DEVICE_TEMPERATURE_RAPID, ttl_in_second=60, stale_while_revalidate=300,
+               refresh_func=device_temperature_rapid_data,
+               tags=lambda request: [device_cache_tag('devicetemperature', request)])
     def get(self, request):
         """
-        :param request:  device_id/record_datetime__gt/record_datetime__lt(3个参数可传可不传)
+        :param request:  device_id/record_datetime__gt/record_datetime__lt/points(4个参数可传可不传)
         :return: {
                     "devicetemperatures": [
                         {
@@ -212,50 +287,9 @@ class GetDeviceTemperatureRapidView(generics.GenericAPIView):
                         }]
                     }
         """
-        query_params = request.query_params
-        record_datetime__gt = query_params.get('record_datetime__gt', None)
-        record_datetime__lt = query_params.get('record_datetime__lt', None)
-        device_id = query_params.get('device_id', None)
-
-        queryset = DeviceTemperature.objects.all()
-
-        if record_datetime__gt is not None:
-            queryset = queryset.filter(record_datetime__gt=record_datetime__gt)
-
-        if record_datetime__lt is not None:
-            queryset = queryset.filter(record_datetime__lt=record_datetime__lt)
-
-        if device_id == '':
+        if request.query_params.get('device_id', None) == '':
             return Response({'error': 'device_id field cannot be blank'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if device_id is not None:
-            queryset = queryset.filter(device_id=device_id)
-
-        queryset = queryset.values(
-            'device_id',
-            'record_datetime',
-            'temp_port__port',
-            'temperature'
-        ).order_by('record_datetime')
-
-        queryset = data_reduce(queryset)
-
-        return_data = {
-            'devicetemperatures': [
-                {
-                    'device': {
-                        'id': temp['device_id']
-                    },
-                    'record_datetime': temp['record_datetime'].astimezone(timezone.get_current_timezone()).strftime(
-                        settings.REST_FRAMEWORK.get('DATETIME_FORMAT', '%Y-%m-%d %H:%M:%S'))
-                    ,
-                    'temp_port': {
-                        'port': temp['temp_port__port']
-                    },
-                    'temperature': temp['temperature']
-                } for temp in queryset]
-        }
-        return Response(return_data, status=status.HTTP_200_OK)
+        return Response(device_temperature_rapid_data(request.query_params), status=status.HTTP_200_OK)
 
 
 class CreateDeviceScreenshotView(generics.GenericAPIView):
@@ -424,30 +458,30 @@ class DeviceTemperatureView(generics.GenericAPIView):
         record_datetime__gt = query_params.get('record_datetime__gt', None)
         record_datetime__lt = query_params.get('record_datetime__lt', None)
 
-        queryset = DeviceTemperature.objects.all()
+        filters = {}
 
         if device_id is not None:
-            queryset = queryset.filter(device_id=device_id)
+            filters['device_id'] = device_id
 
         if record_datetime__gt is not None:
-            queryset = queryset.filter(record_datetime__gt=record_datetime__gt)
+            filters['record_datetime__gt'] = record_datetime__gt
 
         if record_datetime__lt is not None:
-            queryset = queryset.filter(record_datetime__lt=record_datetime__lt)
+            filters['record_datetime__lt'] = record_datetime__lt
 
-        queryset = queryset.values(
-            'temp_port__port',
-            'record_datetime',
-            'temperature'
+        fields = ('temp_port__port', 'record_datetime', 'temperature')
+        # 超过保留期限的数据已汇总到DeviceTemperatureMinute，需一并查询
+        queryset = DeviceTemperatureMinute.objects.filter(**filters).values(*fields).union(
+            DeviceTemperature.objects.filter(**filters).values(*fields), all=True
         ).order_by('record_datetime')
 
-        num_of_result = queryset.count()
+        temps = list(queryset)
         # 以100为阈值取步长  3 = 389//100
-        slice_step = num_of_result // threshold
+        slice_step = len(temps) // threshold
         if slice_step == 0:
             slice_step = 1
 
-        temps = queryset[::slice_step]
+        temps = temps[::slice_step]
 
         record_datetimes = [
             temp['record_datetime'].astimezone(
@@ -915,20 +949,90 @@ class UpdateDeviceResolution(AutoExecuteSerializerGenericAPIView):
 #############################################################
 # helper function                                           #
 #############################################################
-def data_reduce(data):
+# 图表默认回传的数据点数量上限
+DOWNSAMPLE_THRESHOLD = 2000
+DOWNSAMPLE_MAX_THRESHOLD = 20000
+
+# M4降采样: 每个(device, 时间桶)只保留时间最早/最晚、数值最小/最大的记录
+# 分钟汇总表以该分钟内的最小/最大值(min_field/max_field)排序，保留分钟内的峰值所在的记录
+DOWNSAMPLE_SQL = """
+SELECT id FROM (
+    SELECT id,
+           row_number() OVER (PARTITION BY device_id, bucket ORDER BY {time_field} ASC, id ASC) AS first_rank,
+           row_number() OVER (PARTITION BY device_id, bucket ORDER BY {time_field} DESC, id DESC) AS last_rank,
+           row_number() OVER (PARTITION BY device_id, bucket ORDER BY {min_field} ASC, id ASC) AS min_rank,
+           row_number() OVER (PARTITION BY device_id, bucket ORDER BY {max_field} DESC, id ASC) AS max_rank
+    FROM (
+        SELECT id, device_id, {columns},
+               LEAST(FLOOR((EXTRACT(EPOCH FROM {time_field}) - %s) / %s), %s) AS bucket
+        FROM ({source}) AS source
+    ) AS bucketed
+) AS ranked
+WHERE first_rank = 1 OR last_rank = 1 OR min_rank = 1 OR max_rank = 1
+"""
+
+
+def get_downsample_threshold(query_params):
     """
-    由于数据的量级可能很大，在绘图时不需要这么多的数据，因此当数据量达到一定程度时，
-    我们会对所有取回来的数据进行抽样，只返回部分的数据
+    从query param points取得需要回传的数据点数量
     """
-    threshold = 2000
+    try:
+        points = int(query_params.get('points', DOWNSAMPLE_THRESHOLD))
+    except ValueError:
+        return DOWNSAMPLE_THRESHOLD
+    return min(max(points, 4), DOWNSAMPLE_MAX_THRESHOLD)
 
-    # 如果数据量未超过阈值，直接回传
-    if data.count() <= threshold:
-        return data
 
-    step = data.count() // threshold
-
-    return data[::step]
+def time_series_downsample(queryset, value_field, threshold=DOWNSAMPLE_THRESHOLD, time_field='record_datetime',
+                           min_field=None, max_field=None):
+    """
+    由于数据的量级可能很大，在绘图时不需要这么多的数据，因此当数据量超过threshold时，
+    在数据库中按时间将每个device的数据均分为若干时间桶，每个桶只保留最早、最晚、最小值、最大值的记录(M4)，
+    回传的点数不超过threshold，且保留了每个时间段的峰值
+    min_field/max_field: 取最小值/最大值记录时排序的栏位，默认为value_field
+    """
+    summary = queryset.aggregate(
+        count=Count('id'),
+        device_count=Count('device_id', distinct=True),
+        start=Min(time_field),
+        end=Max(time_field)
+    )
+    if summary['count'] <= threshold:
+        return queryset
+
+    bucket_num = max(threshold // (4 * summary['device_count']), 1)
+    start = summary['start'].timestamp()
+    bucket_width = max((summary['end'].timestamp() - start) / bucket_num, 0.001)
+
+    min_field, max_field = min_field or value_field, max_field or value_field
+    columns = list(dict.fromkeys((time_field, min_field, max_field)))
+    source_sql, source_params = queryset.order_by().values('id', 'device_id', *columns).query.sql_with_params()
+    sql = DOWNSAMPLE_SQL.format(time_field=time_field, min_field=min_field, max_field=max_field,
+                                columns=', '.join(columns), source=source_sql)
+    return queryset.filter(id__in=RawSQL(sql, (start, bucket_width, bucket_num - 1, *source_params)))
+
+
+def tiered_time_series(raw_queryset, minute_queryset, value_field, fields, threshold=DOWNSAMPLE_THRESHOLD):
+    """
+    超过保留期限的原始数据会按分钟汇总到*Minute表，图表数据需要同时查询原始数据与汇总数据，
+    threshold按两者的数据量比例分配后各自降采样，再以UNION ALL合并为一个按时间排序的queryset
+    汇总数据以{value_field}_min/{value_field}_max选取峰值所在的分钟
+    """
+    minute_peak_fields = {'min_field': f'{value_field}_min', 'max_field': f'{value_field}_max'}
+    raw_count = raw_queryset.count()
+    minute_count = minute_queryset.count()
+    if not minute_count:
+        return time_series_downsample(raw_queryset, value_field, threshold).values(*fields).order_by('record_datetime')
+    if not raw_count:
+        return time_series_downsample(minute_queryset, value_field, threshold, **minute_peak_fields) \
+            .values(*fields).order_by('record_datetime')
+
+    total = raw_count + minute_count
+    minute_threshold = max(threshold * minute_count // total, 4)
+    raw_threshold = max(threshold - minute_threshold, 4)
+    raw_queryset = time_series_downsample(raw_queryset, value_field, raw_threshold)
+    minute_queryset = time_series_downsample(minute_queryset, value_field, minute_threshold, **minute_peak_fields)
+    return minute_queryset.values(*fields).union(raw_queryset.values(*fields), all=True).order_by('record_datetime')
 
 
 def update_subsidiary_device_count(device_list: [Device], operate=None, num=1):
@@ -97,6 +97,10 @@ class DynamicDeviceCoordinateViewSet(GenericViewSet):
 
 
 class DynamicDevicePowerViewSet(GenericViewSet):
+    """
+    只查询DevicePower原始数据，即最近DEVICE_SAMPLE_RAW_RETENTION_DAYS天内的记录，
+    更早的数据已由compact_device_power_temperature汇总到DevicePowerMinute，需通过get_device_power_rapid查询
+    """
     serializer_class = DevicePowerSerializer
     queryset = DevicePower.objects.all()
     return_key = 'devicepowers'
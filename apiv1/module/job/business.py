@@ -0,0 +1,538 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+import zipfile
+
+from django.db import connection, transaction
+from django.db.models import Prefetch
+
+from apiv1.core.constants import REDIS_JOB_DISPATCH_MANIFEST, JOB_BLOB_READ_SIZE, JOB_RUNTIME_ASSESSMENT_VALUES, \
+    JOB_RUNTIME_EXCLUDE_AUTHOR
+from reef.settings import JOB_RES_FILE_EXPORT_PATH, JOB_BLOB_ROOT, JOB_BLOB, MEDIA_ROOT, MEDIA_URL, redis_connect
+
+# 下发任务时传给coral的job信息
+JOB_DISPATCH_FIELDS = (
+    'job_label', 'flow_execute_mode', 'updated_time', 'url', 'bundle_manifest_url', 'job_flows', 'inner_job'
+)
+
+
+def file_sha256(path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(JOB_BLOB_READ_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def job_blob_path(sha256) -> str:
+    return os.path.join(JOB_BLOB_ROOT, sha256[:2], sha256)
+
+
+def job_blob_url(sha256) -> str:
+    return f'{MEDIA_URL}{JOB_BLOB}/{sha256[:2]}/{sha256}'
+
+
+def store_job_blob(source_path, sha256=None) -> str:
+    """
+    以内容的sha256存放文件，相同内容的文件(不同job或flow共用的资源文件)只存放一份
+    先写入临时文件再rename，避免同时打包的worker读到不完整的blob
+    """
+    sha256 = sha256 or file_sha256(source_path)
+    blob_path = job_blob_path(sha256)
+    if not os.path.exists(blob_path):
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        tmp_path = f'{blob_path}.{uuid.uuid4().hex}'
+        shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, blob_path)
+    return sha256
+
+
+def job_bundle_manifest_path(job_label) -> str:
+    return os.path.join(JOB_RES_FILE_EXPORT_PATH, f'{job_label}.json')
+
+
+def _load_job_bundle_manifest(job_label) -> dict:
+    try:
+        with open(job_bundle_manifest_path(job_label)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_job_bundle_manifest(job_label, files):
+    manifest_path = job_bundle_manifest_path(job_label)
+    tmp_path = f'{manifest_path}.{uuid.uuid4().hex}'
+    with open(tmp_path, 'w') as f:
+        json.dump({'job_label': job_label, 'files': files}, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def _job_bundle_sources(job) -> list:
+    """
+    job资源包的内容 [(zip内路径, 源文件路径)]，每个flow按id一个目录，包含ui.json及flow的资源文件
+    """
+    sources = []
+    for job_flow in job.job_flow.all():
+        sources.append((
+            f'{job_flow.id}/ui.json',
+            os.path.join(MEDIA_ROOT, 'ui_json_file', job_flow.ui_json_file.name.split('/')[-1])
+        ))
+        for job_res_file in job_flow.job_res_file.all():
+            sources.append((
+                f'{job_flow.id}/{job_res_file.name}',
+                os.path.join(MEDIA_ROOT, 'job_resource_file', job_res_file.file.name.split('/')[-1])
+            ))
+    return sources
+
+
+def build_job_bundle(job) -> bool:
+    """
+    产生job资源包(zip)及其manifest(<job_label>.json，记录zip内每个文件的sha256及blob url，
+    coral可据此只下载缺少的blob)
+    源文件的size及mtime与上次相同时沿用上次的hash，不重新读取；内容没有变化且zip存在时不重新打包
+    job需prefetch job_flow__job_res_file
+    回传是否重新打包
+    """
+    zip_path = os.path.join(JOB_RES_FILE_EXPORT_PATH, f'{job.job_label}.zip')
+    old_files = _load_job_bundle_manifest(job.job_label).get('files', [])
+    old_entries = sorted((f['path'], f['sha256']) for f in old_files)
+    old_files = {f['source']: f for f in old_files}
+
+    files = []
+    for path, source in _job_bundle_sources(job):
+        try:
+            stat = os.stat(source)
+        except OSError as e:
+            raise FileNotFoundError(f'pack zip file error: {e}\nfile: {source}\nzip path: {path}')
+        cached = old_files.get(source)
+        if cached and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime_ns \
+                and os.path.exists(job_blob_path(cached['sha256'])):
+            sha256 = cached['sha256']
+        else:
+            sha256 = store_job_blob(source)
+        files.append({
+            'path': path,
+            'sha256': sha256,
+            'size': stat.st_size,
+            'url': job_blob_url(sha256),
+            'source': source,
+            'mtime': stat.st_mtime_ns
+        })
+
+    if old_entries == sorted((f['path'], f['sha256']) for f in files) and os.path.exists(zip_path):
+        # 内容没有变化，只更新记录的mtime
+        _write_job_bundle_manifest(job.job_label, files)
+        return False
+
+    # 直接由blob写入zip，写完再替换旧zip，下载中的coral不会读到不完整的文件
+    tmp_zip_path = f'{zip_path}.{uuid.uuid4().hex}'
+    try:
+        with zipfile.ZipFile(tmp_zip_path, 'w', zipfile.ZIP_DEFLATED) as z:
+            for f in files:
+                z.write(job_blob_path(f['sha256']), f['path'])
+        os.replace(tmp_zip_path, zip_path)
+    finally:
+        if os.path.exists(tmp_zip_path):
+            os.remove(tmp_zip_path)
+    _write_job_bundle_manifest(job.job_label, files)
+    return True
+
+
+def job_zip_valid(job_label) -> bool:
+    """
+    job资源包存在且不为空
+    """
+    zip_path = os.path.join(JOB_RES_FILE_EXPORT_PATH, f'{job_label}.zip')
+    if not os.path.exists(zip_path):
+        return False
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as z:
+            return bool(z.namelist())
+    except Exception:
+        return False
+
+
+def _job_manifest(job) -> dict:
+    job_flows = list(job.job_flow.all())
+    inner_jobs = [inner_flow.job for job_flow in job_flows for inner_flow in job_flow.inner_flow.all()]
+    return {
+        # manifest版本，与job的updated_time不一致时视为过期
+        'version': job.updated_time.timestamp(),
+        'id': job.id,
+        'job_label': job.job_label,
+        'flow_execute_mode': job.flow_execute_mode,
+        'updated_time': job.updated_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'url': f'/media/job_res_file_export/{job.job_label}.zip',
+        'bundle_manifest_url': f'/media/job_res_file_export/{job.job_label}.json',
+        'job_flows': [
+            {
+                'id': job_flow.id,
+                'order': job_flow.order,
+                'name': job_flow.name
+            } for job_flow in job_flows
+        ],
+        'inner_job': [
+            {
+                'job_label': inner_job.job_label,
+                'updated_time': inner_job.updated_time.strftime('%Y-%m-%d %H:%M:%S'),
+                'url': f'/media/job_res_file_export/{inner_job.job_label}.zip',
+            } for inner_job in inner_jobs
+        ],
+        'inner_job_ids': sorted({inner_job.id for inner_job in inner_jobs}),
+        'zip_valid': job_zip_valid(job.job_label)
+    }
+
+
+def build_job_manifests(job_ids) -> dict:
+    """
+    以固定数量的查询产生job的manifest并写入redis，回传 {job_id: manifest}
+    在update_job_res_file打包zip后调用，下发任务时缺少manifest也会调用
+    """
+    from apiv1.module.job.models import Job, JobFlow
+
+    jobs = Job.objects.filter(id__in=job_ids).prefetch_related(
+        Prefetch('job_flow', queryset=JobFlow.objects.prefetch_related('inner_flow__job'))
+    )
+    manifests = {job.id: _job_manifest(job) for job in jobs}
+    if manifests:
+        pipe = redis_connect.pipeline(transaction=False)
+        for job_id, manifest in manifests.items():
+            pipe.hset(REDIS_JOB_DISPATCH_MANIFEST, job_id, json.dumps(manifest))
+        pipe.execute()
+    return manifests
+
+
+def get_job_manifests(jobs=(), job_ids=()) -> dict:
+    """
+    以一次HMGET取得job的manifest，缺少或过期的manifest重新产生
+    jobs: Job对象，会以updated_time检查manifest是否过期
+    job_ids: 只有id时(e.g. inner job)，依赖signal清除过期的manifest
+    回传 {job_id: manifest}
+    """
+    versions = {job.id: job.updated_time.timestamp() for job in jobs}
+    ids = list(versions.keys() | set(job_ids))
+    if not ids:
+        return {}
+    manifests = {}
+    for job_id, value in zip(ids, redis_connect.hmget(REDIS_JOB_DISPATCH_MANIFEST, ids)):
+        if value is None:
+            continue
+        manifest = json.loads(value)
+        if job_id in versions and manifest['version'] != versions[job_id]:
+            continue
+        manifests[job_id] = manifest
+    missing = [job_id for job_id in ids if job_id not in manifests]
+    if missing:
+        manifests.update(build_job_manifests(missing))
+    return manifests
+
+
+def get_job_manifests_with_inner_job(jobs) -> dict:
+    """
+    取得jobs及其inner job的manifest
+    """
+    manifests = get_job_manifests(jobs=jobs)
+    inner_job_ids = {job_id for manifest in manifests.values() for job_id in manifest['inner_job_ids']}
+    manifests.update(get_job_manifests(job_ids=inner_job_ids - manifests.keys()))
+    return manifests
+
+
+def job_dispatch_info(manifest) -> dict:
+    return {field: manifest[field] for field in JOB_DISPATCH_FIELDS}
+
+
+def invalidate_job_manifests(job_ids):
+    """
+    job或job flow修改后清除manifest，使用该job作为inner job的job一并清除
+    关联的job在调用时查询(删除前仍可查到)，redis在事务提交后才清除，避免提交前以旧数据重新产生manifest
+    """
+    from apiv1.module.job.models import Job
+
+    job_ids = set(job_ids)
+    if not job_ids:
+        return
+    job_ids.update(
+        Job.objects.filter(job_flow__inner_flow__job_id__in=job_ids).values_list('id', flat=True).distinct()
+    )
+    transaction.on_commit(lambda: redis_connect.hdel(REDIS_JOB_DISPATCH_MANIFEST, *job_ids))
+
+
+def read_zip_json(zf, name):
+    with zf.open(name) as f:
+        return json.loads(f.read().decode('utf-8'))
+
+
+def _bulk_set_job_m2m(field_name, job_related):
+    """
+    job_related: {job: [related obj]}，以一次delete及一次bulk_create替换job的多对多关联
+    """
+    from apiv1.module.job.models import Job
+
+    field = Job._meta.get_field(field_name)
+    through = field.remote_field.through
+    source, target = f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id'
+    through.objects.filter(**{f'{source}__in': [job.id for job in job_related]}).delete()
+    through.objects.bulk_create([
+        through(**{source: job.id, target: obj.id})
+        for job, objs in job_related.items() for obj in {obj.id: obj for obj in objs}.values()
+    ])
+
+
+def _get_or_create_related(job_attrs, key, get_or_create):
+    """
+    多个job使用相同的关联数据(tag, 机型等)时只查询一次
+    回传 {job_label: [related obj]}
+    """
+    cache = {}
+    result = {}
+    for job_attr in job_attrs:
+        objs = []
+        for item in job_attr[key]:
+            cache_key = json.dumps(item, sort_keys=True)
+            if cache_key not in cache:
+                cache[cache_key] = get_or_create(item)
+            objs.append(cache[cache_key])
+        result[job_attr['job_label']] = objs
+    return result
+
+
+def import_jobs_from_zip(zf, job_dirs) -> list:
+    """
+    由导出的zip包直接导入job，不解压到临时目录，需在事务中调用
+    job_dirs: zip内job目录(e.g. 'inner_job/<job_name>', 'job/<job_name>')
+    job, job flow, 资源文件及多对多关联皆以bulk写入，只读取所选job需要的文件
+    回传导入的job
+    """
+    from django.core.files.base import ContentFile, File
+    from django.core.files.storage import default_storage
+
+    from apiv1.core.constants import JOB_TYPE_INNER_JOB, INNER_JOB_FLOW
+    from apiv1.core.response import reef_400_response
+    from apiv1.module.device.models import AndroidVersion, Manufacturer, PhoneModel, RomVersion
+    from apiv1.module.job.models import Job, JobFlow, JobResourceFile, JobTestArea, CustomTag, ui_json_complexity
+    from apiv1.module.user.models import ReefUser
+
+    # zip内各目录下的文件
+    dir_files = {}
+    for name in zf.namelist():
+        dir_name, _, file_name = name.rpartition('/')
+        if file_name:
+            dir_files.setdefault(dir_name, []).append(file_name)
+
+    try:
+        job_attrs = [read_zip_json(zf, f'{job_dir}/job_attr.json') for job_dir in job_dirs]
+    except (KeyError, ValueError) as e:
+        reef_400_response(description='压缩包缺少必要文件', message=f'job import file: {e}')
+    # inner job需先于job建立，job flow关联inner flow时才能查到
+    job_paths = sorted(
+        zip(job_dirs, job_attrs), key=lambda item: item[1].get('job_type') != JOB_TYPE_INNER_JOB
+    )
+
+    usernames = {job_attr['author']['username'] for job_attr in job_attrs}
+    authors = {user.username: user for user in ReefUser.objects.filter(username__in=usernames)}
+    if usernames - authors.keys():
+        reef_400_response(description='用例所属用户不存在', message=f'user not exist: {usernames - authors.keys()}')
+
+    existing_jobs = Job.objects.filter(job_label__in=[job_attr['job_label'] for job_attr in job_attrs]) \
+        .in_bulk(field_name='job_label')
+    job_fields = (
+        'job_name', 'job_type', 'job_second_type', 'description', 'power_upper_limit', 'power_lower_limit',
+        'case_number', 'priority', 'draft', 'cabinet_type', 'matching_rule', 'flow_execute_mode', 'updated_time'
+    )
+    jobs = {}
+    for _, job_attr in job_paths:
+        # 这里不筛选job_deleted字段，假删除job做update，不能执行create
+        job = existing_jobs.get(job_attr['job_label']) or Job(job_label=job_attr['job_label'])
+        for field in job_fields:
+            setattr(job, field, job_attr.get(field))
+        job.author = authors[job_attr['author']['username']]
+        # job_import导入的draft默认True，更新完成，打包用例完成将job置为可用
+        job.job_deleted = True
+        jobs[job.job_label] = job
+    Job.objects.bulk_create([job for job in jobs.values() if job.id is None])
+
+    # 记录inner_flow 原来关联的job_flow(本次一并导入的job除外，其job flow会重新建立)
+    through = JobFlow.inner_flow.through
+    relevance_job_flow_ids = {}
+    for inner_job_id, job_flow_id in through.objects.filter(
+            to_jobflow__job__in=[job for job in jobs.values() if job.job_type == JOB_TYPE_INNER_JOB]
+    ).exclude(from_jobflow__job__in=list(jobs.values())).values_list('to_jobflow__job_id', 'from_jobflow_id'):
+        relevance_job_flow_ids.setdefault(inner_job_id, set()).add(job_flow_id)
+
+    # job: job_flow = 1: n
+    JobFlow.objects.filter(job__in=list(jobs.values())).delete()
+
+    job_flows = []
+    res_files = []
+    complexity = {}
+    for job_dir, job_attr in job_paths:
+        job = jobs[job_attr['job_label']]
+        complexity[job.job_label] = 0
+        if job.job_type == JOB_TYPE_INNER_JOB and len(job_attr['job_flow']) > 1:
+            reef_400_response(description='内嵌用例只能有一个执行流', message=f'inner job: {job.job_label}')
+        for job_flow in job_attr['job_flow']:
+            if job_flow['flow_type'] == INNER_JOB_FLOW and job.job_type != JOB_TYPE_INNER_JOB:
+                reef_400_response(description='inner flow只能属于内嵌用例', message=f'job: {job.job_label}')
+            job_flow_dir = f"{job_dir}/{job_flow['name']}"
+            try:
+                ui_json = zf.read(f'{job_flow_dir}/ui.json')
+            except KeyError as e:
+                reef_400_response(description='压缩包缺少必要文件', message=f'job import file: {e}')
+            try:
+                complexity[job.job_label] += ui_json_complexity(json.loads(ui_json.decode('utf-8')))
+            except ValueError:
+                pass
+            job_flow_obj = JobFlow(
+                name=job_flow['name'],
+                ui_json_file=default_storage.save('ui_json_file/ui.json', ContentFile(ui_json)),
+                flow_type=job_flow['flow_type'],
+                job=job,
+                order=job_flow['order'],
+                description=job_flow['description']
+            )
+            job_flows.append((job_attr, job_flow, job_flow_obj))
+
+            # job: res_file = 1: n
+            for re_file in dir_files.get(job_flow_dir, []):
+                # ui.json文件是job flow 使用的文件，不是resource file，资源文件不能命名为ui.json.
+                if re_file == 'ui.json':
+                    continue
+                # 由zip分块读出直接写入storage
+                with zf.open(f'{job_flow_dir}/{re_file}') as f:
+                    file_name = default_storage.save(f'job_resource_file/{re_file}', File(f, name=re_file))
+                res_files.append(JobResourceFile(
+                    name=re_file, type=re_file.split('.')[-1], file=file_name, job_flow=job_flow_obj
+                ))
+    JobFlow.objects.bulk_create([job_flow_obj for _, _, job_flow_obj in job_flows])
+    for res_file in res_files:
+        res_file.job_flow_id = res_file.job_flow.id
+    JobResourceFile.objects.bulk_create(res_files)
+
+    # 维护job flow与inner flow的关联
+    inner_job_labels = {
+        label for job_attr, job_flow, _ in job_flows
+        if job_attr.get('job_type') != JOB_TYPE_INNER_JOB for label in job_flow.get('inner_flow') or []
+    }
+    inner_flow_ids = {}
+    for job_label, job_flow_id in JobFlow.objects.filter(job__job_label__in=inner_job_labels) \
+            .values_list('job__job_label', 'id'):
+        inner_flow_ids.setdefault(job_label, []).append(job_flow_id)
+    lack_inner_job = inner_job_labels - inner_flow_ids.keys()
+    if lack_inner_job:
+        reef_400_response(description='缺少内嵌用例', message=f"缺少 inner job: {lack_inner_job}")
+    relations = []
+    for job_attr, job_flow, job_flow_obj in job_flows:
+        if job_attr.get('job_type') == JOB_TYPE_INNER_JOB:
+            # import inner job。 维护更新inner job时 inner_flow 与原来 job_flow的关联关系
+            relations.extend(
+                (from_id, job_flow_obj.id) for from_id in relevance_job_flow_ids.get(job_flow_obj.job_id, ())
+            )
+        else:
+            relations.extend(
+                (job_flow_obj.id, to_id) for label in job_flow.get('inner_flow') or []
+                for to_id in inner_flow_ids[label]
+            )
+    through.objects.bulk_create([
+        through(from_jobflow_id=from_id, to_jobflow_id=to_id) for from_id, to_id in set(relations)
+    ])
+
+    # 多对多关联
+    def get_or_create_phone_model(phone_model):
+        manufacturer, _ = Manufacturer.objects.get_or_create(
+            manufacturer_name=phone_model['manufacturer']['manufacturer_name'])
+        obj, _ = PhoneModel.objects.get_or_create(
+            phone_model_name=phone_model['phone_model_name'],
+            defaults={
+                'cpu_name': phone_model['cpu_name'],
+                'manufacturer': manufacturer,
+                'x_border': phone_model['x_border'],
+                'y_border': phone_model['y_border'],
+                'x_dpi': phone_model['x_dpi'],
+                'y_dpi': phone_model['y_dpi']
+            })
+        return obj
+
+    def get_or_create_rom_version(rom_version):
+        manufacturer, _ = Manufacturer.objects.get_or_create(
+            manufacturer_name=rom_version['manufacturer']['manufacturer_name'])
+        obj, _ = RomVersion.objects.get_or_create(version=rom_version['version'], defaults={'manufacturer': manufacturer})
+        return obj
+
+    m2m_fields = (
+        ('test_area', lambda item: JobTestArea.objects.get_or_create(description=item['description'])[0]),
+        ('custom_tag', lambda item: CustomTag.objects.get_or_create(custom_tag_name=item['custom_tag_name'])[0]),
+        ('android_version', lambda item: AndroidVersion.objects.get_or_create(version=item['version'])[0]),
+        ('phone_models', get_or_create_phone_model),
+        ('rom_version', get_or_create_rom_version),
+    )
+    for field_name, get_or_create in m2m_fields:
+        related = _get_or_create_related(job_attrs, field_name, get_or_create)
+        _bulk_set_job_m2m(field_name, {jobs[label]: objs for label, objs in related.items()})
+
+    for job_attr in job_attrs:
+        job = jobs[job_attr['job_label']]
+        job.complexity = complexity[job.job_label]
+        # 导入用例保留原有的updated_time(bulk_create时auto_now会改写)
+        job.updated_time = job_attr.get('updated_time')
+    Job.objects.bulk_update(list(jobs.values()), job_fields + ('author', 'job_deleted', 'complexity'))
+
+    # bulk写入不会触发signal
+    invalidate_job_manifests([job.id for job in jobs.values()])
+    return list(jobs.values())
+
+
+# counted: 计入用时统计的rds  used: 计入最早/最近运行时间的rds，与rds signal中的计算方式一致
+REBUILD_JOB_RUNTIME_STATS_SQL = """
+INSERT INTO apiv1_jobruntimestats (job_id, run_count, total_duration, max_duration, first_run, last_run)
+SELECT j.id,
+       COUNT(r.id) FILTER (WHERE counted),
+       COALESCE(SUM(r.end_time - r.start_time) FILTER (WHERE counted), INTERVAL '0'),
+       MAX(r.end_time - r.start_time) FILTER (WHERE counted),
+       MIN(r.start_time) FILTER (WHERE used),
+       MAX(r.start_time) FILTER (WHERE used)
+FROM apiv1_job j
+LEFT JOIN apiv1_rds r ON r.job_id = j.id{exclude}
+LEFT JOIN apiv1_tboard t ON t.id = r.tboard_id
+LEFT JOIN apiv1_reefuser u ON u.id = t.author_id
+CROSS JOIN LATERAL (
+    SELECT r.end_time >= r.start_time AND r.job_assessment_value = ANY(%(assessment_values)s) AS counted,
+           r.id IS NOT NULL AND u.username IS DISTINCT FROM %(exclude_author)s AS used
+) c
+{where}
+GROUP BY j.id
+ON CONFLICT (job_id) DO UPDATE SET
+    run_count = EXCLUDED.run_count,
+    total_duration = EXCLUDED.total_duration,
+    max_duration = EXCLUDED.max_duration,
+    first_run = EXCLUDED.first_run,
+    last_run = EXCLUDED.last_run
+"""
+
+
+def rebuild_job_runtime_stats(job_ids=None, exclude_rds_id=None) -> None:
+    """
+    根据Rds重新计算JobRuntimeStats，job_ids为None时重建全部job
+    exclude_rds_id: 不计入统计的rds(删除流程中该rds尚未从数据库移除)
+    """
+    params = {
+        'assessment_values': list(JOB_RUNTIME_ASSESSMENT_VALUES),
+        'exclude_author': JOB_RUNTIME_EXCLUDE_AUTHOR,
+        'exclude_rds_id': exclude_rds_id,
+    }
+    where = ''
+    if job_ids is not None:
+        job_ids = [job_id for job_id in job_ids if job_id is not None]
+        if not job_ids:
+            return
+        where, params['job_ids'] = 'WHERE j.id = ANY(%(job_ids)s)', job_ids
+
+    with connection.cursor() as sql:
+        sql.execute(
+            REBUILD_JOB_RUNTIME_STATS_SQL.format(
+                exclude=' AND r.id <> %(exclude_rds_id)s' if exclude_rds_id is not None else '',
+                where=where
+            ),
+            params
+        )
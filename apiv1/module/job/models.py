@@ -1,9 +1,9 @@
 import json
+from datetime import timedelta
 
-from django.apps import apps
 from django.contrib.postgres.fields import JSONField
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
-from django.db.models import F, Max, Avg
 from django.utils import timezone
 
 from apiv1.core.constants import JOB_TYPE_UNIQ, JOB_TYPE_UNKNOWN, JOB_TYPE_SYS_JOB, JOB_TYPE_JOB_LIB, \
@@ -30,6 +30,33 @@ class JobTestArea(models.Model):
         verbose_name_plural = "测试用途"
 
 
+def ui_json_complexity(ui_json) -> int:
+    """
+    计算单个job flow(ui.json)的复杂度
+    """
+    # 下面这个dict是计算的标准，复合unit5分，普通adbunit1分，图像识别unit5分，switchblock5分，innerjob10分
+    grade_dict = {"COMPLEX": 5, "ADBC": 1, "IMGTOOL": 5, "switchBlock": 5, "Job": 10}
+    complexity = 0
+    # job-->flow-->block-->unit 多层级关系
+    for block in ui_json.get("nodeDataArray", []):
+        try:
+            if block.get("category") in ["switchBlock", "Job"]:
+                complexity += grade_dict.get(block.get("category"), 0)
+            elif block.get("unitLists") is not None:
+                # 兼容新旧unit格式
+                unit_list = json.loads(block.get("unitLists")) if isinstance(block.get("unitLists"),
+                                                                             str) else block.get("unitLists",
+                                                                                                 {})
+                node_data = unit_list.get("nodeDataArray", [])
+                for unit in node_data:
+                    if unit.get("category") == "Unit":
+                        unit_type = unit.get("unitMsg", {}).get("execModName")
+                        complexity += grade_dict.get(unit_type, 0)
+        except AttributeError as e:
+            continue
+    return complexity
+
+
 class Job(models.Model):
     # job业务识别标签，coral生成，某些需求下系统会依照job_label去筛选特定的特殊用例
     job_label = models.CharField(max_length=50, unique=True, db_index=True, verbose_name='用例标签')
@@ -95,96 +122,60 @@ class Job(models.Model):
 
     def set_complexity(self):
         # 计算用例的复杂度，依次遍历所有的unit，加和得到最终的复杂度，在用例保存时做计算
-        # 下面这个dict是计算的标准，复合unit5分，普通adbunit1分，图像识别unit5分，switchblock5分，innerjob10分
-        grade_dict = {"COMPLEX": 5, "ADBC": 1, "IMGTOOL": 5, "switchBlock": 5, "Job": 10}
         final_complexity = 0
         flow_qs = JobFlow.objects.filter(job=self.id).all()
-        # job-->flow-->block-->unit 多层级关系
         for job_flow in flow_qs:
             flow_path = job_flow.ui_json_file
             try:
                 ui_json = json.loads(str(flow_path.read(), 'utf-8'))
             except (FileNotFoundError, ValueError) as e:
                 continue
-            for block in ui_json.get("nodeDataArray", []):
-                try:
-                    if block.get("category") in ["switchBlock", "Job"]:
-                        final_complexity += grade_dict.get(block.get("category"), 0)
-                    elif block.get("unitLists") is not None:
-                        # 兼容新旧unit格式
-                        unit_list = json.loads(block.get("unitLists")) if isinstance(block.get("unitLists"),
-                                                                                     str) else block.get("unitLists",
-                                                                                                         {})
-                        node_data = unit_list.get("nodeDataArray", [])
-                        for unit in node_data:
-                            if unit.get("category") == "Unit":
-                                unit_type = unit.get("unitMsg", {}).get("execModName")
-                                final_complexity += grade_dict.get(unit_type, 0)
-                except AttributeError as e:
-                    continue
+            final_complexity += ui_json_complexity(ui_json)
         return final_complexity
 
+    # 用时/使用时间由JobRuntimeStats读取，列表回传时以select_related一并取得，不再逐个聚合Rds
+    property_select_related = {
+        'process_time': 'runtime_stats',
+        'max_process_time': 'runtime_stats',
+        'recently_used_time': 'runtime_stats',
+        'earliest_used_time': 'runtime_stats',
+    }
+
+    def get_runtime_stats(self):
+        try:
+            return self.runtime_stats
+        except ObjectDoesNotExist:
+            return None
+
     @property
     def process_time(self):
-        calculate_top_n = 4  # 根据最后N个rds的用时，加权计算用例用时
+        # 计入统计的rds平均用时(秒)
         if self.job_deleted:
             return None
-        process_time = 0
-        rds = apps.get_model('apiv1', 'Rds')
-        rds_qs = rds.objects.filter(job=self.id, end_time__isnull=False,
-                                    job_assessment_value__in=["0", "1", "-3", "-4", "-5", "-6", "-7", "-2"])
-        # 目前服务器中大多数的job并没有运行过rds或rds小于4个，所以用count可以节省查询。日后如果job都有4个以上rds则不需要count
-        count = rds_qs.count()
-        if count == 0:
+        stats = self.get_runtime_stats()
+        if stats is None:
             return None
-        elif count < calculate_top_n:
-            # 对于不足4个情况，直接聚合得到均值
-            qs = rds_qs.aggregate(time=Avg(F('end_time') - F('start_time')))
-            return round(qs.get("time").total_seconds())
-        # 对于大于4个情况，需要计算加权均值，临近的rds时间权重较大，这个无法用到数据库的聚合函数，效率较低
-        qs = rds_qs.order_by("-end_time").values("end_time", "start_time")
-        qs_top4 = qs[:calculate_top_n]
-        total_rate = 1 / sum(range(1, calculate_top_n + 1))
-        for index, rds in enumerate(qs_top4):
-            process_time += (rds.get("end_time") - rds.get("start_time")).total_seconds() * (
-                    calculate_top_n - index) * total_rate
-        return round(process_time)
+        return stats.process_time
 
     @property
     def max_process_time(self):
-        sample_num = 4
+        # 计入统计的rds最大用时(秒)
         if self.job_deleted:
             return None
-        Rds = apps.get_model('apiv1', 'Rds')
-        rds_queryset = Rds.objects.filter(
-            job=self, job_assessment_value__in=['0', '1'], end_time__gt=F('start_time')
-        ).exclude(end_time=None).order_by('-end_time')[:sample_num]
-        result = rds_queryset.annotate(
-            time=F('end_time') - F('start_time')
-        ).aggregate(Max('time')).get('time__max', None)
-        if not result:
+        stats = self.get_runtime_stats()
+        if stats is None or stats.max_duration is None:
             return None
-        return result.seconds
-
-    # def save(self, force_insert=False, force_update=False, using=None,
-    #          update_fields=None):
-    #     # self.complexity = self.set_complexity()
-    #     return super(Job, self).save(force_insert=False, force_update=False, using=None,
-    #                                  update_fields=None)
+        return round(stats.max_duration.total_seconds())
 
     @property
     # job 最近被使用的开始时间
     def recently_used_time(self, in_str=True):
         # job --> rds  1:n
         # 一个job可以测多次产生多个rds，rds记录开始和结束时间，则可以算出job最近被使用的时间
-        rds_model = apps.get_model('apiv1', 'Rds')
-        try:
-            rds = rds_model.objects.filter(job_id=self.id). \
-                exclude(tboard__author__username='AITester'). \
-                latest('start_time')
-        except rds_model.DoesNotExist:
+        stats = self.get_runtime_stats()
+        if stats is None or stats.last_run is None:
             return None
-        local_recently_used_time = timezone.localtime(rds.start_time)
+        local_recently_used_time = timezone.localtime(stats.last_run)
         if in_str:
             return timezone.datetime.strftime(local_recently_used_time,
                                               settings.REST_FRAMEWORK['DATETIME_FORMAT'])
@@ -196,14 +187,10 @@ class Job(models.Model):
     def earliest_used_time(self, in_str=True):
         # job --> rds  1:n
         # 一个job可以测多次产生多个rds，rds记录开始和结束时间，则可以算出job最先被使用的时间
-        rds_model = apps.get_model('apiv1', 'Rds')
-        try:
-            rds = rds_model.objects.filter(job_id=self.id). \
-                exclude(tboard__author__username='AITester'). \
-                earliest('start_time')
-        except rds_model.DoesNotExist:
+        stats = self.get_runtime_stats()
+        if stats is None or stats.first_run is None:
             return None
-        local_earliest_used_time = timezone.localtime(rds.start_time)
+        local_earliest_used_time = timezone.localtime(stats.first_run)
         if in_str:
             return timezone.datetime.strftime(local_earliest_used_time,
                                               settings.REST_FRAMEWORK['DATETIME_FORMAT'])
@@ -214,6 +201,31 @@ class Job(models.Model):
         return self.job_name + "----" + self.author.username
 
 
+class JobRuntimeStats(models.Model):
+    """
+    job的运行统计，由Rds的signal以增量方式维护，可用rebuild_job_runtime_stats命令依Rds重建
+    run_count/total_duration/max_duration: 已结束且结果在JOB_RUNTIME_ASSESSMENT_VALUES内的rds数量、总用时、最大用时
+    first_run/last_run: 非AITester创建的tboard下rds最早/最近的开始时间
+    """
+    job = models.OneToOneField(Job, primary_key=True, related_name='runtime_stats', on_delete=models.CASCADE,
+                               verbose_name='用例')
+    run_count = models.IntegerField(default=0, verbose_name='计入用时统计的rds数量')
+    total_duration = models.DurationField(default=timedelta(0), verbose_name='总用时')
+    max_duration = models.DurationField(null=True, verbose_name='最大用时')
+    first_run = models.DateTimeField(null=True, verbose_name='最早运行时间')
+    last_run = models.DateTimeField(null=True, verbose_name='最近运行时间')
+
+    class Meta:
+        verbose_name_plural = "用例运行统计"
+
+    @property
+    def process_time(self):
+        # 平均用时(秒)
+        if self.run_count == 0:
+            return None
+        return round(self.total_duration.total_seconds() / self.run_count)
+
+
 class JobParameter(AbsDescribe):
     from apiv1.module.tboard.models import TBoard
 
@@ -215,17 +215,6 @@ class JobMultiResourceFileSerializer(serializers.Serializer):
         return {"res_file": res_list}
 
 
-class JobFlowInfoSerializer(serializers.ModelSerializer):
-    """
-    Generic Serializer
-    """
-    job_res_file = JobResourceFileSerializer(many=True)
-
-    class Meta:
-        model = JobFlow
-        fields = '__all__'
-
-
 class ExportJobJobFlowInfoSerializer(serializers.ModelSerializer):
     """
     Generic Serializer
@@ -251,6 +240,8 @@ class ExportJobJobFlowInfoSerializer(serializers.ModelSerializer):
 class JobExportSerializer(serializers.Serializer):
     user_id = serializers.PrimaryKeyRelatedField(queryset=ReefUser.objects.all())
     job_ids = serializers.PrimaryKeyRelatedField(many=True, queryset=Job.objects.filter(job_deleted=False))
+    # True: 以StreamingHttpResponse直接回传zip；False: 写入JOB_EXPORT_ZIP_ROOT并回传下载路径
+    stream = serializers.BooleanField(default=False)
 
 
 class JobExecuteImportSerializer(serializers.Serializer):
@@ -273,15 +264,6 @@ class JobImportSerializer(serializers.Serializer):
     file = serializers.FileField()
 
 
-class JobResFileExportSerializer(serializers.ModelSerializer):
-    job_flow = JobFlowInfoSerializer(many=True)
-
-    class Meta:
-        model = Job
-        fields = ('job_label', 'job_flow')
-        depth = 2
-
-
 class JobFlowSerializer(serializers.ModelSerializer):
     """
     Generic Serializer
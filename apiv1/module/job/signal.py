@@ -1,6 +1,9 @@
+from django.db.models.signals import m2m_changed, post_save, pre_delete
 from django.dispatch import receiver, Signal
 
 from apiv1.core.response import reef_400_response
+from apiv1.module.job.business import invalidate_job_manifests
+from apiv1.module.job.models import JobFlow
 from apiv1.module.job.tasks.tasks import update_job_res_file
 
 # 自定义job_res_file导出更新信号
@@ -39,3 +42,22 @@ def job_res_file_handle(sender, **kwargs):
     return
 
 
+@receiver([post_save, pre_delete], sender='apiv1.Job', dispatch_uid='job_manifest_invalidate')
+def job_manifest_invalidate_handler(sender, instance=None, **kwargs):
+    invalidate_job_manifests([instance.id])
+
+
+@receiver([post_save, pre_delete], sender='apiv1.JobFlow', dispatch_uid='job_flow_manifest_invalidate')
+def job_flow_manifest_invalidate_handler(sender, instance=None, **kwargs):
+    invalidate_job_manifests([instance.job_id])
+
+
+@receiver(m2m_changed, sender=JobFlow.inner_flow.through, dispatch_uid='inner_flow_manifest_invalidate')
+def inner_flow_manifest_invalidate_handler(sender, instance=None, action=None, pk_set=None, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # 由inner flow一方(reverse)修改时，受影响的是pk_set中的flow所属的job
+    job_ids = [instance.job_id]
+    if pk_set:
+        job_ids.extend(JobFlow.objects.filter(id__in=pk_set).values_list('job_id', flat=True))
+    invalidate_job_manifests(job_ids)
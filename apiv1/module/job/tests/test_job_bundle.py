@@ -0,0 +1,40 @@
+import json
+import os
+import zipfile
+
+from rest_framework.test import APITestCase
+
+from apiv1.core.test import TestTool
+from apiv1.module.job.business import file_sha256, job_blob_path, job_bundle_manifest_path
+from apiv1.module.job.tasks.tasks import update_job_res_file
+from reef.settings import JOB_RES_FILE_EXPORT_PATH
+
+
+class TestJobBundle(APITestCase):
+    def setUp(self):
+        self.default_data = TestTool.load_default_data()
+        self.job = self.default_data['job']
+        self.job_flow = self.default_data['job_flow']
+        self.zip_path = os.path.join(JOB_RES_FILE_EXPORT_PATH, f'{self.job.job_label}.zip')
+
+    def tearDown(self):
+        for path in (self.zip_path, job_bundle_manifest_path(self.job.job_label)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_pack_zip_from_blob(self):
+        update_job_res_file([self.job.id])
+        with zipfile.ZipFile(self.zip_path) as z:
+            self.assertEqual(z.namelist(), [f'{self.job_flow.id}/ui.json'])
+
+        with open(job_bundle_manifest_path(self.job.job_label)) as f:
+            files = json.load(f)['files']
+        sha256 = file_sha256(self.job_flow.ui_json_file.path)
+        self.assertEqual([f['sha256'] for f in files], [sha256])
+        self.assertTrue(os.path.exists(job_blob_path(sha256)))
+
+    def test_skip_unchanged_job(self):
+        update_job_res_file([self.job.id])
+        mtime = os.stat(self.zip_path).st_mtime_ns
+        update_job_res_file([self.job.id])
+        self.assertEqual(os.stat(self.zip_path).st_mtime_ns, mtime)
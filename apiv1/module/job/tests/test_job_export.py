@@ -1,5 +1,7 @@
+import io
 import json
 import os
+import zipfile
 from io import StringIO
 
 from django.core.files.uploadedfile import InMemoryUploadedFile
@@ -57,3 +59,21 @@ class TestJobExport(APITestCase):
         })
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    @tccounter("job_export", "post", ENABLE_TCCOUNTER)
+    def test_post_stream(self):
+        job = self.default_data['job']
+        job_flow = self.default_data['job_flow']
+        response = self.client.post(reverse('job_export'), data={
+            'job_ids': [job.id],
+            'user_id': self.default_data['user'].id,
+            'stream': True
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as z:
+            self.assertEqual(set(z.namelist()), {
+                f'job/{job.job_name}/{job_flow.name}/ui.json',
+                f'job/{job.job_name}/job_attr.json',
+                'mark_info.json'
+            })
+            with open(job_flow.ui_json_file.path, 'rb') as f:
+                self.assertEqual(z.read(f'job/{job.job_name}/{job_flow.name}/ui.json'), f.read())
@@ -1,10 +1,16 @@
+import io
+import os
+import zipfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from apiv1.core.test import TestTool, tccounter
-from apiv1.module.job.models import Job
-from reef.settings import ENABLE_TCCOUNTER
+from apiv1.module.job.business import import_jobs_from_zip
+from apiv1.module.job.models import Job, JobFlow
+from reef.settings import ENABLE_TCCOUNTER, JOB_IMPORT_TMP_ROOT
 
 
 class TestJobImport(APITestCase):
@@ -40,3 +46,42 @@ class TestJobImport(APITestCase):
                 'file': f
             }, format='multipart')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestJobImportFromZip(APITestCase):
+
+    def setUp(self):
+        self.default_data = TestTool.load_default_data()
+        self.job = self.default_data['job']
+        response = self.client.post(reverse('job_export'), data={
+            'job_ids': [self.job.id],
+            'user_id': self.default_data['user'].id,
+            'stream': True
+        })
+        self.zip_content = b''.join(response.streaming_content)
+
+    @tccounter("job_import", "post", ENABLE_TCCOUNTER)
+    def test_diff_without_extract(self):
+        response = self.client.post(reverse('job_import'), data={
+            'file': SimpleUploadedFile('export.zip', self.zip_content),
+            'user_id': self.default_data['user'].id
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([diff['exist_job_name'] for diff in response.data['diff_data']], [self.job.job_name])
+        self.assertTrue(os.path.isfile(os.path.join(JOB_IMPORT_TMP_ROOT, f"{response.data['dir_name']}.zip")))
+        self.assertFalse(os.path.exists(os.path.join(JOB_IMPORT_TMP_ROOT, response.data['dir_name'])))
+        os.remove(os.path.join(JOB_IMPORT_TMP_ROOT, f"{response.data['dir_name']}.zip"))
+
+    def test_import_replace_job_flow(self):
+        old_job_flow = self.default_data['job_flow']
+        with zipfile.ZipFile(io.BytesIO(self.zip_content)) as zf:
+            jobs = import_jobs_from_zip(zf, [f'job/{self.job.job_name}'])
+
+        self.assertEqual([job.id for job in jobs], [self.job.id])
+        job_flows = list(JobFlow.objects.filter(job=self.job))
+        self.assertEqual([job_flow.name for job_flow in job_flows], [old_job_flow.name])
+        self.assertNotEqual(job_flows[0].id, old_job_flow.id)
+        self.assertEqual(
+            list(self.job.custom_tag.values_list('id', flat=True)), [self.default_data['custom_tag'].id]
+        )
+        self.assertTrue(Job.objects.get(id=self.job.id).job_deleted)
@@ -0,0 +1,38 @@
+from rest_framework.test import APITestCase
+
+from apiv1.core.constants import JOB_FLOW_EXECUTE_MULTI, REDIS_JOB_DISPATCH_MANIFEST
+from apiv1.core.test import TestTool
+from apiv1.module.job.business import build_job_manifests, get_job_manifests
+from apiv1.module.job.models import Job
+from reef.settings import redis_connect
+
+
+class TestJobManifest(APITestCase):
+    def setUp(self):
+        self.default_data = TestTool.load_default_data()
+        self.job = self.default_data['job']
+
+    def tearDown(self):
+        redis_connect.hdel(REDIS_JOB_DISPATCH_MANIFEST, self.job.id)
+
+    def test_build_manifest(self):
+        manifest = build_job_manifests([self.job.id])[self.job.id]
+        self.assertEqual(manifest['job_label'], self.job.job_label)
+        self.assertEqual([job_flow['id'] for job_flow in manifest['job_flows']], [self.default_data['job_flow'].id])
+        self.assertEqual(manifest['inner_job_ids'], [])
+        self.assertTrue(redis_connect.hexists(REDIS_JOB_DISPATCH_MANIFEST, self.job.id))
+
+    def test_read_manifest_without_query(self):
+        build_job_manifests([self.job.id])
+        with self.assertNumQueries(0):
+            manifests = get_job_manifests(jobs=[self.job])
+        self.assertEqual(manifests[self.job.id]['id'], self.job.id)
+
+    def test_rebuild_outdated_manifest(self):
+        build_job_manifests([self.job.id])
+        self.job.flow_execute_mode = JOB_FLOW_EXECUTE_MULTI
+        self.job.save()
+        job = Job.objects.get(id=self.job.id)
+        manifest = get_job_manifests(jobs=[job])[job.id]
+        self.assertEqual(manifest['version'], job.updated_time.timestamp())
+        self.assertEqual(manifest['flow_execute_mode'], JOB_FLOW_EXECUTE_MULTI)
@@ -0,0 +1,141 @@
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from apiv1.core.test import TestTool, tccounter
+from apiv1.module.job.models import Job, JobRuntimeStats, TestGather
+from apiv1.module.job.view import job_statistics
+from apiv1.module.rds.models import Rds
+from apiv1.module.tboard.models import TBoard
+from apiv1.module.user.models import ReefUser
+from reef.settings import ENABLE_TCCOUNTER
+
+
+class TestJobRuntimeStats(APITestCase):
+    def setUp(self):
+        self.default_data = TestTool.load_default_data()
+        self.job = self.default_data['job']
+        self.tboard = self.default_data['tboard']
+        self.device = self.default_data['device']
+        Rds.objects.all().delete()
+        self.start = timezone.now().replace(microsecond=0) - timedelta(days=1)
+
+    def create_rds(self, minutes, hours_later=0, job_assessment_value='0', tboard=None):
+        start_time = self.start + timedelta(hours=hours_later)
+        return Rds.objects.create(job=self.job, device=self.device, tboard=tboard or self.tboard,
+                                  start_time=start_time, end_time=start_time + timedelta(minutes=minutes),
+                                  job_assessment_value=job_assessment_value)
+
+    def get_stats(self):
+        return JobRuntimeStats.objects.get(job=self.job)
+
+    def assert_stats_rebuilt(self):
+        """
+        增量维护的结果应与依Rds重建的结果一致
+        """
+        stats = JobRuntimeStats.objects.filter(job=self.job).values().first()
+        call_command('rebuild_job_runtime_stats', job=[self.job.id])
+        self.assertEqual(stats, JobRuntimeStats.objects.filter(job=self.job).values().first())
+
+    def test_update_on_rds_finish(self):
+        rds = Rds.objects.create(job=self.job, device=self.device, tboard=self.tboard, start_time=self.start)
+        stats = self.get_stats()
+        self.assertEqual((stats.run_count, stats.max_duration, stats.last_run), (0, None, self.start))
+
+        rds.end_time = self.start + timedelta(minutes=10)
+        rds.job_assessment_value = '1'
+        rds.save()
+        self.create_rds(20, hours_later=1)
+        stats = self.get_stats()
+        self.assertEqual(stats.run_count, 2)
+        self.assertEqual(stats.process_time, 900)
+        self.assertEqual(stats.max_duration, timedelta(minutes=20))
+        self.assertEqual((stats.first_run, stats.last_run), (self.start, self.start + timedelta(hours=1)))
+        self.assert_stats_rebuilt()
+
+    def test_delete_rds(self):
+        self.create_rds(10)
+        longest = self.create_rds(30, hours_later=2)
+        self.create_rds(20, hours_later=1, job_assessment_value='-1')
+
+        # 事务提交后才重算
+        with TestTool.capture_on_commit_callbacks():
+            longest.delete()
+        stats = self.get_stats()
+        self.assertEqual((stats.run_count, stats.max_duration), (1, timedelta(minutes=10)))
+        self.assertEqual(stats.last_run, self.start + timedelta(hours=1))
+        self.assert_stats_rebuilt()
+
+    def test_delete_tboard_rebuild_once(self):
+        tboard = TBoard.objects.create(author=self.default_data['user'], board_stamp=timezone.now())
+        self.create_rds(10)
+        for hours_later in range(1, 4):
+            self.create_rds(10 * hours_later, hours_later=hours_later, tboard=tboard)
+
+        # 逐条删除最近的rds，提交后只重算一次
+        with TestTool.capture_on_commit_callbacks() as callbacks:
+            tboard.delete()
+        rebuild_callbacks = [
+            callback for callback in callbacks if getattr(callback, 'collect_key', None) == 'job_runtime_stats'
+        ]
+        self.assertEqual(len(rebuild_callbacks), 1)
+        stats = self.get_stats()
+        self.assertEqual((stats.run_count, stats.max_duration), (1, timedelta(minutes=10)))
+        self.assertEqual(stats.last_run, self.start)
+        self.assert_stats_rebuilt()
+
+    def test_rds_change_job(self):
+        rds = self.create_rds(10)
+        other_job = Job.objects.create(job_label='runtime_stats_job', job_name='runtime_stats_job',
+                                       job_type='Joblib', author=self.default_data['user'])
+        rds.job = other_job
+        with TestTool.capture_on_commit_callbacks():
+            rds.save()
+        self.assertEqual(self.get_stats().run_count, 0)
+        self.assertIsNone(self.get_stats().last_run)
+        self.assertEqual(JobRuntimeStats.objects.get(job=other_job).max_duration, timedelta(minutes=10))
+
+    def test_queryset_update(self):
+        self.create_rds(10)
+        Rds.objects.filter(job=self.job).update(job_assessment_value='-1')
+        self.assertEqual(self.get_stats().run_count, 0)
+
+    def test_exclude_ai_tester_run_time(self):
+        ai_tboard = TBoard.objects.create(author=ReefUser.objects.create(username='AITester'),
+                                          board_stamp=timezone.now())
+        self.create_rds(10)
+        self.create_rds(10, hours_later=1, tboard=ai_tboard)
+        stats = self.get_stats()
+        self.assertEqual(stats.run_count, 2)
+        self.assertEqual(stats.last_run, self.start)
+        self.assert_stats_rebuilt()
+
+    def test_job_properties(self):
+        self.create_rds(10)
+        self.create_rds(30, hours_later=1)
+        job = Job.objects.get(id=self.job.id)
+        self.assertEqual(job.process_time, 1200)
+        self.assertEqual(job.max_process_time, 1800)
+        self.assertEqual(job.earliest_used_time, timezone.localtime(self.start).strftime('%Y-%m-%d %H:%M:%S'))
+
+    def test_job_statistics(self):
+        self.create_rds(10)
+        test_gather = TestGather.objects.create(name='runtime_stats_gather')
+        test_gather.job.add(self.job)
+        with self.assertNumQueries(3):
+            job_info = job_statistics(test_gather.job.all())
+        self.assertEqual(job_info['duration_time'], 600)
+
+    @tccounter("job_list", "get", ENABLE_TCCOUNTER)
+    def test_job_list_with_runtime_fields(self):
+        self.create_rds(10)
+        fields = 'id,process_time,max_process_time,recently_used_time,earliest_used_time'
+        with self.assertNumQueries(2):
+            response = self.client.get(f"{reverse('job_list')}?fields={fields}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        job_data, = [job for job in response.data['jobs'] if job['id'] == self.job.id]
+        self.assertEqual(job_data['process_time'], 600)
@@ -1,4 +1,3 @@
-import codecs
 import copy
 import datetime
 import json
@@ -9,17 +8,16 @@ import shutil
 import string
 import zipfile
 
-from pathlib import Path
-
 from django.apps import apps
-from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.db import IntegrityError, transaction, DataError
 from django.db.models import F, Count, Max
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.core.files.storage import FileSystemStorage
 from rest_framework import generics, status
 from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import mixins
 from django.db import transaction, connection
@@ -31,9 +29,11 @@ from apiv1.core.response import reef_400_response, ReefResponse, reef_500_respon
 from apiv1.core.status import StatusCode
 from apiv1.core.utils import JobBindResource, date_format_transverter
 from apiv1.core.view.generic import AutoExecuteSerializerGenericAPIView
-from apiv1.module.device.models import AndroidVersion, Manufacturer, PhoneModel, RomVersion
+from apiv1.core.zipstream import stream_zip, write_zip
 from apiv1.module.job import signal
-from apiv1.module.job.models import Job, JobTestArea, CustomTag, JobResourceFile, JobFlow, TestGather, Unit, Unit_EN
+from apiv1.module.job.business import import_jobs_from_zip, read_zip_json
+from apiv1.module.job.models import Job, JobTestArea, CustomTag, JobResourceFile, JobFlow, TestGather, Unit, Unit_EN, \
+    JobRuntimeStats
 from apiv1.module.job.serializer import UnionJobSerializer, JobMultiResourceFileSerializer, JobExportSerializer, \
     JobInfoSerializer, JobImportSerializer, JobFlowOrderUpdateSerializer, JobFlowCopySerializer, JobCopySerializer, \
     JobBindResourceSerializer, UpdateTestGatherSerializer, MergeTestGatherSerializer, JobLabelOrderSerializer, \
@@ -43,7 +43,7 @@ from apiv1.module.job.serializer import UnionJobSerializer, JobMultiResourceFile
 from apiv1.module.job.tasks.tasks import update_job_res_file
 from apiv1.module.rds.models import Rds
 from apiv1.module.user.models import ReefUser
-from reef.settings import BASE_DIR, JOB_EXPORT_ZIP_ROOT, JOB_EXPORT, MEDIA_ROOT, JOB_IMPORT_TMP_ROOT
+from reef.settings import JOB_EXPORT_ZIP_ROOT, JOB_EXPORT, MEDIA_ROOT, JOB_IMPORT_TMP_ROOT
 
 
 # class UnitLanguage(generics.GenericAPIView):
@@ -205,6 +205,7 @@ class JobExportView(generics.GenericAPIView):
 
     1. 校验用例归属权,只允许导出自己用例（job关联inner job不做校验），admin用户不做校验
     2. 对inner job 进行去重操作
+    3. zip由源文件直接产生，stream为True时以StreamingHttpResponse边压缩边回传
     """
     serializer_class = JobExportSerializer
 
@@ -245,67 +246,55 @@ class JobExportView(generics.GenericAPIView):
                 write_job_info(job, inner_jobs_info)
         # 序列化job
         job_attrs = JobInfoSerializer(job_list, many=True).data
-        # 构建目录结构
-        export_path = os.path.join(JOB_EXPORT_ZIP_ROOT,
-                                   'export_job' + (''.join(random.sample(string.ascii_letters, 8))))
-
-        inner_job_dir = os.path.join(export_path, 'inner_job')
-        job_dir = os.path.join(export_path, 'job')
-
-        Path(inner_job_dir).mkdir(parents=True, exist_ok=True)
-        Path(job_dir).mkdir(parents=True, exist_ok=True)
-
+        # zip内容直接由源文件产生，不再复制到临时目录
+        entries = []
         for job_attr in job_attrs:
             if job_attr['job_type'] == JOB_TYPE_INNER_JOB:
-                job_path_dir = os.path.join(inner_job_dir, job_attr['job_name'])
-                Path(job_path_dir).mkdir(parents=True, exist_ok=True)
+                job_path_dir = os.path.join('inner_job', job_attr['job_name'])
             else:
-                job_path_dir = os.path.join(job_dir, job_attr['job_name'])
-                Path(job_path_dir).mkdir(parents=True, exist_ok=True)
+                job_path_dir = os.path.join('job', job_attr['job_name'])
 
             # job_flow
-            for index, job_flow in enumerate(job_attr['job_flow']):
+            for job_flow in job_attr['job_flow']:
                 job_flow_path_dir = os.path.join(job_path_dir, job_flow['name'])
-                Path(job_flow_path_dir).mkdir(parents=True, exist_ok=True)
-                try:
-                    # copy ui_json_file, res file 资源到
-                    # copy ui_json_file 为 ui.json
-                    ui_json_file = os.path.join(MEDIA_ROOT, 'ui_json_file', job_flow['ui_json_file'].split('/')[-1])
-                    shutil.copy(ui_json_file, os.path.join(job_flow_path_dir, 'ui.json'))
-
-                    # copy res_file
-                    job_res_files = job_flow.pop('job_res_file')
-                    for job_res_file in job_res_files:
-                        res_file = os.path.join(MEDIA_ROOT, 'job_resource_file', job_res_file['file'].split('/')[-1])
-                        shutil.copy(res_file, os.path.join(job_flow_path_dir, job_res_file['name']))
-
-
-                except FileNotFoundError as e:
-                    shutil.rmtree(export_path)
-                    return reef_400_response(
-                        description='缺少依赖文件，请检查并重新保存用例',
-                        message=f'job related resource file missing, please check job integrity: {e}'
-                    )
+                # ui_json_file 导出为 ui.json
+                ui_json_file = os.path.join(MEDIA_ROOT, 'ui_json_file', job_flow['ui_json_file'].split('/')[-1])
+                entries.append((os.path.join(job_flow_path_dir, 'ui.json'), ui_json_file))
+                # res_file
+                job_res_files = job_flow.pop('job_res_file')
+                for job_res_file in job_res_files:
+                    res_file = os.path.join(MEDIA_ROOT, 'job_resource_file', job_res_file['file'].split('/')[-1])
+                    entries.append((os.path.join(job_flow_path_dir, job_res_file['name']), res_file))
 
             # 存储 job_attr 到 job_attr.json 文件中
-            job_attr_str = json.dumps(job_attr)
-            with open(os.path.join(job_path_dir, 'job_attr.json'), 'w') as json_file:
-                json_file.write(job_attr_str)
+            entries.append((os.path.join(job_path_dir, 'job_attr.json'), json.dumps(job_attr).encode()))
+
+        # 开始产生zip后无法再回传错误，先检查依赖的文件
+        missing_files = [
+            source for _, source in entries if not isinstance(source, bytes) and not os.path.isfile(source)
+        ]
+        if missing_files:
+            return reef_400_response(
+                description='缺少依赖文件，请检查并重新保存用例',
+                message=f'job related resource file missing, please check job integrity: {missing_files}'
+            )
 
         # 记录inner_job的job_label信息
         mark_info = json.dumps(
             {'username': username_list, 'inner_job': inner_jobs_info, 'job': jobs_info},
             ensure_ascii=False
         )
-        with codecs.open(os.path.join(export_path, 'mark_info.json'), 'w', 'utf-8') as json_file:
-            json_file.write(mark_info)
+        entries.append(('mark_info.json', mark_info.encode('utf-8')))
 
         # 生成压缩包
         file_name = f"job-export-{timezone.localtime().strftime('%Y-%m-%d-%H:%M:%S')}-{len(job_ids)}.zip"
-        job_zip_path = os.path.join(JOB_EXPORT_ZIP_ROOT, file_name)
-        zip_file(job_zip_path, export_path)
+        if serializer.validated_data['stream']:
+            # 边压缩边回传，不落地也不占用与导出大小相当的内存
+            response = StreamingHttpResponse(stream_zip(entries), content_type='application/zip')
+            response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+            return response
 
-        shutil.rmtree(export_path)
+        write_zip(os.path.join(JOB_EXPORT_ZIP_ROOT, file_name), entries)
         return Response({'success': f"/media/{JOB_EXPORT}/{file_name}"}, status=status.HTTP_200_OK)
 
 
@@ -323,43 +312,29 @@ class JobExecuteImportView(generics.GenericAPIView):
         job_name_list = serializer.validated_data.get('job_name_list', [])
         inner_job_name_list = serializer.validated_data.get('inner_job_name_list', [])
 
-        import_dir = os.path.join(JOB_IMPORT_TMP_ROOT, dir_name)
-        if not (Path(import_dir).exists() and Path(import_dir).is_dir()):
+        import_zip_path = os.path.join(JOB_IMPORT_TMP_ROOT, f'{os.path.basename(dir_name)}.zip')
+        if not os.path.isfile(import_zip_path):
             return reef_400_response(
                 description='上传文件包丢失，请重新上传ZIP包',
                 message=f'dir: {dir_name} not exist'
             )
 
-        # save inner job
-        inner_job_dir = os.path.join(import_dir, 'inner_job')
-        inner_job_label_list = []
-        if inner_job_name_list:
-            if Path(inner_job_dir).exists():
-                inner_job_label_list = get_job_save(inner_job_dir, inner_job_name_list, import_dir)
-            else:
-                return reef_400_response(
-                    description="缺少 inner job 目录，压缩包错误，请检查",
-                    message=f"{dir_name} dir lack inner job directory, can't import inner job"
-                )
-        # save job
-        job_dir = os.path.join(import_dir, 'job')
-        job_label_list = []
-        if job_name_list:
-            if Path(job_dir).exists():
-                job_label_list = get_job_save(job_dir, job_name_list, import_dir)
-            else:
-                return reef_400_response(
-                    description="缺少 job 目录，压缩包错误，请检查",
-                    message=f"{dir_name} dir lack job directory, can't import job"
-                )
-
-        # 导入完成删除导入目录
-        shutil.rmtree(import_dir)
+        # 所选的inner job及job在同一个事务中导入，直接读取zip内的文件
+        job_dirs = [f'inner_job/{job_name}' for job_name in inner_job_name_list] + \
+                   [f'job/{job_name}' for job_name in job_name_list]
+        try:
+            with zipfile.ZipFile(import_zip_path, 'r') as zf, transaction.atomic():
+                jobs = import_jobs_from_zip(zf, job_dirs)
+        except ValidationError:
+            raise
+        except Exception as e:
+            return reef_500_response(description='用例导入失败', message=f'job import fail: {e}')
+        finally:
+            # 导入完成删除导入文件
+            os.remove(import_zip_path)
 
         # 打包用例
-        job_label_list.extend(inner_job_label_list)
-        ids = Job.objects.filter(job_label__in=job_label_list).values_list('id', flat=True)
-        signal.job_res_file_export.send(sender=self.__class__, **dict(job=ids, is_job_import=True))
+        signal.job_res_file_export.send(sender=self.__class__, **dict(job=[job.id for job in jobs], is_job_import=True))
 
         return ReefResponse()
 
@@ -381,29 +356,30 @@ class JobImportView(generics.GenericAPIView):
         if not zipfile.is_zipfile(zip_file):
             return reef_400_response(description='导入文件不是ZIP压缩文件', message='uploaded file format is incorrect')
 
-        # 获取压缩包并解压
-        zip_file_path = os.path.join(BASE_DIR, zip_file.name)
-        with open(zip_file_path, 'wb+') as f:
+        # 上传的zip只写入一次，不解压，导入时直接读取所需的文件
+        job_import_dir = 'job_import_' + (''.join(random.sample(string.ascii_letters, 8)))
+        import_zip_path = os.path.join(JOB_IMPORT_TMP_ROOT, f'{job_import_dir}.zip')
+        with open(import_zip_path, 'wb') as f:
             for chunk in zip_file.chunks():
                 f.write(chunk)
 
-        job_import_dir = 'job_import_' + (''.join(random.sample(string.ascii_letters, 8)))
-        unzip_path = os.path.join(JOB_IMPORT_TMP_ROOT, job_import_dir)
-        Path(unzip_path).mkdir()
-        with zipfile.ZipFile(zip_file_path, 'r') as zf:
-            zf.extractall(unzip_path)
-
-        os.remove(zip_file_path)
-
         # 获取压缩包mark_info.json 信息, 三个参数不能缺省
         # {usernmae: [], inner_job:[{}], job:[] }
-        with open(os.path.join(unzip_path, 'mark_info.json'), 'r', encoding='UTF-8') as f:
-            mark_info = json.load(fp=f)
+        try:
+            with zipfile.ZipFile(import_zip_path, 'r') as zf:
+                unsafe_names = [name for name in zf.namelist() if name.startswith('/') or '..' in name.split('/')]
+                if unsafe_names:
+                    raise ValueError(f'unsafe file path: {unsafe_names}')
+                mark_info = read_zip_json(zf, 'mark_info.json')
             user_names = mark_info.get('username')
             inner_jobs_info = mark_info.get('inner_job')
             jobs_info = mark_info.get('job')
+        except (KeyError, ValueError, zipfile.BadZipFile) as e:
+            os.remove(import_zip_path)
+            return reef_400_response(description='压缩包错误,不能用作用例导入', message=f'mark_info.json error: {e}')
 
         if user_names is None or inner_jobs_info is None or jobs_info is None:
+            os.remove(import_zip_path)
             return reef_400_response(
                 description='压缩包错误,不能用作用例导入',
                 message=f'mark_info.json 内容错误: \n'
@@ -425,9 +401,9 @@ class JobImportView(generics.GenericAPIView):
                 user_names.append(user_name)
         # admin可以导入任意用例，用例归属的用户不存在直接创建，密码默认并且不激活
         else:
-            for username in user_names:
-                if not ReefUser.objects.filter(username=username).exists():
-                    ReefUser.objects.create_user(username, None, REEF_USER_DEFAULT_PASSWORD, is_active=False)
+            exist_user_names = set(ReefUser.objects.filter(username__in=user_names).values_list('username', flat=True))
+            for username in set(user_names) - exist_user_names:
+                ReefUser.objects.create_user(username, None, REEF_USER_DEFAULT_PASSWORD, is_active=False)
 
         # 获取差异job
         # inner job
@@ -825,16 +801,6 @@ class GetTestGatherViewSet(AutoExecuteSerializerGenericAPIView):
 #####################################################
 # helper function                                   #
 #####################################################
-def zip_file(zip_file_path, file_path):
-    f = zipfile.ZipFile(zip_file_path, "w", zipfile.ZIP_DEFLATED)
-    for root, dirs, files in os.walk(file_path):
-        dir_path = root.replace(file_path, '') and root.replace(file_path, '') + os.sep or ''
-        for file in files:
-            f.write(os.path.join(root, file), dir_path + file)
-    f.close()
-    return
-
-
 def file_copy(copy_obj: str = None, flow_obj=None, job_res_file_obj=None):
     if copy_obj == 'job_flow':
         new_file_name = FileSystemStorage().get_available_name('ui_json_file/ui.json')
@@ -883,7 +849,12 @@ def _flow_copy(name, flow, job, is_job_copy=False):
 
 def job_statistics(jobs):
     job_count = jobs.count()
-    duration_time = sum([job.process_time for job in jobs if job.process_time is not None])
+    # 各job的平均用时由JobRuntimeStats读取，一次查询取得
+    duration_time = sum(
+        stats.process_time for stats in JobRuntimeStats.objects.filter(
+            job__in=jobs.filter(job_deleted=False), run_count__gt=0
+        ).only('run_count', 'total_duration')
+    )
     cabinets = jobs.exclude(cabinet_type=None).values('cabinet_type').annotate(Count('cabinet_type'))
     # cabinets = [{cabinet_type: "cab-1", cabinet_type_count: 1}{cabinet_type: "cab-1", cabinet_type_count: 2}]
     cabinet_version_list = [cabinet['cabinet_type'] for cabinet in cabinets]
@@ -914,30 +885,36 @@ def get_diff_job_list(jobs_info):
     """
     diff_info_list = []
     no_diff_job_name_list = []
+    # 一次查询取得所有存在冲突的job
+    exist_jobs = {
+        job.job_label: job for job in Job.objects.filter(
+            job_label__in=[job_info['job_label'] for job_info in jobs_info], job_deleted=False
+        ).select_related('author')
+    }
     for job_info in jobs_info:
         job_label = job_info['job_label']
         job_name = job_info['job_name']
         job_user_name = job_info['job_user_name']
         update_time = datetime.datetime.strptime(job_info['update_time'], "%Y-%m-%d %H:%M:%S:%f")
-        try:
-            # 存在冲突，返给前端页面进行选择
-            job = Job.objects.get(job_label=job_label, job_deleted=False)
-            # 导入用例和系统中原有用例做比较，true 表示导入用例时间更新，反之亦然。
-            old_job_updated_time = timezone.localtime(job.updated_time)
-            contrast = update_time.__gt__(old_job_updated_time.replace(tzinfo=None))
-            ret = {
-                'contrast': contrast,
-                'import_job_name': job_name,
-                'import_job_update_time': datetime.datetime.strftime(update_time, "%Y-%m-%d %H:%M:%S"),
-                'import_job_username': job_user_name,
-                'exist_job_name': job.job_name,
-                'exist_job_update_time': datetime.datetime.strftime(old_job_updated_time, "%Y-%m-%d %H:%M:%S"),
-                'exist_job_username': job.author.username,
-                'job_type': job.job_type,
-            }
-            diff_info_list.append(ret)
-        except Exception as e:
+        job = exist_jobs.get(job_label)
+        if job is None:
             no_diff_job_name_list.append(job_name)
+            continue
+        # 存在冲突，返给前端页面进行选择
+        # 导入用例和系统中原有用例做比较，true 表示导入用例时间更新，反之亦然。
+        old_job_updated_time = timezone.localtime(job.updated_time)
+        contrast = update_time.__gt__(old_job_updated_time.replace(tzinfo=None))
+        ret = {
+            'contrast': contrast,
+            'import_job_name': job_name,
+            'import_job_update_time': datetime.datetime.strftime(update_time, "%Y-%m-%d %H:%M:%S"),
+            'import_job_username': job_user_name,
+            'exist_job_name': job.job_name,
+            'exist_job_update_time': datetime.datetime.strftime(old_job_updated_time, "%Y-%m-%d %H:%M:%S"),
+            'exist_job_username': job.author.username,
+            'job_type': job.job_type,
+        }
+        diff_info_list.append(ret)
     return diff_info_list, no_diff_job_name_list
 
 
@@ -953,169 +930,6 @@ def write_job_info(job, jobs_info):
     return jobs_info
 
 
-def save_job(job_attr, job_path, import_tmp_dir):
-    """
-    单个job保存数据
-    """
-    try:
-        job_label = job_attr.get('job_label')
-        attr_dict = dict(
-            job_label=job_attr.get('job_label'),
-            job_name=job_attr.get('job_name'),
-            job_type=job_attr.get('job_type'),
-            job_second_type=job_attr.get('job_second_type', None),
-            description=job_attr.get('description'),
-            power_upper_limit=job_attr.get('power_upper_limit'),
-            power_lower_limit=job_attr.get('power_lower_limit'),
-            case_number=job_attr.get('case_number'),
-            priority=job_attr.get('priority'),
-            draft=job_attr.get('draft'),
-            cabinet_type=job_attr.get('cabinet_type'),
-            matching_rule=job_attr.get('matching_rule'),
-            # job_import导入的draft默认True，更新完成，打包用例完成将job置为可用
-            job_deleted=True,
-            flow_execute_mode=job_attr.get('flow_execute_mode'),
-            updated_time=job_attr.get('updated_time'),
-            author=get_object_or_404(ReefUser, username=job_attr['author']['username'])
-        )
-
-        # 这里不筛选job_deleted字段，假删除job做update，不能执行create
-        job_queryset = Job.objects.filter(job_label=job_label)
-        if job_queryset:
-            job_queryset.update(**attr_dict)
-            job = job_queryset.first()
-        else:
-            job = Job.objects.create(**attr_dict)
-
-        # save job flow
-        # 记录inner_flow 原来关联的job_flow
-        relevance_job_flow_id_list = []
-        if job.job_type == JOB_TYPE_INNER_JOB:
-            [relevance_job_flow_id_list.extend(job_flow.job_flow.all()) for job_flow in job.job_flow.all()]
-
-        # job: job_flow = 1: n
-        for job_flow in job.job_flow.all():
-            job_flow.delete()
-
-        for job_flow in job_attr['job_flow']:
-            job_flow_path = os.path.join(job_path, job_flow['name'])
-            ui_json_file = os.path.join(job_flow_path, 'ui.json')
-            with open(ui_json_file, 'r') as f:
-                file = InMemoryUploadedFile(f, None, "ui.json", None, None, None)
-                job_flow_obj = JobFlow.custom_objects.create(
-                    name=job_flow['name'],
-                    ui_json_file=file,
-                    flow_type=job_flow['flow_type'],
-                    job=job,
-                    order=job_flow['order'],
-                    description=job_flow['description']
-                )
-                # import inner job。 维护更新inner job时 inner_flow 与原来 job_flow的关联关系
-                if job.job_type == JOB_TYPE_INNER_JOB:
-                    job_flow_obj.job_flow.add(*relevance_job_flow_id_list)
-                else:
-                    inner_job_label_list = job_flow.get('inner_flow')
-                    # check inner job exists
-                    job_label_list = Job.objects.filter(job_label__in=inner_job_label_list).values_list('job_label',
-                                                                                                        flat=True)
-                    lack_inner_job = set(inner_job_label_list) ^ set(list(job_label_list))
-                    if len(lack_inner_job):
-                        raise Exception(f"缺少 inner job: {lack_inner_job}")
-                    inner_flow_queryset = JobFlow.objects.filter(job__job_label__in=inner_job_label_list)
-                    job_flow_obj.inner_flow.add(*inner_flow_queryset)
-
-            # job: res_file = 1: n
-            for re_file in os.listdir(job_flow_path):
-                # ui.json文件是job flow 使用的文件，不是resource file，资源文件不能命名为ui.json.
-                # coral 使用的zip包中，job flow 使用的json文件被命名为ui.json
-                if re_file == 'ui.json':
-                    continue
-                with open(os.path.join(job_flow_path, re_file), 'rb') as f:
-                    file = InMemoryUploadedFile(f, None, re_file, None, None, None)
-                    JobResourceFile.objects.create(name=re_file,
-                                                   type=re_file.split('.')[-1],
-                                                   file=file,
-                                                   job_flow=job_flow_obj)
-
-        # job: test_area = n: n
-        job.test_area.clear()
-        for test_area in job_attr['test_area']:
-            obj, _ = JobTestArea.objects.get_or_create(description=test_area['description'])
-            job.test_area.add(obj)
-
-        # job: custom_tag = n: n
-        job.custom_tag.clear()
-        for custom_tag in job_attr['custom_tag']:
-            obj, _ = CustomTag.objects.get_or_create(custom_tag_name=custom_tag['custom_tag_name'])
-            job.custom_tag.add(obj)
-
-        # job: android_version = n: n
-        job.android_version.clear()
-        for android_version in job_attr['android_version']:
-            obj, _ = AndroidVersion.objects.get_or_create(version=android_version['version'])
-            job.android_version.add(obj)
-
-        # job: phone_model = n: n
-        job.phone_models.clear()
-        for phone_model in job_attr['phone_models']:
-            manufacturer = phone_model['manufacturer']
-            obj, _ = Manufacturer.objects.get_or_create(manufacturer_name=manufacturer['manufacturer_name'])
-            obj, _ = PhoneModel.objects.get_or_create(phone_model_name=phone_model['phone_model_name'],
-                                                      defaults={
-                                                          'cpu_name': phone_model['cpu_name'],
-                                                          'manufacturer': obj,
-                                                          'x_border': phone_model['x_border'],
-                                                          'y_border': phone_model['y_border'],
-                                                          'x_dpi': phone_model['x_dpi'],
-                                                          'y_dpi': phone_model['y_dpi']})
-            job.phone_models.add(obj)
-
-        # job: rom_version = n: n
-        job.rom_version.clear()
-        for rom_version in job_attr['rom_version']:
-            manufacturer = rom_version['manufacturer']
-            obj, _ = Manufacturer.objects.get_or_create(manufacturer_name=manufacturer['manufacturer_name'])
-            obj, _ = RomVersion.objects.get_or_create(version=rom_version['version'],
-                                                      defaults={'manufacturer': obj})
-            job.rom_version.add(obj)
-
-    except Exception as e:
-        # 导入错误清除解压文件夹
-        shutil.rmtree(import_tmp_dir)
-        job_type = job_attr.get('job_type')
-        if job_type == JOB_TYPE_INNER_JOB:
-            return reef_500_response(description=f'全部用例导入失败',
-                                     message=f'job import fail: {e}')
-        else:
-            return reef_500_response(description=f'非内嵌用例导入失败，如有内嵌用例已导入',
-                                     message=f'job import fail: {e}')
-
-
-def get_job_save(job_dir, job_name_list, import_tmp_dir):
-    """
-    保存inner job 或 job 列表中的job到系统中
-    """
-    job_label_lsit = []
-    # 批量导入某一类job为一个事务
-    with transaction.atomic():
-        for job_name in job_name_list:
-            try:
-                p = Path(os.path.join(job_dir, job_name, 'job_attr.json'))
-                job_path = os.path.join(job_dir, job_name)
-                with p.open() as f:
-                    job_attr = json.load(fp=f)
-            except Exception as e:
-                return reef_400_response(
-                    description=f'压缩包缺少必要文件',
-                    message=f'job import file: {e}'
-                )
-            # 保存数据
-            save_job(job_attr, job_path, import_tmp_dir)
-
-            job_label_lsit.append(job_attr.get('job_label'))
-        return job_label_lsit
-
-
 def compute_test_project_gather_count(func):
     def wrapper(test_project, test_gather_obj_list):
         old_gather_count = len(test_project.test_gather.all())
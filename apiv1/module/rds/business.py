@@ -0,0 +1,99 @@
+import codecs
+import os
+
+from elasticsearch.helpers import streaming_bulk
+
+from apiv1.core.constants import RDS_LOG_ES_READ_CHUNK_SIZE, RDS_LOG_ES_MAX_CONTENT_SIZE, RDS_LOG_ES_BULK_CHUNK_SIZE, \
+    RDS_LOG_ES_BULK_MAX_BYTES, RDS_LOG_ES_BACKFILL_BATCH_SIZE, REDIS_RDS_LOG_ES_CHECKPOINT
+from reef.settings import redis_pool_connect
+
+
+def read_rds_log_content(path, max_size=RDS_LOG_ES_MAX_CONTENT_SIZE, chunk_size=RDS_LOG_ES_READ_CHUNK_SIZE) -> str:
+    """
+    分块读取日志文件内容，超过max_size(字节)的部分截断，避免大文件整个载入内存
+    截断处不完整的UTF-8字符直接舍弃，无法解码的字节以U+FFFD取代
+    """
+    if not os.path.exists(path):
+        return ''
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    contents = []
+    remaining = max_size
+    with open(path, 'rb') as f:
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                contents.append(decoder.decode(b'', final=True))
+                break
+            remaining -= len(chunk)
+            contents.append(decoder.decode(chunk))
+    return ''.join(contents)
+
+
+def index_rds_logs(rds_logs, client=None) -> (int, list):
+    """
+    以streaming_bulk将RdsLog分批送至ES，每批的文档数量及大小有上限，单个文档的内容由read_rds_log_content截断
+    client: 不传时使用RdsLogDocument的连接
+    回传 (成功数量, 失败的item列表)；连接错误直接抛出，由调用方决定是否重试
+    """
+    from apiv1.documents import RdsLogDocument
+
+    document = RdsLogDocument()
+    return _streaming_bulk(client or document._get_connection(), document._get_actions(rds_logs, 'index'))
+
+
+def delete_rds_log_documents(rds_log_ids, client=None) -> (int, list):
+    """
+    从ES删除已删除的RdsLog的文档，文档不存在(404)视为成功
+    回传 (成功数量, 失败的item列表)；连接错误直接抛出，由调用方决定是否重试
+    """
+    from apiv1.documents import RdsLogDocument
+
+    actions = (
+        {'_op_type': 'delete', '_index': RdsLogDocument._index._name, '_id': rds_log_id} for rds_log_id in rds_log_ids
+    )
+    return _streaming_bulk(client or RdsLogDocument._get_connection(), actions)
+
+
+def _streaming_bulk(client, actions) -> (int, list):
+    success, errors = 0, []
+    for ok, item in streaming_bulk(
+            client, actions,
+            chunk_size=RDS_LOG_ES_BULK_CHUNK_SIZE, max_chunk_bytes=RDS_LOG_ES_BULK_MAX_BYTES, raise_on_error=False
+    ):
+        if ok or item.get('delete', {}).get('status') == 404:
+            success += 1
+        else:
+            errors.append(item)
+    return success, errors
+
+
+def get_rds_log_index_checkpoint() -> int:
+    checkpoint = redis_pool_connect.get(REDIS_RDS_LOG_ES_CHECKPOINT)
+    return int(checkpoint) if checkpoint is not None else 0
+
+
+def set_rds_log_index_checkpoint(checkpoint=0):
+    redis_pool_connect.set(REDIS_RDS_LOG_ES_CHECKPOINT, checkpoint)
+
+
+def backfill_rds_log_index(batch_size=RDS_LOG_ES_BACKFILL_BATCH_SIZE, max_batches=None, client=None) -> (bool, list):
+    """
+    从checkpoint之后按id顺序补建RdsLog索引，每批完成后将该批最后的id写入checkpoint，中断后可从该处继续
+    单个文档失败(e.g. mapping错误)重试也无法成功，记录后继续；连接错误直接抛出，checkpoint停留在上一批
+    回传 (是否已全部完成, 失败的item列表)
+    """
+    from apiv1.module.rds.models import RdsLog
+
+    checkpoint = get_rds_log_index_checkpoint()
+    errors = []
+    batch_num = 0
+    while max_batches is None or batch_num < max_batches:
+        rds_logs = list(RdsLog.objects.filter(id__gt=checkpoint).select_related('rds').order_by('id')[:batch_size])
+        if not rds_logs:
+            return True, errors
+        _, batch_errors = index_rds_logs(rds_logs, client)
+        errors.extend(batch_errors)
+        checkpoint = rds_logs[-1].id
+        set_rds_log_index_checkpoint(checkpoint)
+        batch_num += 1
+    return not RdsLog.objects.filter(id__gt=checkpoint).exists(), errors
@@ -1,10 +1,8 @@
-import logging
 import os
 
 from PIL import Image
 from django.contrib.postgres.fields import JSONField
-from django.db import models
-from django.db.models.fields.files import ImageFieldFile
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.postgres.indexes import BrinIndex
 
@@ -14,7 +12,8 @@ from reef import settings
 from apiv1.module.device.models import Device, PhoneModel, RomVersion
 from apiv1.module.job.models import Job
 from apiv1.module.tboard.models import TBoard
-from apiv1.core.constants import POWER_CONSUMPTION_ERROR_CODE, TEMP_CONSUMPTION_ERROR_CODE, RDS_FILTER_SERIOUS
+from apiv1.core.constants import POWER_CONSUMPTION_ERROR_CODE, TEMP_CONSUMPTION_ERROR_CODE, RDS_FILTER_SERIOUS, \
+    RDS_SCREENSHOT_THUMB_PENDING, RDS_SCREENSHOT_THUMB_READY, RDS_SCREENSHOT_THUMB_FAILED
 
 
 class Rds(AbsBase):
@@ -101,6 +100,29 @@ class Rds(AbsBase):
         unique_together = [['device', 'job', 'start_time']]
 
 
+class RdsDailyStatistics(models.Model):
+    """
+    Rds按天汇总的计数，以(day, tboard, device, job)为维度，由Rds的signal以增量方式维护
+    day: Rds开始时间(start_time)在TIME_ZONE时区下的日期
+    success/fail/na: job_assessment_value为0/1/其它值的Rds数量
+    数据统计页面按日期范围对其求和，查询耗时只与天数、分组数有关，与Rds数量无关
+    """
+    day = models.DateField(verbose_name='日期')
+    tboard = models.ForeignKey(TBoard, related_name='rds_daily_statistics', on_delete=models.CASCADE,
+                               verbose_name='任务')
+    device = models.ForeignKey(Device, related_name='rds_daily_statistics', on_delete=models.CASCADE,
+                               verbose_name='装置')
+    job = models.ForeignKey(Job, related_name='rds_daily_statistics', on_delete=models.CASCADE,
+                            verbose_name='用例')
+    success = models.IntegerField(default=0, verbose_name='通过rds数量')
+    fail = models.IntegerField(default=0, verbose_name='失败rds数量')
+    na = models.IntegerField(default=0, verbose_name='无效rds数量')
+
+    class Meta:
+        verbose_name_plural = "测试结果每日统计"
+        unique_together = [['day', 'tboard', 'device', 'job']]
+
+
 class RdsLog(models.Model):
     rds = models.ForeignKey(Rds, on_delete=models.CASCADE, related_name='rdslog', verbose_name='测试结果')
     log_file = models.FileField(upload_to="rds_logs/%Y_%m_%d", verbose_name='测试结果日志文件')
@@ -121,6 +143,8 @@ def make_thumb(path, new_height=150):
     image = Image.open(path)
     width, height = image.size
     new_width = int(new_height * width * 1.0 / height)
+    # JPEG可以直接以缩小的比例解码，避免解码完整尺寸的图片
+    image.draft(image.mode, (new_height, new_width))
     image.thumbnail((new_height, new_width))
     return image
 
@@ -129,6 +153,15 @@ class RdsScreenShot(models.Model):
     rds = models.ForeignKey(Rds, on_delete=models.CASCADE, related_name='rdsscreenshot', verbose_name='测试结果')
     img_file = models.ImageField(upload_to="screen_shot/%Y_%m_%d", verbose_name='测试结果截图')
     thumbs_file = models.ImageField(upload_to="screen_shot/%Y_%m_%d", blank=True, null=True, verbose_name='测试结果截压缩图')
+    # 缩略图在后台产生，未完成(pending)或失败(failed)时前端使用img_file显示
+    thumbs_status = models.CharField(max_length=10,
+                                     choices=(
+                                         (RDS_SCREENSHOT_THUMB_PENDING, RDS_SCREENSHOT_THUMB_PENDING),
+                                         (RDS_SCREENSHOT_THUMB_READY, RDS_SCREENSHOT_THUMB_READY),
+                                         (RDS_SCREENSHOT_THUMB_FAILED, RDS_SCREENSHOT_THUMB_FAILED),
+                                     ),
+                                     default=RDS_SCREENSHOT_THUMB_PENDING,
+                                     verbose_name='缩略图状态')
     # 储存该档案相关讯息，供Coral端使用
     file_name = models.CharField(max_length=100, verbose_name='测试结果截图名称')
     is_resource_file = models.BooleanField(default=False)
@@ -136,19 +169,22 @@ class RdsScreenShot(models.Model):
     class Meta:
         verbose_name_plural = "测试结果截图"
 
-    def save(self, **kwargs):
+    def save(self, generate_thumb=True, **kwargs):
+        creating = self.pk is None
         super(RdsScreenShot, self).save()
-        # 大图存在执行
-        if os.path.exists(self.img_file.path):
-            try:
-                thumb_image = make_thumb(self.img_file.path)
-                # 保存文件到指定路径 e.g: screen_shot/2021_12_01/f549425fe9871de508718b4c385a2306.jpeg
-                dir_name = self.img_file.name.split('/')[1]
-                img_name = self.img_file.name.split('/')[2]
-                thumb_path = os.path.join(settings.MEDIA_ROOT, 'screen_shot', f'{dir_name}', f'thumb_{img_name}')
-                thumb_image.save(thumb_path)
-                self.thumbs_file = ImageFieldFile(self, self.thumbs_file, f'screen_shot/{dir_name}/thumb_{img_name}')
-                self.save_base()
-            except Exception as e:
-                logger = logging.getLogger('backend')
-                logger.error(f'Image make thumb error:\n rds id: {self.id}\n msg:{e}')
+        # 缩略图由celery任务产生，不在上传请求中解码图片；批量上传时由调用方统一提交任务
+        if creating and generate_thumb:
+            from apiv1.module.rds.tasks.tasks import enqueue_rds_screenshot_thumbs
+            transaction.on_commit(lambda: enqueue_rds_screenshot_thumbs([self.id]))
+
+    def create_thumb_file(self):
+        """
+        产生缩略图，保存文件到指定路径 e.g: screen_shot/2021_12_01/thumb_f549425fe9871de508718b4c385a2306.jpeg
+        回传缩略图的name
+        """
+        thumb_image = make_thumb(self.img_file.path)
+        dir_name = self.img_file.name.split('/')[1]
+        img_name = self.img_file.name.split('/')[2]
+        thumb_path = os.path.join(settings.MEDIA_ROOT, 'screen_shot', f'{dir_name}', f'thumb_{img_name}')
+        thumb_image.save(thumb_path)
+        return f'screen_shot/{dir_name}/thumb_{img_name}'
@@ -1,13 +1,23 @@
-from django.db import transaction
+import collections
+
+from django.db import transaction, connection
+from django.db.models import AutoField
+from django.db.models.sql import InsertQuery
+from django.utils.encoding import smart_text
 from rest_framework import serializers
 from rest_framework.exceptions import APIException
 from rest_framework.fields import JSONField
 
+from apiv1.core.cache import invalidate_cache
 from apiv1.core.constants import JOB_RESOURCE_FILE_TYPE
 from apiv1.core.response import reef_400_response
 from apiv1.module.device.models import Device, PhoneModel, RomVersion
 from apiv1.module.job.models import Job
 from apiv1.module.rds.models import Rds, RdsLog, RdsScreenShot
+from apiv1.module.rds.tasks.tasks import enqueue_rds_screenshot_thumbs
+from apiv1.module.rds.signal import rds_created_by_fields, rds_statistics_vector, update_tboard_statistics, \
+    TBOARD_STATISTICS_FIELDS, rds_daily_statistics_key, rds_daily_statistics_vector, update_rds_daily_statistics, \
+    RDS_DAILY_STATISTICS_FIELDS
 from apiv1.module.tboard.models import TBoard
 
 
@@ -119,6 +129,168 @@ class RdsCreateOrUpdateSerializer(serializers.ModelSerializer):
                   'set_fps', 'set_shot_time', 'fps', 'frame_data')
 
 
+class BulkSlugRelatedField(serializers.SlugRelatedField):
+    """
+    批量校验时使用的SlugRelatedField
+    RdsBulkCreateListSerializer会先一次性查出本批数据涉及的关联对象并放入context，
+    逐条校验时直接从中取值，避免每条数据都查询一次数据库
+    """
+
+    def to_internal_value(self, data):
+        slug_cache = self.context.get('slug_cache', {}).get(self.field_name)
+        if slug_cache is None:
+            return super(BulkSlugRelatedField, self).to_internal_value(data)
+        try:
+            return slug_cache[str(data)]
+        except KeyError:
+            self.fail('does_not_exist', slug_name=self.slug_field, value=smart_text(data))
+
+
+def bulk_insert_rds_ignore_conflicts(rds_list, batch_size=500) -> set:
+    """
+    以INSERT ... ON CONFLICT DO NOTHING RETURNING批量插入Rds
+    回传实际插入的Rds的 (device_id, job_id, start_time)，因唯一键冲突被跳过的不在其中
+    """
+    fields = [field for field in Rds._meta.concrete_fields if not isinstance(field, AutoField)]
+    inserted_keys = set()
+    with connection.cursor() as cursor:
+        for index in range(0, len(rds_list), batch_size):
+            query = InsertQuery(Rds, ignore_conflicts=True)
+            query.insert_values(fields, rds_list[index:index + batch_size])
+            for sql, params in query.get_compiler(connection=connection).as_sql():
+                cursor.execute(f'{sql} RETURNING "device_id", "job_id", "start_time"', params)
+                inserted_keys.update(cursor.fetchall())
+    return inserted_keys
+
+
+class RdsBulkCreateListSerializer(serializers.ListSerializer):
+    """
+    Coral批量上传Rds
+    1. 一次性查出整批数据所关联的device/job/tboard/phone_model/rom_version
+    2. 以 (device, job, start_time) 作为唯一键，跳过已存在的Rds，保证重复提交的幂等性
+    3. 在插入前计算created_by_ai_tester/created_by_sys_job，批量插入后按实际插入的Rds每个TBoard只更新一次计数
+    """
+    max_num = 2000
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            if len(data) > self.max_num:
+                raise serializers.ValidationError(f'Rds num can not be more than {self.max_num}')
+            self._prepare_slug_cache(data)
+        return super(RdsBulkCreateListSerializer, self).to_internal_value(data)
+
+    def _prepare_slug_cache(self, data):
+        slug_cache = {}
+        for field_name, field in self.child.fields.items():
+            if not isinstance(field, BulkSlugRelatedField):
+                continue
+            values = {str(item[field_name]) for item in data if isinstance(item, dict) and item.get(field_name) is not None}
+            queryset = field.get_queryset()
+            if field_name == 'tboard':
+                queryset = queryset.select_related('author')
+            try:
+                slug_cache[field_name] = {
+                    str(getattr(obj, field.slug_field)): obj
+                    for obj in queryset.filter(**{f'{field.slug_field}__in': values})
+                }
+            except (TypeError, ValueError):
+                # 存在格式不合法的值时交由逐条校验报错
+                continue
+        self.root._context['slug_cache'] = slug_cache
+
+    def create(self, validated_data):
+        # 同一批次中重复的Rds只保留第一条
+        rds_data = {}
+        for item in validated_data:
+            rds_data.setdefault((item['device'].id, item['job'].id, item['start_time']), item)
+        key_filter = {
+            'device_id__in': {key[0] for key in rds_data},
+            'job_id__in': {key[1] for key in rds_data},
+            'start_time__in': {key[2] for key in rds_data},
+        }
+
+        new_rds_list = []
+        for item in rds_data.values():
+            rds = Rds(**item)
+            rds.created_by_ai_tester, rds.created_by_sys_job = rds_created_by_fields(item['tboard'], item['job'])
+            new_rds_list.append(rds)
+
+        with transaction.atomic():
+            # 已存在(包括并发提交)的Rds由ON CONFLICT DO NOTHING跳过，计数只累加实际插入的Rds
+            inserted_keys = bulk_insert_rds_ignore_conflicts(new_rds_list)
+            created_rds_list = [
+                rds for rds in new_rds_list if (rds.device_id, rds.job_id, rds.start_time) in inserted_keys
+            ]
+
+            statistics_delta = collections.defaultdict(lambda: [0] * len(TBOARD_STATISTICS_FIELDS))
+            daily_statistics_delta = collections.defaultdict(lambda: [0] * len(RDS_DAILY_STATISTICS_FIELDS))
+            for rds in created_rds_list:
+                delta = statistics_delta[rds.tboard_id]
+                for index, value in enumerate(rds_statistics_vector(rds.end_time, rds.job_assessment_value)):
+                    delta[index] += value
+                daily_delta = daily_statistics_delta[
+                    rds_daily_statistics_key(rds.start_time, rds.tboard_id, rds.device_id, rds.job_id)
+                ]
+                for index, value in enumerate(rds_daily_statistics_vector(rds.job_assessment_value)):
+                    daily_delta[index] += value
+
+            # 直接INSERT不会触发Rds的signal，计数在这里按TBoard汇总后更新
+            for tboard_id, delta in statistics_delta.items():
+                update_tboard_statistics(tboard_id, delta)
+            for daily_key, daily_delta in daily_statistics_delta.items():
+                update_rds_daily_statistics(daily_key, daily_delta)
+            if created_rds_list:
+                invalidate_cache(
+                    'rds',
+                    tboard={rds.tboard_id for rds in created_rds_list},
+                    device={rds.device_id for rds in created_rds_list},
+                    job={rds.job_id for rds in created_rds_list}
+                )
+
+            rds_ids = {
+                (device_id, job_id, start_time): rds_id for rds_id, device_id, job_id, start_time in
+                Rds.objects.filter(**key_filter).values_list('id', 'device_id', 'job_id', 'start_time')
+            }
+
+        return {
+            'ids': [
+                rds_ids.get((item['device'].id, item['job'].id, item['start_time'])) for item in validated_data
+            ],
+            'created_num': len(created_rds_list),
+            'exist_num': len(rds_data) - len(created_rds_list)
+        }
+
+
+class RdsBulkCreateSerializer(RdsCreateOrUpdateSerializer):
+    device = BulkSlugRelatedField(
+        queryset=Device.objects.all(),
+        slug_field='device_label'
+    )
+    job = BulkSlugRelatedField(
+        queryset=Job.objects.all(),
+        slug_field='job_label'
+    )
+    tboard = BulkSlugRelatedField(
+        queryset=TBoard.objects.all(),
+        slug_field='id'
+    )
+    phone_model = BulkSlugRelatedField(
+        queryset=PhoneModel.objects.all(),
+        slug_field='phone_model_name',
+        required=False
+    )
+    rom_version = BulkSlugRelatedField(
+        queryset=RomVersion.objects.all(),
+        slug_field='version',
+        required=False
+    )
+
+    class Meta(RdsCreateOrUpdateSerializer.Meta):
+        list_serializer_class = RdsBulkCreateListSerializer
+        # 已存在的Rds在create时跳过，不逐条校验(device, job, start_time)唯一性
+        validators = []
+
+
 class UploadRdsLogSerializer(serializers.Serializer):
     """
     Coral上传RdsLog的接口
@@ -216,6 +388,7 @@ class RdsScreenShotFileMultiUploadSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         res_list = []
+        screenshot_ids = []
         res_obj = validated_data['rds']
         is_resource_file = validated_data.get('is_resource_file', True)
         try:
@@ -238,11 +411,13 @@ class RdsScreenShotFileMultiUploadSerializer(serializers.Serializer):
                     if is_resource_file:
                         rds_screen_shot_data['is_resource_file'] = is_resource_file
 
-                    instance = RdsScreenShot.objects.create(
-                       **rds_screen_shot_data
-                    )
+                    instance = RdsScreenShot(**rds_screen_shot_data)
+                    instance.save(generate_thumb=False)
+                    screenshot_ids.append(instance.id)
                     res = RdsScreenShotSerializer(instance)
                     res_list.append(res.data)
+                # 整批上传完成后再统一提交缩略图任务
+                transaction.on_commit(lambda: enqueue_rds_screenshot_thumbs(screenshot_ids))
         except Exception as e:
             reef_400_response(description='上传文件失败！！！', message=f"Exception info: {e}")
         return {"file_list": res_list}
@@ -1,106 +1,408 @@
+from datetime import timedelta
+
 from django.apps import apps
-from django.db import connection
-from django.db.models.signals import post_save, pre_delete, pre_save
+from django.db import connection, transaction
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 
+from apiv1.core.cache import invalidate_cache
+from apiv1.core.constants import JOB_RUNTIME_ASSESSMENT_VALUES
+from apiv1.module.device.signal import post_update
+from apiv1.module.job.business import rebuild_job_runtime_stats
+from apiv1.module.rds.tasks.tasks import index_rds_logs_task, delete_rds_log_documents_task
+from apiv1.module.tboard.business import rebuild_tboard_statistics, rebuild_rds_daily_statistics
 
-def _rds_update_field(instance):
-    rds_cls = apps.get_model("apiv1", "Rds")
 
+def rds_created_by_fields(tboard, job):
+    """
+    计算Rds的 created_by_ai_tester/created_by_sys_job 字段值
+    在写入数据库之前计算，避免插入后再额外执行一次UPDATE
+    """
     # rds field "created_by_ai_tester"
-    if instance.tboard is None or instance.tboard.author is None:
-        instance.created_by_ai_tester = False
+    if tboard is None or tboard.author is None:
+        created_by_ai_tester = False
     else:
-        instance.created_by_ai_tester = (instance.tboard.author.username == 'AITester')
+        created_by_ai_tester = (tboard.author.username == 'AITester')
 
     # rds field "created_by_sys_job"
-    if instance.job is None:
-        instance.created_by_sys_job = False
-    instance.created_by_sys_job = (instance.job.job_type == 'Sysjob')
+    created_by_sys_job = False if job is None else (job.job_type == 'Sysjob')
+
+    return created_by_ai_tester, created_by_sys_job
+
+
+# TBoardStatistics 计数字段，rds_statistics_vector 返回值的顺序与之对应
+TBOARD_STATISTICS_FIELDS = ('total', 'finished', 'success', 'fail', 'na')
+
+
+def rds_statistics_vector(end_time, job_assessment_value):
+    """
+    单条Rds对所属TBoard计数的贡献值
+    未结束的Rds只计入total，已结束的Rds按job_assessment_value计入success/fail/na
+    """
+    if end_time is None:
+        return 1, 0, 0, 0, 0
+    return (
+        1,
+        1,
+        int(job_assessment_value == '0'),
+        int(job_assessment_value == '1'),
+        int(job_assessment_value not in ('0', '1'))
+    )
+
+
+def update_tboard_statistics(tboard_id, delta, create=True):
+    """
+    以增量方式更新TBoard的Rds计数，并根据更新后的计数同步TBoard.success_ratio
+    create为False时只更新已存在的计数(用于删除流程，避免为即将级联删除的TBoard插入新计数)
+    """
+    if tboard_id is None or not any(delta):
+        return
 
+    with connection.cursor() as sql:
+        if create:
+            sql.execute(
+                "INSERT INTO apiv1_tboardstatistics (tboard_id, total, finished, success, fail, na) "
+                "VALUES (%s, %s, %s, %s, %s, %s) "
+                "ON CONFLICT (tboard_id) DO UPDATE SET "
+                + ", ".join(f"{field} = apiv1_tboardstatistics.{field} + EXCLUDED.{field}"
+                            for field in TBOARD_STATISTICS_FIELDS)
+                + " RETURNING success, finished",
+                [tboard_id, *delta]
+            )
+        else:
+            sql.execute(
+                "UPDATE apiv1_tboardstatistics SET "
+                + ", ".join(f"{field} = {field} + %s" for field in TBOARD_STATISTICS_FIELDS)
+                + " WHERE tboard_id = %s RETURNING success, finished",
+                [*delta, tboard_id]
+            )
+        row = sql.fetchone()
+        if row is None:
+            return
+        success, finished = row
+        success_ratio = round(success / finished, 3) if finished != 0 else 0
+        sql.execute("UPDATE apiv1_tboard SET success_ratio = %s WHERE id = %s", [success_ratio, tboard_id])
+
+
+# RdsDailyStatistics 计数字段，rds_daily_statistics_vector 返回值的顺序与之对应
+RDS_DAILY_STATISTICS_FIELDS = ('success', 'fail', 'na')
+
+
+def rds_daily_statistics_key(start_time, tboard_id, device_id, job_id):
+    """
+    单条Rds在RdsDailyStatistics中所属的行: (day, tboard_id, device_id, job_id)
+    day取start_time在TIME_ZONE时区下的日期，与重建SQL中的计算方式一致
+    """
+    if timezone.is_naive(start_time):
+        start_time = timezone.make_aware(start_time)
+    return timezone.localtime(start_time).date(), tboard_id, device_id, job_id
+
+
+def rds_daily_statistics_vector(job_assessment_value):
+    """
+    单条Rds对每日计数的贡献值，未结束的Rds(job_assessment_value为空)计入na
+    """
+    return (
+        int(job_assessment_value == '0'),
+        int(job_assessment_value == '1'),
+        int(job_assessment_value not in ('0', '1'))
+    )
+
+
+def update_rds_daily_statistics(key, delta, create=True):
+    """
+    以增量方式更新RdsDailyStatistics中key对应行的计数
+    create为False时只更新已存在的行(用于删除流程)
+    """
+    if not any(delta):
+        return
+
+    with connection.cursor() as sql:
+        if create:
+            sql.execute(
+                "INSERT INTO apiv1_rdsdailystatistics (day, tboard_id, device_id, job_id, success, fail, na) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s) "
+                "ON CONFLICT (day, tboard_id, device_id, job_id) DO UPDATE SET "
+                + ", ".join(f"{field} = apiv1_rdsdailystatistics.{field} + EXCLUDED.{field}"
+                            for field in RDS_DAILY_STATISTICS_FIELDS),
+                [*key, *delta]
+            )
+        else:
+            sql.execute(
+                "UPDATE apiv1_rdsdailystatistics SET "
+                + ", ".join(f"{field} = {field} + %s" for field in RDS_DAILY_STATISTICS_FIELDS)
+                + " WHERE day = %s AND tboard_id = %s AND device_id = %s AND job_id = %s",
+                [*delta, *key]
+            )
+
+
+def job_runtime_stats_vector(start_time, end_time, job_assessment_value, created_by_ai_tester):
+    """
+    单条Rds对所属job运行统计的贡献值: (run_count, total_duration, max_duration, first_run, last_run)
+    已结束且结果在JOB_RUNTIME_ASSESSMENT_VALUES内的rds计入用时，AITester创建的rds不计入运行时间
+    """
+    if timezone.is_naive(start_time):
+        start_time = timezone.make_aware(start_time)
+    if end_time is not None and timezone.is_naive(end_time):
+        end_time = timezone.make_aware(end_time)
+    counted = (
+        end_time is not None and end_time >= start_time and job_assessment_value in JOB_RUNTIME_ASSESSMENT_VALUES
+    )
+    duration = end_time - start_time if counted else None
+    run_time = None if created_by_ai_tester else start_time
+    return int(counted), duration if counted else timedelta(0), duration, run_time, run_time
+
+
+def update_job_runtime_stats(job_id, delta):
+    """
+    将delta合并至job的运行统计: 数量与总用时相加，最大用时/最近运行时间取较大值，最早运行时间取较小值
+    """
+    if job_id is None:
+        return
     with connection.cursor() as sql:
         sql.execute(
-            f"UPDATE apiv1_rds SET created_by_ai_tester = '{instance.created_by_ai_tester}',"
-            f"created_by_sys_job = '{instance.created_by_sys_job}' WHERE id = {instance.id}"
+            "INSERT INTO apiv1_jobruntimestats (job_id, run_count, total_duration, max_duration, first_run, last_run) "
+            "VALUES (%s, %s, %s, %s, %s, %s) "
+            "ON CONFLICT (job_id) DO UPDATE SET "
+            "run_count = apiv1_jobruntimestats.run_count + EXCLUDED.run_count, "
+            "total_duration = apiv1_jobruntimestats.total_duration + EXCLUDED.total_duration, "
+            "max_duration = GREATEST(apiv1_jobruntimestats.max_duration, EXCLUDED.max_duration), "
+            "first_run = LEAST(apiv1_jobruntimestats.first_run, EXCLUDED.first_run), "
+            "last_run = GREATEST(apiv1_jobruntimestats.last_run, EXCLUDED.last_run)",
+            [job_id, *delta]
         )
 
-    return
 
-
-def _update_tboard_success_ratio(instance, flag=''):
-    rds_cls = apps.get_model("apiv1", "Rds")
-    tboard_cls = apps.get_model("apiv1", "TBoard")
-
-    success = rds_cls.objects.filter(tboard=instance.tboard_id, end_time__isnull=False).filter(job_assessment_value='0').count()
-    total = rds_cls.objects.filter(tboard=instance.tboard_id, end_time__isnull=False).count()
-    # create/after_modify total+1   if job_assessment_value=0 suc+1
-    if flag == 'created' or flag == 'after_modify' or flag == 'changed_end_time_value' or flag == 'changed_job_assessment_and_end_time_value':
-        if instance.end_time != None:
-            total += 1
-            if instance.job_assessment_value == '0':
-                success += 1
-
-    # deleted/before_modify total+1  if job_assessment_value=0 suc-1
-    if flag == 'deleted' or flag == 'before_modify':
-        if instance.end_time != None:
-            total -= 1
-            if instance.job_assessment_value == '0':
-                success -= 1
-
-    if flag == 'changed_job_assessment_value':
-        old_rds = rds_cls.objects.get(id=instance.id)
-        if old_rds.end_time != None:
-            if old_rds.job_assessment_value == '0':
-                if instance.job_assessment_value == '1':  # 0 --> !0   tboard : success - 1
-                    success -= 1
-
-            else:
-                if instance.job_assessment_value == '0':  # !0  --> 0   tboard : success + 1
-                    success += 1
-
-    success_ratio = round(success / total, 3) if total != 0 else 0
+def remove_job_runtime_stats(job_id, start_time, vector, rds_id):
+    """
+    从job的运行统计中减去单条rds的贡献
+    数量与总用时直接相减；该rds可能是最大用时或最早/最近运行时间的来源时，排除该rds重新计算这个job
+    """
+    if job_id is None:
+        return
+    run_count, total_duration, max_duration, _, _ = vector
     with connection.cursor() as sql:
-        sql.execute(f"UPDATE apiv1_tboard SET success_ratio = '{success_ratio}' WHERE id = {instance.tboard_id}")
+        sql.execute(
+            "UPDATE apiv1_jobruntimestats SET run_count = run_count - %s, total_duration = total_duration - %s "
+            "WHERE job_id = %s RETURNING max_duration, first_run, last_run",
+            [run_count, total_duration, job_id]
+        )
+        row = sql.fetchone()
+    if row is None:
+        return
+    stats_max_duration, first_run, last_run = row
+    # 不以created_by_ai_tester判断，宁可多重算一次也不遗漏
+    if (max_duration is not None and (stats_max_duration is None or max_duration >= stats_max_duration)) \
+            or first_run is None or start_time <= first_run or start_time >= last_run:
+        rebuild_job_runtime_stats_on_commit(job_id, rds_id)
+
 
+def rebuild_job_runtime_stats_on_commit(job_id, rds_id):
+    """
+    在事务中时(e.g. 删除TBoard时逐条删除其rds)，需要重算的job收集起来，提交后每个job只重算一次，
+    此时rds已删除/修改完成，不需要排除；不在事务中时立即排除该rds重算
+    """
+    if not connection.in_atomic_block:
+        rebuild_job_runtime_stats([job_id], exclude_rds_id=rds_id)
+        return
+    on_commit_collect('job_runtime_stats', job_id, rebuild_job_runtime_stats)
 
-@receiver(post_save, sender="apiv1.Rds", dispatch_uid='rds_post_save')
-def rds_post_save_handler(sender, instance=None, **kwargs):
-    _rds_update_field(instance)
+
+def on_commit_collect(collect_key, item, callback):
+    """
+    同一事务中以相同collect_key登记的item收集到一个集合，提交后以该集合呼叫callback一次
+    不在事务中时立即呼叫
+    """
+    # 当前事务已登记的回调，找到时直接加入item
+    for _, func in connection.run_on_commit:
+        if getattr(func, 'collect_key', None) == collect_key:
+            func.items.add(item)
+            return
+
+    items = {item}
+
+    def run():
+        callback(items)
+
+    run.collect_key, run.items = collect_key, items
+    transaction.on_commit(run)
+
+
+def update_job_runtime_stats_on_change(instance, old_rds, old_vector, new_vector):
+    """
+    rds修改时更新job运行统计
+    常见的情况是rds结束时写入end_time/job_assessment_value，此时运行时间不变、用时只增不减，直接累加差值；
+    其它情况先移除修改前的贡献再加上修改后的贡献
+    """
+    old_count, old_total, old_max, old_first, old_last = old_vector
+    new_count, new_total, new_max, new_first, new_last = new_vector
+    if old_rds['job_id'] == instance.job_id and (old_first, old_last) == (new_first, new_last) \
+            and (old_max is None or (new_max is not None and new_max >= old_max)):
+        update_job_runtime_stats(
+            instance.job_id, (new_count - old_count, new_total - old_total, new_max, new_first, new_last)
+        )
+        return
+    remove_job_runtime_stats(old_rds['job_id'], old_rds['start_time'], old_vector, instance.id)
+    update_job_runtime_stats(instance.job_id, new_vector)
+
+
+def rds_created_by_ai_tester(created_by_ai_tester):
+    # created_by_ai_tester为CharField，写入前为bool，从数据库读出为'True'/'False'
+    return created_by_ai_tester in (True, 'True')
 
 
 @receiver(pre_save, sender="apiv1.Rds", dispatch_uid='rds_pre_save')
 def rds_pre_save_handler(sender, instance=None, **kwargs):
     rds_cls = apps.get_model("apiv1", "Rds")
+    # 时间以字符串传入时先转换为datetime，计算每日计数与用时需要
+    for field_name in ('start_time', 'end_time'):
+        value = getattr(instance, field_name)
+        if isinstance(value, str):
+            setattr(instance, field_name, rds_cls._meta.get_field(field_name).to_python(value))
+    instance.created_by_ai_tester, instance.created_by_sys_job = rds_created_by_fields(instance.tboard, instance.job)
+    new_vector = rds_statistics_vector(instance.end_time, instance.job_assessment_value)
+
+    new_daily_key = rds_daily_statistics_key(
+        instance.start_time, instance.tboard_id, instance.device_id, instance.job_id
+    )
+    new_daily_vector = rds_daily_statistics_vector(instance.job_assessment_value)
+    new_runtime_vector = job_runtime_stats_vector(
+        instance.start_time, instance.end_time, instance.job_assessment_value, instance.created_by_ai_tester
+    )
+
+    old_rds = rds_cls.objects.filter(id=instance.id).values(
+        'tboard_id', 'device_id', 'job_id', 'start_time', 'end_time', 'job_assessment_value', 'created_by_ai_tester'
+    ).first() if instance.id is not None else None
 
     # rds创建
-    if instance.id is None:
-        _update_tboard_success_ratio(instance, flag='created')
+    if old_rds is None:
+        update_tboard_statistics(instance.tboard_id, new_vector)
+        update_rds_daily_statistics(new_daily_key, new_daily_vector)
+        update_job_runtime_stats(instance.job_id, new_runtime_vector)
+        return
 
-    # rds与tboard的关联关系改变 eg：rds -->tboard1  change to  rds -->tboard2
-    # before_modify：计算的是tboard1关联rds的成功率（改变之前）
-    # after_modify： 计算的是tboard2关联rds的成功率（改变之后）
-    elif instance.tboard_id != rds_cls.objects.get(id=instance.id).tboard_id:
-        _update_tboard_success_ratio(rds_cls.objects.get(id=instance.id), flag='before_modify')
-        _update_tboard_success_ratio(instance, flag='after_modify')
-
-    # rds job_assessment_value 字段值发生改变
-    elif instance.job_assessment_value != rds_cls.objects.get(id=instance.id).job_assessment_value:
-        if instance.end_time != rds_cls.objects.get(id=instance.id).end_time:
-            _update_tboard_success_ratio(instance, flag='changed_job_assessment_and_end_time_value')
-        else:
-            _update_tboard_success_ratio(instance, flag='changed_job_assessment_value')
+    # 修改前关联的tboard/device/job，写入后一并使其缓存失效(rds_post_save_handler)
+    instance._old_rds_related = (old_rds['tboard_id'], old_rds['device_id'], old_rds['job_id'])
+
+    old_daily_key = rds_daily_statistics_key(
+        old_rds['start_time'], old_rds['tboard_id'], old_rds['device_id'], old_rds['job_id']
+    )
+    old_daily_vector = rds_daily_statistics_vector(old_rds['job_assessment_value'])
+    if old_daily_key != new_daily_key:
+        update_rds_daily_statistics(old_daily_key, tuple(-item for item in old_daily_vector), create=False)
+        update_rds_daily_statistics(new_daily_key, new_daily_vector)
+    else:
+        update_rds_daily_statistics(
+            new_daily_key,
+            tuple(new - old for new, old in zip(new_daily_vector, old_daily_vector))
+        )
+
+    old_runtime_vector = job_runtime_stats_vector(
+        old_rds['start_time'], old_rds['end_time'], old_rds['job_assessment_value'],
+        rds_created_by_ai_tester(old_rds['created_by_ai_tester'])
+    )
+    if old_runtime_vector != new_runtime_vector or old_rds['job_id'] != instance.job_id:
+        update_job_runtime_stats_on_change(instance, old_rds, old_runtime_vector, new_runtime_vector)
 
-    elif instance.end_time != rds_cls.objects.get(id=instance.id).end_time:
-        _update_tboard_success_ratio(instance, flag='changed_end_time_value')
+    old_vector = rds_statistics_vector(old_rds['end_time'], old_rds['job_assessment_value'])
 
+    # rds与tboard的关联关系改变 eg：rds -->tboard1  change to  rds -->tboard2
+    # tboard1减去该rds修改前的贡献，tboard2加上该rds修改后的贡献
+    if instance.tboard_id != old_rds['tboard_id']:
+        update_tboard_statistics(old_rds['tboard_id'], tuple(-item for item in old_vector))
+        update_tboard_statistics(instance.tboard_id, new_vector)
 
-    # 其它情况不进行操作
+    # end_time/job_assessment_value 改变，只更新差值；其它情况不进行操作
     else:
-        _update_tboard_success_ratio(instance)
+        update_tboard_statistics(
+            instance.tboard_id,
+            tuple(new - old for new, old in zip(new_vector, old_vector))
+        )
 
 
 @receiver(pre_delete, sender="apiv1.Rds", dispatch_uid='rds_delete')
 def rds_deleted_handler(sender, instance=None, **kwargs):
     # rds删除
-    _update_tboard_success_ratio(instance, flag='deleted')
+    old_vector = rds_statistics_vector(instance.end_time, instance.job_assessment_value)
+    update_tboard_statistics(instance.tboard_id, tuple(-item for item in old_vector), create=False)
+    update_rds_daily_statistics(
+        rds_daily_statistics_key(instance.start_time, instance.tboard_id, instance.device_id, instance.job_id),
+        tuple(-item for item in rds_daily_statistics_vector(instance.job_assessment_value)),
+        create=False
+    )
+    remove_job_runtime_stats(
+        instance.job_id,
+        instance.start_time,
+        job_runtime_stats_vector(
+            instance.start_time, instance.end_time, instance.job_assessment_value,
+            rds_created_by_ai_tester(instance.created_by_ai_tester)
+        ),
+        instance.id
+    )
+
+
+@receiver([post_save, post_delete], sender="apiv1.Rds", dispatch_uid='rds_cache_invalidate')
+def rds_cache_invalidate_handler(sender, instance=None, **kwargs):
+    """
+    在数据写入/删除后(autocommit时为立即，事务中为提交后)才更新缓存tag，
+    pre_save/pre_delete中更新会让并发的请求以尚未写入的旧数据按新tag重新写入缓存
+    """
+    old_tboard_id, old_device_id, old_job_id = instance.__dict__.pop('_old_rds_related', (None, None, None))
+    invalidate_cache(
+        'rds',
+        tboard=[instance.tboard_id, old_tboard_id],
+        device=[instance.device_id, old_device_id],
+        job=[instance.job_id, old_job_id]
+    )
+
+
+# 影响TBoard/每日计数、JobRuntimeStats及rds缓存的栏位
+RDS_STATISTICS_FIELDS = {'start_time', 'end_time', 'job_assessment_value', 'tboard', 'device', 'job'}
+
+
+@receiver(post_update, dispatch_uid='rds_post_update')
+def rds_post_update_handler(sender, queryset=None, fields=None, **kwargs):
+    """
+    QuerySet.update 直接作用于数据库，无法得知修改前的值，
+    对涉及的TBoard重新统计计数；只更新了无关栏位(如耗电量)时不重算
+    """
+    if sender is not apps.get_model("apiv1", "Rds") or queryset is None:
+        return
+    if fields is not None and not {sender._meta.get_field(field).name for field in fields} & RDS_STATISTICS_FIELDS:
+        return
+    related_ids = list(queryset.values_list('tboard_id', 'device_id', 'job_id').distinct())
+    tboard_ids = {tboard_id for tboard_id, _, _ in related_ids}
+    rebuild_tboard_statistics(tboard_ids)
+    rebuild_rds_daily_statistics(tboard_ids)
+    rebuild_job_runtime_stats({job_id for _, _, job_id in related_ids})
+    invalidate_cache(
+        'rds',
+        tboard=tboard_ids,
+        device={device_id for _, device_id, _ in related_ids},
+        job={job_id for _, _, job_id in related_ids}
+    )
+
+
+@receiver(pre_save, sender="apiv1.RdsLog", dispatch_uid='rds_log_pre_save')
+def rds_log_pre_save_handler(sender, instance=None, **kwargs):
+    # 记录修改前的文件，文件未改变时不需要重建索引
+    if instance.id is not None:
+        instance._old_rds_log_file = sender.objects.filter(id=instance.id).values_list('log_file', 'file_name').first()
+
+
+@receiver(post_save, sender="apiv1.RdsLog", dispatch_uid='rds_log_post_save')
+def rds_log_post_save_handler(sender, instance=None, created=False, **kwargs):
+    # 建立ES索引交由celery执行，不阻塞上传请求
+    old_rds_log_file = instance.__dict__.pop('_old_rds_log_file', None)
+    if not created and old_rds_log_file == (instance.log_file.name, instance.file_name):
+        return
+    on_commit_collect('rds_log_index', instance.id, lambda rds_log_ids: index_rds_logs_task.delay(list(rds_log_ids)))
+
 
+@receiver(post_delete, sender="apiv1.RdsLog", dispatch_uid='rds_log_post_delete')
+def rds_log_post_delete_handler(sender, instance=None, **kwargs):
+    # 删除Rds/TBoard时会逐条删除RdsLog，同一事务中删除的文档提交后一次删除
+    on_commit_collect(
+        'rds_log_delete', instance.id, lambda rds_log_ids: delete_rds_log_documents_task.delay(list(rds_log_ids))
+    )
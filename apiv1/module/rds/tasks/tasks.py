@@ -0,0 +1,82 @@
+from celery import shared_task
+from elasticsearch.exceptions import ConnectionError as ESConnectionError
+
+from apiv1.core.constants import RDS_SCREENSHOT_THUMB_BATCH_SIZE, RDS_SCREENSHOT_THUMB_PENDING, \
+    RDS_SCREENSHOT_THUMB_READY, RDS_SCREENSHOT_THUMB_FAILED, RDS_LOG_ES_BACKFILL_BATCH_SIZE, \
+    RDS_LOG_ES_BACKFILL_BATCHES_PER_TASK
+from reef.celery import register_task_logger
+
+
+def enqueue_rds_screenshot_thumbs(screenshot_ids):
+    """
+    将需要产生缩略图的RdsScreenShot按RDS_SCREENSHOT_THUMB_BATCH_SIZE分批提交，
+    多个批次可由不同的worker并行处理
+    """
+    for index in range(0, len(screenshot_ids), RDS_SCREENSHOT_THUMB_BATCH_SIZE):
+        make_rds_screenshot_thumbs.delay(screenshot_ids[index:index + RDS_SCREENSHOT_THUMB_BATCH_SIZE])
+
+
+@register_task_logger(__name__)
+@shared_task(bind=True, ignore_result=True)
+def make_rds_screenshot_thumbs(self, screenshot_ids):
+    """
+    产生RdsScreenShot的缩略图，并更新thumbs_status
+    """
+    from apiv1.module.rds.models import RdsScreenShot
+
+    screenshots = RdsScreenShot.objects.filter(id__in=screenshot_ids, thumbs_status=RDS_SCREENSHOT_THUMB_PENDING)
+    for screenshot in screenshots:
+        try:
+            thumbs_file = screenshot.create_thumb_file()
+        except Exception as e:
+            self.log.error(f'Image make thumb error:\n rds id: {screenshot.rds_id}\n msg:{e}')
+            RdsScreenShot.objects.filter(id=screenshot.id).update(thumbs_status=RDS_SCREENSHOT_THUMB_FAILED)
+            continue
+        RdsScreenShot.objects.filter(id=screenshot.id).update(
+            thumbs_file=thumbs_file, thumbs_status=RDS_SCREENSHOT_THUMB_READY
+        )
+
+
+@register_task_logger(__name__)
+@shared_task(bind=True, ignore_result=True, autoretry_for=(ESConnectionError,), retry_backoff=True, max_retries=5)
+def index_rds_logs_task(self, rds_log_ids):
+    """
+    为新上传的RdsLog建立ES索引
+    """
+    from apiv1.module.rds.business import index_rds_logs
+    from apiv1.module.rds.models import RdsLog
+
+    _, errors = index_rds_logs(RdsLog.objects.filter(id__in=rds_log_ids).select_related('rds'))
+    for error in errors:
+        self.log.error(f'Index rds log error: {error}')
+
+
+@register_task_logger(__name__)
+@shared_task(bind=True, ignore_result=True, autoretry_for=(ESConnectionError,), retry_backoff=True, max_retries=5)
+def delete_rds_log_documents_task(self, rds_log_ids):
+    """
+    从ES删除已删除的RdsLog的文档
+    """
+    from apiv1.module.rds.business import delete_rds_log_documents
+
+    _, errors = delete_rds_log_documents(rds_log_ids)
+    for error in errors:
+        self.log.error(f'Delete rds log document error: {error}')
+
+
+@register_task_logger(__name__)
+@shared_task(bind=True, ignore_result=True, autoretry_for=(ESConnectionError,), retry_backoff=True, max_retries=5)
+def backfill_rds_log_index_task(self, batch_size=RDS_LOG_ES_BACKFILL_BATCH_SIZE,
+                                max_batches=RDS_LOG_ES_BACKFILL_BATCHES_PER_TASK):
+    """
+    从checkpoint继续补建RdsLog索引，每个任务处理max_batches批，未完成时提交下一个任务接续，
+    避免单个任务超过CELERY_TASK_TIME_LIMIT；ES连接失败时重试，checkpoint停留在上一批
+    """
+    from apiv1.module.rds.business import backfill_rds_log_index, get_rds_log_index_checkpoint
+
+    finished, errors = backfill_rds_log_index(batch_size, max_batches)
+    for error in errors:
+        self.log.error(f'Index rds log error: {error}')
+    self.log.info(f'Backfill rds log index checkpoint: {get_rds_log_index_checkpoint()}, finished: {finished}')
+    if not finished:
+        backfill_rds_log_index_task.delay(batch_size, max_batches)
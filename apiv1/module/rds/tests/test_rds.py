@@ -1,3 +1,5 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.reverse import reverse
@@ -61,6 +63,30 @@ class TestRds(APITestCase):
         response = self.client.get(f"{reverse('rds_list')}?fields=id,start_time,end_time,job_assessment_value")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    @tccounter('rds_list', 'get', ENABLE_TCCOUNTER)
+    def test_list_query_count_not_grow_with_page_size(self):
+        """
+        关联字段以select_related/prefetch_related取得，查询数量不随回传数量增加
+        """
+        Rds.objects.bulk_create([
+            Rds(
+                job=self.default_data['job'],
+                device=self.default_data['device'],
+                tboard=self.default_data['tboard'],
+                start_time=timezone.now()
+            ) for _ in range(20)
+        ])
+        fields = 'id,job.job_label,device.device_label,device.phone_model.phone_model_name,tboard.board_name'
+
+        def count_queries(limit):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f"{reverse('rds_list')}?fields={fields}&limit={limit}")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['rdss']), limit)
+            return len(queries.captured_queries)
+
+        self.assertEqual(count_queries(1), count_queries(20))
+
     @tccounter('rds_list', 'get', ENABLE_TCCOUNTER)
     def test_tboard_id_filter(self):
         """
@@ -0,0 +1,56 @@
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apiv1.core.test import TestTool, tccounter
+from apiv1.module.rds.models import Rds
+from apiv1.module.tboard.models import TBoardStatistics
+from reef.settings import ENABLE_TCCOUNTER
+
+
+class TestRdsBulkCreate(APITestCase):
+    def setUp(self):
+        self.default_data = TestTool.load_default_data('1')
+
+    def get_rds_data(self, start_time, job_assessment_value='0'):
+        return {
+            'device': self.default_data['device'].device_label,
+            'job': self.default_data['job'].job_label,
+            'start_time': start_time,
+            'end_time': '2018_03_11_10_22_31',
+            'job_assessment_value': job_assessment_value,
+            'tboard': self.default_data['tboard'].id
+        }
+
+    @tccounter('rds_bulk_create', 'post', ENABLE_TCCOUNTER)
+    def test_rds_bulk_create(self):
+        response = self.client.post(reverse('rds_bulk_create'), data=[
+            self.get_rds_data('2018_03_10_22_33_11', '0'),
+            self.get_rds_data('2018_03_10_22_33_12', '1'),
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['created_num'], 2)
+        self.assertEqual(len(response.data['ids']), 2)
+        rds = Rds.objects.get(id=response.data['ids'][0])
+        self.assertEqual(rds.created_by_sys_job, 'False')
+        statistics = TBoardStatistics.objects.get(tboard=self.default_data['tboard'])
+        self.assertEqual((statistics.total, statistics.success, statistics.fail), (3, 1, 1))
+
+    @tccounter('rds_bulk_create', 'post', ENABLE_TCCOUNTER)
+    def test_rds_bulk_create_idempotent(self):
+        data = [self.get_rds_data('2018_03_10_22_33_11')]
+        first_response = self.client.post(reverse('rds_bulk_create'), data=data, format='json')
+        second_response = self.client.post(reverse('rds_bulk_create'), data=data * 2, format='json')
+        self.assertEqual(second_response.data['created_num'], 0)
+        self.assertEqual(second_response.data['exist_num'], 1)
+        self.assertEqual(second_response.data['ids'], first_response.data['ids'] * 2)
+        statistics = TBoardStatistics.objects.get(tboard=self.default_data['tboard'])
+        self.assertEqual(statistics.total, 2)
+
+    @tccounter('rds_bulk_create', 'post', ENABLE_TCCOUNTER)
+    def test_rds_bulk_create_invalid_device(self):
+        rds_data = self.get_rds_data('2018_03_10_22_33_11')
+        rds_data['device'] = 'not_exist_device'
+        response = self.client.post(reverse('rds_bulk_create'), data=[rds_data], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Rds.objects.filter(start_time__year=2018).exists())
@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from elasticsearch.serializer import JSONSerializer
+from rest_framework.test import APITestCase
+
+from apiv1.core.constants import REDIS_RDS_LOG_ES_CHECKPOINT
+from apiv1.core.test import TestTool
+from apiv1.module.rds.business import read_rds_log_content, index_rds_logs, backfill_rds_log_index, \
+    get_rds_log_index_checkpoint, set_rds_log_index_checkpoint, delete_rds_log_documents
+from apiv1.module.rds.models import RdsLog
+from reef.settings import redis_pool_connect
+
+
+class InMemoryElasticsearch:
+    """
+    只实现streaming_bulk需要的接口，将文档存放在内存中，代替ES进行测试
+    """
+
+    def __init__(self):
+        self.transport = SimpleNamespace(serializer=JSONSerializer())
+        self.documents = {}
+        self.indexed_ids = []
+
+    def bulk(self, body, **kwargs):
+        lines = iter(body.splitlines())
+        items = []
+        for action_line in lines:
+            op_type, meta = json.loads(action_line).popitem()
+            status_code = 201
+            if op_type == 'delete':
+                status_code = 200 if self.documents.pop(meta['_id'], None) is not None else 404
+            else:
+                self.documents[meta['_id']] = json.loads(next(lines))
+                self.indexed_ids.append(meta['_id'])
+            items.append({op_type: {'_index': meta['_index'], '_id': meta['_id'], 'status': status_code}})
+        return {'errors': any(next(iter(item.values()))['status'] >= 300 for item in items), 'items': items}
+
+
+class TestReadRdsLogContent(APITestCase):
+    def setUp(self):
+        self.file = tempfile.NamedTemporaryFile(delete=False)
+        self.file.write('日志abc'.encode())
+        self.file.close()
+
+    def tearDown(self):
+        os.remove(self.file.name)
+
+    def test_read_whole_file(self):
+        self.assertEqual(read_rds_log_content(self.file.name, chunk_size=4), '日志abc')
+
+    def test_truncate_large_file(self):
+        # '日志'各占3字节，截断在第二个字的中间时舍弃不完整的字符
+        self.assertEqual(read_rds_log_content(self.file.name, max_size=5, chunk_size=2), '日')
+
+    def test_missing_file(self):
+        self.assertEqual(read_rds_log_content(f'{self.file.name}.missing'), '')
+
+
+class TestRdsLogEsIndex(APITestCase):
+    def setUp(self):
+        # 上传的日志写入临时的MEDIA_ROOT，测试结束后删除
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.default_data = TestTool.load_default_data()
+        self.rds_logs = [
+            RdsLog.objects.create(rds=self.default_data['rds'], file_name=f'log_{index}.log',
+                                  log_file=SimpleUploadedFile(f'log_{index}.log', f'content {index}'.encode()))
+            for index in range(3)
+        ]
+        self.client_stand_in = InMemoryElasticsearch()
+        set_rds_log_index_checkpoint(0)
+
+    def tearDown(self):
+        redis_pool_connect.delete(REDIS_RDS_LOG_ES_CHECKPOINT)
+
+    def test_index_rds_logs(self):
+        success, errors = index_rds_logs(RdsLog.objects.select_related('rds'), self.client_stand_in)
+        self.assertEqual((success, errors), (3, []))
+        document = self.client_stand_in.documents[self.rds_logs[0].id]
+        self.assertEqual(document['file_content'], 'content 0')
+        self.assertEqual(document['rds']['job_id'], self.default_data['job'].id)
+
+    def test_backfill_resume_from_checkpoint(self):
+        finished, _ = backfill_rds_log_index(batch_size=2, max_batches=1, client=self.client_stand_in)
+        self.assertFalse(finished)
+        self.assertEqual(get_rds_log_index_checkpoint(), self.rds_logs[1].id)
+
+        # 从checkpoint继续，已完成的RdsLog不再重复送出
+        finished, _ = backfill_rds_log_index(batch_size=2, client=self.client_stand_in)
+        self.assertTrue(finished)
+        self.assertEqual(self.client_stand_in.indexed_ids, [rds_log.id for rds_log in self.rds_logs])
+        self.assertEqual(get_rds_log_index_checkpoint(), self.rds_logs[-1].id)
+
+    def test_delete_rds_log_documents(self):
+        index_rds_logs(self.rds_logs, self.client_stand_in)
+        # 已不存在的文档视为删除成功
+        success, errors = delete_rds_log_documents([self.rds_logs[0].id, 0], self.client_stand_in)
+        self.assertEqual((success, errors), (2, []))
+        self.assertEqual(set(self.client_stand_in.documents), {rds_log.id for rds_log in self.rds_logs[1:]})
+
+    def test_update_without_file_change(self):
+        with TestTool.capture_on_commit_callbacks(execute=False) as callbacks:
+            self.rds_logs[0].save()
+        index_callbacks = [
+            callback for callback in callbacks if getattr(callback, 'collect_key', None) == 'rds_log_index'
+        ]
+        self.assertFalse(index_callbacks)
+
+    def test_delete_rds_queue_document_delete(self):
+        # 删除Rds时逐条删除的RdsLog，提交后一次删除文档
+        with TestTool.capture_on_commit_callbacks(execute=False) as callbacks:
+            self.default_data['rds'].delete()
+        delete_callback, = [
+            callback for callback in callbacks if getattr(callback, 'collect_key', None) == 'rds_log_delete'
+        ]
+        self.assertEqual(delete_callback.items, {rds_log.id for rds_log in self.rds_logs})
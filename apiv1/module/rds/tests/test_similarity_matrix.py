@@ -0,0 +1,49 @@
+import math
+from datetime import timedelta
+
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apiv1.core.test import TestTool, tccounter
+from apiv1.core.utils import SimilarityMatrixMonitor
+from apiv1.module.job.models import Job
+from apiv1.module.rds.models import Rds
+from reef.settings import ENABLE_TCCOUNTER
+
+
+class TestSimilarityMatrix(APITestCase):
+    def setUp(self):
+        self.default_data = TestTool.load_default_data()
+        self.device = self.default_data['device']
+        self.job = Job.objects.create(job_label='similarity_job', job_name='similarity_job', job_type='Joblib',
+                                      description='similarity_job', author=self.default_data['user'])
+        self.job.test_area.add(self.default_data['job_test_area'])
+        now = timezone.now().replace(microsecond=0)
+        for days in (2, 1):
+            Rds.objects.create(job=self.job, device=self.device, tboard=self.default_data['tboard'],
+                               start_time=now - timedelta(days=days),
+                               end_time=now - timedelta(days=days) + timedelta(hours=1))
+
+    @tccounter("get_similarity_matrix", "get", ENABLE_TCCOUNTER)
+    def test_similarity_matrix(self):
+        response = self.client.get(reverse('get_similarity_matrix'), {'tboard_id': self.default_data['tboard'].id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        device_index = response.data['device_label_list'].index(self.device.device_label)
+        job_index = response.data['job_label_list'].index(self.job.job_label)
+        # 最近一次使用的权重为1，前一天的rds按job使用期间衰减
+        self.assertAlmostEqual(response.data['matrix_data'][device_index][job_index],
+                               1 + math.exp(-4 * 86400 / 86401))
+
+    def test_form_job_feature_matrix(self):
+        similarity_matrix = SimilarityMatrixMonitor()
+        similarity_matrix.job_queryset = Job.objects.filter(id__in=[self.job.id, self.default_data['job'].id])
+        job_feature_df, job_label_list = similarity_matrix.form_job_feature_matrix()
+        self.assertEqual(job_feature_df.loc[self.job.job_label, 'author'], self.default_data['user'].username)
+        self.assertEqual(job_feature_df.loc[self.job.job_label, 'test_area'],
+                         [self.default_data['job_test_area'].description])
+
+        similarity_matrix.deal_with_multi_item(job_feature_df.loc[:, 'test_area'].values, job_label_list)
+        column = f"have_{self.default_data['job_test_area'].description}"
+        self.assertEqual(similarity_matrix.job_feature_df.loc[self.job.job_label, column], 1)
@@ -9,7 +9,9 @@ from rest_framework.test import APITestCase
 from apiv1.core.test import TestTool, tccounter
 from apiv1.module.device.models import Device
 from apiv1.module.job.models import Job
-from apiv1.module.rds.models import Rds
+from apiv1.core.constants import RDS_SCREENSHOT_THUMB_PENDING, RDS_SCREENSHOT_THUMB_READY
+from apiv1.module.rds.models import Rds, RdsScreenShot
+from apiv1.module.rds.tasks.tasks import make_rds_screenshot_thumbs
 from reef.settings import ENABLE_TCCOUNTER
 
 
@@ -48,6 +50,27 @@ class TestUploadRdsScreenShot(APITestCase):
         })
         self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
 
+    @tccounter('upload_rds_screen_shot', 'post', ENABLE_TCCOUNTER)
+    def test_thumb_generated_in_background(self):
+        """
+        上传时不产生缩略图，由celery任务产生后更新thumbs_status
+        """
+        response = self.upload_rds_screenshot({
+            'device': 'device0',
+            'job': 'job0',
+            'start_time': '2018_12_12_20_21_21',
+            'file_name': 'file_name_bla'
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        screenshot = RdsScreenShot.objects.get(file_name='file_name_bla')
+        self.assertEqual(screenshot.thumbs_status, RDS_SCREENSHOT_THUMB_PENDING)
+        self.assertFalse(screenshot.thumbs_file)
+
+        make_rds_screenshot_thumbs([screenshot.id])
+        screenshot.refresh_from_db()
+        self.assertEqual(screenshot.thumbs_status, RDS_SCREENSHOT_THUMB_READY)
+        self.assertTrue(screenshot.thumbs_file.name.endswith(f'thumb_{screenshot.img_file.name.split("/")[-1]}'))
+
     @tccounter('upload_rds_screen_shot', 'post', ENABLE_TCCOUNTER)
     def test_file_name_required(self):
         """
@@ -4,7 +4,7 @@ from apiv1.core import routers
 from apiv1.module.rds.view import RdsCreateOrUpdateView, UploadRdsLogView, UploadRdsScreenShotView, GetRdsRapidView, \
     GetRdsGroupByPhoneModelNameView, GetRdsGroupByDeviceLabelView, GetRdsView, FilterRdsValidityView, \
     GetRdsStatisticsData, GetSimilarityMatrix, GetJobFeatureMatrix, SortRdsScreenShotView, FilterInvalidRdsView, \
-    RdsScreenShotFileMultiUploadView, UploadCoolPadPowerLastView
+    RdsScreenShotFileMultiUploadView, UploadCoolPadPowerLastView, RdsBulkCreateView
 from apiv1.module.rds.viewset import DynamicRdsViewSet, DynamicRdsLogViewSet, DynamicRdsScreenShotViewSet
 
 router = routers.ReefDefaultRouter()
@@ -29,6 +29,10 @@ urlpatterns = [
          RdsCreateOrUpdateView.as_view(),
          name='rds_create_or_update'
          ),
+    path('coral/rds_bulk_create/',
+         RdsBulkCreateView.as_view(),
+         name='rds_bulk_create'
+         ),
     path('coral/upload_rds_log_file/',
          UploadRdsLogView.as_view(),
          name='upload_rds_log_file'
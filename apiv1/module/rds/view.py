@@ -14,8 +14,9 @@ from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from apiv1.core.cache import cache_dcr
-from apiv1.core.constants import REDIS_CACHE_GET_RDS_RAPID, REDIS_COOLPAD_POWER_LAST_TIME
+from apiv1.core.cache import cache_dcr, cache_tag
+from apiv1.core.constants import REDIS_CACHE_GET_RDS_RAPID, REDIS_COOLPAD_POWER_LAST_TIME, \
+    REDIS_CACHE_GET_SIMILARITY_MATRIX
 from apiv1.core.response import ReefResponse, reef_400_response
 from apiv1.core.utils import SimilarityMatrixMonitor
 from apiv1.core.view.generic import AutoExecuteSerializerGenericAPIView
@@ -24,7 +25,8 @@ from apiv1.module.job.models import Job
 from apiv1.module.rds.models import Rds, RdsLog, RdsScreenShot
 from apiv1.module.rds.serializer import RdsCreateOrUpdateSerializer, UploadRdsLogSerializer, UploadScreenShotSerializer, \
     RdsSerializer, GetRdsStatisticsDataSerializer, SortRdsScreenShotSerializer, RdsScreenShotSerializer, \
-    FilterInvalidRdsSerializer, RdsScreenShotFileMultiUploadSerializer, UploadCoolPadPowerLastSerializer
+    FilterInvalidRdsSerializer, RdsScreenShotFileMultiUploadSerializer, UploadCoolPadPowerLastSerializer, \
+    RdsBulkCreateSerializer
 from reef.settings import redis_pool_connect
 
 
@@ -436,6 +438,24 @@ class GetRdsGroupByPhoneModelNameView(generics.GenericAPIView):
         return Response(return_data, status=status.HTTP_200_OK)
 
 
+def rds_rapid_cache_tags(request):
+    """
+    GetRdsRapidView缓存的tag，依赖筛选条件中的tboard或device/job，没有这些条件时依赖全部rds
+    装置名称等关联信息的变更不在tag中，由缓存ttl限定
+    """
+    query_params = request.query_params
+    tboard_id = query_params.get('tboard__id', None)
+    if tboard_id is not None:
+        return [cache_tag('rds', tboard=tboard_id)]
+
+    validate_pattern = re.compile(r'^ReefList\[.*\]$')
+    for param_name, field in (('device__id__in', 'device'), ('job__id__in', 'job')):
+        items_str = query_params.get(param_name, None)
+        if items_str is not None and re.match(validate_pattern, items_str):
+            return [cache_tag('rds', **{field: item}) for item in items_str[9:-1].split('{%,%}')]
+    return [cache_tag('rds')]
+
+
 class GetRdsRapidView(generics.GenericAPIView):
     """
     取得Rds信息
@@ -443,7 +463,7 @@ class GetRdsRapidView(generics.GenericAPIView):
 
     @swagger_auto_schema(manual_parameters=_swagger_extra_param(), )
     @action(detail=True, methods=['get'])
-    @cache_dcr(key_leading=REDIS_CACHE_GET_RDS_RAPID, ttl_in_second=3)
+    @cache_dcr(key_leading=REDIS_CACHE_GET_RDS_RAPID, ttl_in_second=600, tags=rds_rapid_cache_tags)
     def get(self, request):
         """
         To resolve performance issue, customize rds list api to improve that
@@ -594,6 +614,20 @@ class RdsCreateOrUpdateView(generics.GenericAPIView):
         return Response({'id': rds.id}, status=status.HTTP_200_OK)
 
 
+class RdsBulkCreateView(generics.GenericAPIView):
+    """
+    Coral批量创建Rds所使用的接口，用于网络恢复后补传积压的Rds
+    已存在的Rds(device, job, start_time相同)会被跳过，可安全重复提交
+    """
+    serializer_class = RdsBulkCreateSerializer
+
+    def post(self, request):
+        serializer = RdsBulkCreateSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+        return Response(result, status=status.HTTP_200_OK)
+
+
 class UploadRdsLogView(generics.GenericAPIView):
     """
     RdsLog 上传接口
@@ -670,18 +704,38 @@ class GetRdsStatisticsData(generics.GenericAPIView):
         return Response(response_data, status=status.HTTP_200_OK)
 
 
+def similarity_matrix_cache_tags(request):
+    """
+    指定tboard_id时只依赖该TBoard的rds，否则依赖全部rds
+    统计范围随时间移动，由缓存ttl限定
+    """
+    tboard_id = request.query_params.get('tboard_id', None)
+    if tboard_id:
+        return [cache_tag('rds', tboard=tboard_id)]
+    return [cache_tag('rds')]
+
+
 class GetSimilarityMatrix(views.APIView):
 
+    @cache_dcr(key_leading=REDIS_CACHE_GET_SIMILARITY_MATRIX, ttl_in_second=600, tags=similarity_matrix_cache_tags)
     def get(self, request):
+        """
+        tboard_id(可选): 只统计该TBoard的rds
+        """
         similarity_matrix = SimilarityMatrixMonitor()
         similarity_matrix.device_queryset = Device.objects.all()
         similarity_matrix.job_queryset = Job.objects.filter(job_deleted=False, job_type='Joblib').order_by('id')
         similarity_matrix.rds_queryset = Rds.objects.filter(start_time__gt=timezone.now() - datetime.timedelta(days=5),
                                                             end_time__lt=timezone.now(),
                                                             created_by_ai_tester=False).exclude(job__job_deleted=True)
+        tboard_id = request.query_params.get('tboard_id', None)
+        if tboard_id:
+            if not tboard_id.isdigit():
+                return reef_400_response(message='tboard_id invalid')
+            similarity_matrix.rds_queryset = similarity_matrix.rds_queryset.filter(tboard_id=tboard_id)
         similarity_matrix_data, device_label_list, job_label_list = similarity_matrix.calculate_matrix(similarity_matrix.rds_queryset)
         results = {
-            'matrix_data': similarity_matrix_data,
+            'matrix_data': similarity_matrix_data.tolist(),
             'device_label_list': device_label_list,
             'job_label_list': job_label_list
         }
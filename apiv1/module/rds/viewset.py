@@ -68,7 +68,9 @@ class DynamicRdsScreenShotViewSet(GenericViewSet):
         rds_screen_shot_queryset = RdsScreenShot.objects.filter(id__in=ids)
         for rds_screen_shot in rds_screen_shot_queryset:
             os.remove(rds_screen_shot.img_file.path)
-            os.remove(rds_screen_shot.thumbs_file.path)
+            # 缩略图可能尚未产生
+            if rds_screen_shot.thumbs_file:
+                os.remove(rds_screen_shot.thumbs_file.path)
             rds_screen_shot.delete()
 
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -7,7 +7,6 @@ from datetime import datetime
 from itertools import chain
 from collections import Counter
 
-import requests
 from django.apps import apps
 from django.core.files.uploadhandler import TemporaryFileUploadHandler
 from django.utils import timezone
@@ -24,9 +23,9 @@ from apiv1.module.resource.serializer import BindAccountSourceSerializer, Unbind
     BlockUnbindResourceSerializer, ResourceExportSerializer, SimCardExportSerializer, AccountExportSerializer, \
     ResourceImportSerializer, TGuardSerializer
 from apiv1.core.constants import DEVICE_STATUS_BUSY, DEVICE_STATUS_IDLE
+from apiv1.core.request import coral_fan_out, coral_request
 from apiv1.core.response import ReefResponse, reef_400_response, reef_500_response
 from apiv1.module.system.models import Cabinet
-from reef import settings
 from reef.settings import RESOURCE_EXCEL_FILE_EXPORT_PATH, SIM_CARD_EXPORT_TABLE_HEAD, ACCOUNT_EXPORT_TABLE_HEAD, \
     MEDIA_URL, RESOURCE_EXCEL_FILE_EXPORT
 
@@ -378,24 +377,16 @@ def get_t_guard_data():
 
 
 def broadcast_coral(r_method, r_body):
+    if r_method not in ('post', 'delete'):
+        return reef_500_response()
     ip_list = Cabinet.objects.filter(is_delete=False).values_list('ip_address', flat=True)
-    broadcast_fail_list = []
-    for ip in ip_list:
-        try:
-            if r_method == 'post':
-                method = getattr(requests, 'post')
-            elif r_method == 'delete':
-                method = getattr(requests, 'delete')
-            else:
-                return reef_500_response()
-            response = method(
-                url=f"http://{ip}:{settings.CORAL_PORT}/eblock/bounced_words",
-                json=r_body,
-                timeout=1
-            )
-        except Exception as e:
-            # HTTPError 不影响后续coral的通知
-            broadcast_fail_list.append(ip)
+    results = coral_fan_out(
+        lambda ip: coral_request(ip, r_method, '/eblock/bounced_words', json=r_body, timeout=1),
+        ip_list,
+        deadline=3
+    )
+    # HTTPError 不影响后续coral的通知
+    broadcast_fail_list = [ip for ip, result in results.items() if isinstance(result, Exception)]
     return broadcast_fail_list
 
 
@@ -4,12 +4,11 @@ from asgiref.sync import async_to_sync
 from channels.generic.websocket import WebsocketConsumer
 from channels.layers import get_channel_layer
 
-from apiv1.core.constants import LOG_DELETE_GROUP, REDIS_LOG_DELETE
+from apiv1.core.constants import LOG_DELETE_GROUP
 from apiv1.core.utils import ReefLogger
 from apiv1.core.view.server_test import ServerTestView
-from apiv1.module.tboard.tasks.tasks import get_hash_data_in_redis, sorted_data, STATE_MAPPING
+from apiv1.module.system.tasks.tasks import log_delete_index
 from reef import celery_app
-from reef.settings import redis_pool_connect
 
 
 class LogDeleteConsumer(WebsocketConsumer):
@@ -32,24 +31,16 @@ class LogDeleteConsumer(WebsocketConsumer):
             })
             return
 
-        # 建立连接后，查询有没有正在删除的任务
+        # 建立连接后，查询有没有正在删除的任务，只向该连接发送
         try:
-            tboard_deleting_message = get_hash_data_in_redis(f'{REDIS_LOG_DELETE}:*')
             send_message = {"status": "SUCCESS"}
+            # 获取最近的一条 异步删除log数据
+            tboard_deleting_message = log_delete_index.all(count=1)
             if tboard_deleting_message:
-                # 获取最近的一条 异步删除log数据
-                message = sorted_data(
-                    tboard_deleting_message,
-                    lambda e: e.__getitem__('task_time')
-                )
-                first_res = message[0]
-                task_id = first_res.get('task_id')
+                task_id = tboard_deleting_message[0].get('task_id')
                 res = celery_app.AsyncResult(task_id)
                 send_message = {"status": res.state, "task_id": task_id}
-            async_to_sync(channel_layer.group_send)(LOG_DELETE_GROUP, {
-                "type": "send_message",
-                "message": send_message
-            })
+            self.send_message({"message": send_message})
         except Exception as e:
             # print(f"websocekt connect fail:{e}")
             reef_logger = ReefLogger('file')
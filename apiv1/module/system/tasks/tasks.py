@@ -6,13 +6,17 @@ from asgiref.sync import async_to_sync
 from celery import shared_task, Task
 from celery.utils.log import get_task_logger
 
+from apiv1.core.cache import refresh_cache
 from apiv1.core.constants import REDIS_LOG_DELETE, LOG_DELETE_GROUP
+from apiv1.core.redis_index import RedisHashIndex
 from apiv1.core.utils import ReefLogger
 from apiv1.module.tboard.tasks.tasks import channel_layer
 from reef.celery import register_task_logger, celery_app
-from reef.settings import MEDIA_ROOT, redis_pool_connect
+from reef.settings import MEDIA_ROOT
 
 logger = get_task_logger(__name__)
+# 异步清理log的任务
+log_delete_index = RedisHashIndex(REDIS_LOG_DELETE)
 
 
 class DeleteLogBaseTask(Task):
@@ -32,7 +36,7 @@ class DeleteLogBaseTask(Task):
                 f'error info: {e}'
             )
 
-        redis_pool_connect.delete(f"{REDIS_LOG_DELETE}:{task_id}")
+        log_delete_index.delete(task_id)
 
 
 @register_task_logger(__name__)
@@ -67,6 +71,19 @@ def send_message(self, ret):
     })
 
 
+@register_task_logger(__name__)
+@shared_task(bind=True, ignore_result=True)
+def refresh_view_cache(self, refresh_func_path, query_params, cache_key, tag_keys, ttl_in_second,
+                       stale_while_revalidate, lock_token):
+    """
+    cache_dcr stale-while-revalidate: 在后台以接口的数据函数重新计算，写入缓存并释放锁
+    refresh_func_path: 数据函数的完整路径  query_params: 请求的query params
+    """
+    refresh_cache(refresh_func_path, query_params, cache_key, tag_keys, ttl_in_second, stale_while_revalidate,
+                  lock_token)
+    self.log.info(f'refresh cache {cache_key}')
+
+
 def clean_log(start_date, days, log_path):
     ret = []
     if not log_path.exists():
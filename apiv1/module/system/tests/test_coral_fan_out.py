@@ -0,0 +1,40 @@
+import time
+
+from django.test import SimpleTestCase
+
+from apiv1.core.constants import CORAL_FAN_OUT_MAX_WORKERS
+from apiv1.core.request import coral_fan_out, CoralTimeout
+
+
+class TestCoralFanOut(SimpleTestCase):
+
+    def test_concurrent_with_deadline(self):
+        """
+        各coral并发执行，整体耗时不超过deadline，超时及出错的coral回传对应的异常
+        """
+        def notify(ip):
+            if ip == 'error':
+                raise OSError('connection refused')
+            time.sleep(2 if ip == 'slow' else 0.1)
+            return ip
+
+        start = time.monotonic()
+        results = coral_fan_out(notify, ['a', 'b', 'c', 'error', 'slow'], deadline=0.5)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual({ip: results[ip] for ip in 'abc'}, {'a': 'a', 'b': 'b', 'c': 'c'})
+        self.assertIsInstance(results['error'], OSError)
+        self.assertIsInstance(results['slow'], CoralTimeout)
+
+    def test_queued_count_as_timeout(self):
+        """
+        线程池被占满时，deadline自调用起计算，排队未开始的请求同样记为超时
+        """
+        def notify(ip):
+            time.sleep(0.3)
+            return ip
+
+        ips = [str(index) for index in range(CORAL_FAN_OUT_MAX_WORKERS * 2)]
+        start = time.monotonic()
+        results = coral_fan_out(notify, ips, deadline=0.2)
+        self.assertLess(time.monotonic() - start, 0.3)
+        self.assertTrue(all(isinstance(result, CoralTimeout) for result in results.values()))
@@ -0,0 +1,102 @@
+import json
+
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apiv1.core.cache import cache_tag, _bump_cache_tags, prepare_cache_key, _acquire_lock, _release_lock, \
+    _read_cache, refresh_cache
+from apiv1.core.constants import REDIS_CACHE_GET_TBOARD_STATISTIC, REDIS_CACHE_GET_DEVICE_POWER_RAPID, REDIS_CACHE_TAG
+from apiv1.core.test import TestTool, tccounter
+from reef.settings import ENABLE_TCCOUNTER, redis_connect
+
+
+class TestGetCacheMetrics(APITestCase):
+    def setUp(self):
+        self.default_data = TestTool.load_default_data()
+        self.tboard_id = self.default_data['tboard'].id
+
+    def get_metrics(self):
+        response = self.client.get(reverse('get_cache_metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def get_tboard_statistic_metrics(self):
+        return self.get_metrics()['cache'].get(
+            REDIS_CACHE_GET_TBOARD_STATISTIC, {'hit': 0, 'miss': 0, 'stale': 0, 'stale_served': 0}
+        )
+
+    def request_tboard_statistics(self):
+        response = self.client.get(reverse('get_tboard_statistics') + f'?tboard_id={self.tboard_id}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @tccounter('get_cache_metrics', 'get', ENABLE_TCCOUNTER)
+    def test_tag_invalidation_count_as_stale(self):
+        """
+        缓存依赖的tag更新后，下一次请求视为失效(stale)并重新写入缓存
+        """
+        # 确保缓存已写入
+        self.request_tboard_statistics()
+        before = self.get_tboard_statistic_metrics()
+
+        self.request_tboard_statistics()
+        _bump_cache_tags('rds', [cache_tag('rds'), cache_tag('rds', tboard=self.tboard_id)])
+        self.request_tboard_statistics()
+
+        after = self.get_tboard_statistic_metrics()
+        self.assertEqual(after['hit'] - before['hit'], 1)
+        self.assertEqual(after['stale'] - before['stale'], 1)
+        self.assertGreaterEqual(self.get_metrics()['invalidation']['rds'], 1)
+
+    @tccounter('get_cache_metrics', 'get', ENABLE_TCCOUNTER)
+    def test_serve_stale_while_locked(self):
+        """
+        其它请求正在重新计算(持有锁)时，直接返回旧缓存
+        """
+        self.request_tboard_statistics()
+        _bump_cache_tags('rds', [cache_tag('rds', tboard=self.tboard_id)])
+        lock_key = prepare_cache_key(REDIS_CACHE_GET_TBOARD_STATISTIC, {'tboard_id': str(self.tboard_id)}) + ':lock'
+        redis_connect.set(lock_key, 1, ex=10)
+        before = self.get_tboard_statistic_metrics()
+        try:
+            self.request_tboard_statistics()
+        finally:
+            redis_connect.delete(lock_key)
+        after = self.get_tboard_statistic_metrics()
+        self.assertEqual(after['stale_served'] - before['stale_served'], 1)
+
+    def test_release_lock_only_by_holder(self):
+        """
+        锁只能由取得锁的token释放
+        """
+        lock_key = prepare_cache_key(REDIS_CACHE_GET_TBOARD_STATISTIC, {'tboard_id': str(self.tboard_id)}) + ':lock'
+        lock_token = _acquire_lock(lock_key, 10)
+        try:
+            self.assertIsNone(_acquire_lock(lock_key, 10))
+            _release_lock(lock_key, 'other_token')
+            self.assertIsNotNone(redis_connect.get(lock_key))
+            _release_lock(lock_key, lock_token)
+            self.assertIsNone(redis_connect.get(lock_key))
+        finally:
+            redis_connect.delete(lock_key)
+
+    def test_refresh_cache(self):
+        """
+        后台以数据函数重新计算缓存，完成后释放锁
+        """
+        query_params = {'device_id': str(self.default_data['device'].id)}
+        response = self.client.get(reverse('get_device_power_rapid'), query_params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        tag = cache_tag('devicepower', device=query_params['device_id'])
+        _bump_cache_tags('devicepower', [tag])
+
+        cache_key = prepare_cache_key(REDIS_CACHE_GET_DEVICE_POWER_RAPID, query_params)
+        tag_keys = [f'{REDIS_CACHE_TAG}:{tag}']
+        self.assertFalse(_read_cache(cache_key, tag_keys)[1])
+        lock_token = _acquire_lock(f'{cache_key}:lock', 10)
+        refresh_cache('apiv1.module.device.view.device_power_rapid_data', query_params, cache_key, tag_keys,
+                      60, 300, lock_token)
+        cached, fresh, _ = _read_cache(cache_key, tag_keys)
+        self.assertTrue(fresh)
+        self.assertEqual(json.loads(cached[0]), response.json())
+        self.assertIsNone(redis_connect.get(f'{cache_key}:lock'))
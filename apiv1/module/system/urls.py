@@ -2,7 +2,7 @@ from django.urls import path, include
 
 from apiv1.core import routers
 from apiv1.module.system.view import CabinetRegistView, GetReefSpaceUsageView, CreateWoodenBoxView, RemoveWoodenBoxView, \
-    GetCabinetTypeInfoView, GetReefVersionView, UpdateCabinetMLocationView, DeleteLogView
+    GetCabinetTypeInfoView, GetReefVersionView, UpdateCabinetMLocationView, DeleteLogView, GetCacheMetricsView
 from apiv1.module.system.viewset import DynamicSystemViewSet, \
     DynamicCabinetViewSet, DynamicWoodenBoxViewSet
 
@@ -47,6 +47,12 @@ urlpatterns = [
         name='get_reef_version'
     ),
 
+    path(
+        'cedar/get_cache_metrics/',
+        GetCacheMetricsView.as_view(),
+        name='get_cache_metrics'
+    ),
+
     path(
         'cedar/update_cabinet_mlocation/',
         UpdateCabinetMLocationView.as_view(),
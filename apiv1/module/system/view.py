@@ -13,7 +13,8 @@ from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from apiv1.core.constants import REDIS_LOG_DELETE, LOG_DELETE_GROUP
+from apiv1.core.cache import get_cache_metrics
+from apiv1.core.constants import LOG_DELETE_GROUP
 from apiv1.core.request import ReefRequest
 from apiv1.core.response import ReefResponse
 from apiv1.core.view.generic import AutoExecuteSerializerGenericAPIView
@@ -24,10 +25,10 @@ from apiv1.module.device.models import PowerPort, TempPort, PowerStrategy
 from apiv1.module.system.serializer import GetReefSpaceUsageSerialzier, CabinetRegistSerializer, \
     CreateWoodenBoxSerializer, \
     WoodenBoxSerializer, GetCabinetTypeInfoSerializer, UpdateCabinetMLocationSerializer, DeleteLogSerializer
-from apiv1.module.system.tasks.tasks import delete_log, send_message
+from apiv1.module.system.tasks.tasks import delete_log, send_message, log_delete_index
 from apiv1.module.tboard.tasks.tasks import channel_layer
 from reef import settings
-from reef.settings import REEF_VERSION, CORAL_PORT, redis_pool_connect
+from reef.settings import REEF_VERSION, CORAL_PORT
 
 logger = logging.getLogger(__name__)
 
@@ -232,6 +233,15 @@ class GetReefVersionView(APIView):
         return ReefResponse(REEF_VERSION)
 
 
+class GetCacheMetricsView(APIView):
+    """
+    取得接口缓存的命中/未命中/失效统计
+    """
+
+    def get(self, request):
+        return ReefResponse(get_cache_metrics())
+
+
 class UpdateCabinetMLocationView(AutoExecuteSerializerGenericAPIView):
 
     queryset = Cabinet.objects.filter(is_delete=False)
@@ -302,11 +312,7 @@ class DeleteLogView(AutoExecuteSerializerGenericAPIView):
 
         task_time = timezone.localtime().strftime('%Y-%m-%d %H:%M:%S')
         # crate task save to redis
-        redis_pool_connect.hmset(
-            f"{REDIS_LOG_DELETE}:{async_res.id}",
-            {"task_time": task_time, "task_id": async_res.id}
-        )
-        redis_pool_connect.expire(f"{REDIS_LOG_DELETE}:{async_res.id}", 82000)
+        log_delete_index.set(async_res.id, {"task_time": task_time, "task_id": async_res.id}, expire=82000)
 
         async_to_sync(channel_layer.group_send)(LOG_DELETE_GROUP, {
             "type": "send_message",
@@ -1,5 +1,21 @@
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+import math
+
+import pandas as pd
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import Avg, Count, Max, Q
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font
 from rest_framework.exceptions import APIException
 
+from apiv1.core.constants import JOB_TYPE_UNIQ, POWER_CONSUMPTION_ERROR_CODE, TEMP_CONSUMPTION_ERROR_CODE
+from apiv1.core.model import Percentile
 from apiv1.module.job.models import Job
 from apiv1.module.tboard.models import TBoardJob, TBoard
 
@@ -23,3 +39,429 @@ def insert_get_battery_job(tboard: TBoard) -> None:
         TBoardJob(tboard=tboard, job=job_get_battery, order=0),
         TBoardJob(tboard=tboard, job=job_get_battery, order=2),
     ])
+
+
+REBUILD_TBOARD_STATISTICS_SQL = """
+INSERT INTO apiv1_tboardstatistics (tboard_id, total, finished, success, fail, na)
+SELECT t.id,
+       COUNT(r.id),
+       COUNT(r.id) FILTER (WHERE r.end_time IS NOT NULL),
+       COUNT(r.id) FILTER (WHERE r.end_time IS NOT NULL AND r.job_assessment_value = '0'),
+       COUNT(r.id) FILTER (WHERE r.end_time IS NOT NULL AND r.job_assessment_value = '1'),
+       COUNT(r.id) FILTER (WHERE r.end_time IS NOT NULL AND r.job_assessment_value NOT IN ('0', '1'))
+FROM apiv1_tboard t
+LEFT JOIN apiv1_rds r ON r.tboard_id = t.id
+{where}
+GROUP BY t.id
+ON CONFLICT (tboard_id) DO UPDATE SET
+    total = EXCLUDED.total,
+    finished = EXCLUDED.finished,
+    success = EXCLUDED.success,
+    fail = EXCLUDED.fail,
+    na = EXCLUDED.na
+"""
+
+
+def rebuild_tboard_statistics(tboard_ids=None) -> None:
+    """
+    根据Rds重新计算TBoardStatistics计数，并同步TBoard.success_ratio
+    tboard_ids为None时重建全部TBoard
+    """
+    where, params = '', []
+    if tboard_ids is not None:
+        tboard_ids = list(tboard_ids)
+        if not tboard_ids:
+            return
+        where, params = 'WHERE t.id = ANY(%s)', [tboard_ids]
+
+    with connection.cursor() as sql:
+        sql.execute(REBUILD_TBOARD_STATISTICS_SQL.format(where=where), params)
+        # 与signal中的计算方式保持一致: 没有已结束的Rds时成功率为0，从未产生过Rds的TBoard维持null
+        sql.execute(
+            "UPDATE apiv1_tboard t SET success_ratio = "
+            "CASE WHEN s.finished = 0 THEN 0 ELSE round(s.success::numeric / s.finished, 3) END "
+            "FROM apiv1_tboardstatistics s WHERE s.tboard_id = t.id AND (s.total > 0 OR t.success_ratio IS NOT NULL)"
+            + (" AND t.id = ANY(%s)" if params else ""),
+            params
+        )
+
+
+REBUILD_RDS_DAILY_STATISTICS_SQL = """
+INSERT INTO apiv1_rdsdailystatistics (day, tboard_id, device_id, job_id, success, fail, na)
+SELECT (r.start_time AT TIME ZONE %s)::date,
+       r.tboard_id,
+       r.device_id,
+       r.job_id,
+       COUNT(*) FILTER (WHERE r.job_assessment_value = '0'),
+       COUNT(*) FILTER (WHERE r.job_assessment_value = '1'),
+       COUNT(*) FILTER (WHERE r.job_assessment_value NOT IN ('0', '1'))
+FROM apiv1_rds r
+{where}
+GROUP BY 1, 2, 3, 4
+"""
+
+
+def rebuild_rds_daily_statistics(tboard_ids=None) -> None:
+    """
+    根据Rds重新计算RdsDailyStatistics每日计数
+    tboard_ids为None时重建全部数据
+    """
+    params = []
+    if tboard_ids is not None:
+        tboard_ids = list(tboard_ids)
+        if not tboard_ids:
+            return
+        params = [tboard_ids]
+
+    with connection.cursor() as sql:
+        sql.execute(
+            "DELETE FROM apiv1_rdsdailystatistics" + (" WHERE tboard_id = ANY(%s)" if params else ""),
+            params
+        )
+        sql.execute(
+            REBUILD_RDS_DAILY_STATISTICS_SQL.format(where="WHERE r.tboard_id = ANY(%s)" if params else ""),
+            [settings.TIME_ZONE, *params]
+        )
+
+
+# 性能报表所需的Rds栏位，rds_dict中的recognize_words以jsonb展开为 (Rds, 识别项, 值) 一行，
+# 不需要将整个rds_dict载入python
+PERF_XLSX_RDS_SQL = """
+SELECT r.id, r.job_id, j.job_name, r.device_id, d.device_name,
+       to_char(r.start_time AT TIME ZONE %s, 'YYYY-MM-DD HH24:MI:SS'),
+       r.job_assessment_value, r.job_duration, w.key, w.value
+FROM apiv1_rds r
+JOIN apiv1_job j ON j.id = r.job_id
+LEFT JOIN apiv1_device d ON d.id = r.device_id
+LEFT JOIN LATERAL (
+    SELECT item.idx AS item_idx, word.idx AS word_idx, kv.key, kv.value
+    FROM jsonb_array_elements(
+             CASE WHEN jsonb_typeof(r.rds_dict) = 'array' THEN r.rds_dict ELSE '[]'::jsonb END
+         ) WITH ORDINALITY AS item(value, idx)
+    CROSS JOIN LATERAL jsonb_array_elements(
+             CASE WHEN jsonb_typeof(item.value -> 'recognize_words') = 'array'
+                  THEN item.value -> 'recognize_words' ELSE '[]'::jsonb END
+         ) WITH ORDINALITY AS word(value, idx)
+    CROSS JOIN LATERAL jsonb_each(
+             CASE WHEN jsonb_typeof(word.value) = 'object' THEN word.value ELSE '{}'::jsonb END
+         ) AS kv
+) w ON TRUE
+WHERE r.tboard_id = %s
+ORDER BY r.id, w.item_idx, w.word_idx
+"""
+PERF_XLSX_RDS_COLUMNS = (
+    'id', 'job_id', 'job_name', 'device_id', 'device_name', 'start_time', 'job_assessment_value', 'job_duration',
+    'key', 'value'
+)
+
+
+def load_perf_rds_frame(tboard_id):
+    """
+    以一次查询取得tboard的Rds及recognize_words
+    回传 (rds DataFrame: 每个Rds一行, words DataFrame: 每个识别项一行)
+    """
+    with connection.cursor() as sql:
+        sql.execute(PERF_XLSX_RDS_SQL, [settings.TIME_ZONE, tboard_id])
+        df = pd.DataFrame(sql.fetchall(), columns=PERF_XLSX_RDS_COLUMNS)
+    df['job_duration'] = pd.to_numeric(df['job_duration'])
+    rds = df.drop_duplicates('id').drop(columns=['key', 'value']).reset_index(drop=True)
+    words = df[df['key'].notnull()].reset_index(drop=True)
+    return rds, words
+
+
+def perf_rule_result(value, rule):
+    """
+    以判断规则检查数值，回传 (显示的规则, 'pass'/'fail')，规则无法执行时结果为None
+    =5 视为 ==5
+    """
+    code_rule = rule.replace('=', '==') if rule.startswith('=') else rule
+    try:
+        return rule, 'pass' if eval(f'{value}{code_rule}') else 'fail'
+    except Exception:
+        return rule, None
+
+
+def _quantize(value):
+    return Decimal(f'{value}').quantize(Decimal('0.000'), rounding=ROUND_HALF_UP)
+
+
+def _perf_avg_line(job_name, data_name, avg, job_res_rule):
+    line_data = {'用例名称': job_name, '数据名称': data_name, '平均值': avg}
+    rule = job_res_rule.get(job_name, {}).get(data_name, None)
+    # 没有给出规则不进行判断
+    if rule and avg != '':
+        show_rule, result = perf_rule_result(avg, rule)
+        line_data['标准'] = show_rule
+        if result is not None:
+            line_data['结果'] = result
+    return line_data
+
+
+def perf_avg_sheets(rds, words, jobs, devices, job_res_rule):
+    """
+    每个设备一个统计表: 启动时间类job统计job_duration平均值，其它job统计每个识别项的平均值
+    回传 {device: [line_data]}
+    """
+    duration_avg = rds[rds['job_duration'].notnull()].groupby(['device_id', 'job_id'])['job_duration'].mean()
+
+    # 启动时间类job不统计识别项
+    words = words[words['job_duration'].isnull()].copy()
+    # 空字符视为没有数据，无法转为数值的识别项平均值为空
+    values = words['value'].where(words['value'] != '')
+    words['number'] = pd.to_numeric(values, errors='coerce')
+    words['invalid'] = values.notnull() & words['number'].isnull()
+    words['position'] = range(len(words))
+    word_avg = words.groupby(['device_id', 'job_id', 'key']).agg(
+        {'number': 'mean', 'invalid': 'any', 'position': 'min'}
+    ).sort_values('position')
+    word_avg_lines = {}
+    for (device_id, job_id, key), row in word_avg.iterrows():
+        avg = '' if row['invalid'] or pd.isnull(row['number']) else _quantize(row['number'])
+        word_avg_lines.setdefault((device_id, job_id), []).append((key, avg))
+
+    sheets = {}
+    for device in devices:
+        lines = []
+        for job in jobs:
+            if (device.id, job.id) in duration_avg.index:
+                avg = _quantize(duration_avg[(device.id, job.id)])
+                lines.append(_perf_avg_line(job.job_name, '启动时间', avg, job_res_rule))
+                continue
+            for key, avg in word_avg_lines.get((device.id, job.id), []):
+                lines.append(_perf_avg_line(job.job_name, key, avg, job_res_rule))
+        sheets[device] = lines
+    return sheets
+
+
+def perf_job_sheets(rds, words, jobs):
+    """
+    每个job一个明细表，每个有识别项的Rds一行，同一识别项出现多次时取最后一次的值
+    回传 {job: [line_data]}
+    """
+    rds = rds.set_index('id')
+    sheets = {}
+    for job_id, job_words in words[words['job_id'].isin([job.id for job in jobs])].groupby('job_id', sort=False):
+        values = job_words.groupby(['id', 'key'], sort=False)['value'].last()
+        keys = list(dict.fromkeys(job_words['key']))
+        lines = []
+        for rds_id, rds_values in values.groupby(level='id', sort=False):
+            rds_row = rds.loc[rds_id]
+            line_data = {
+                '设备名称': rds_row['device_name'] or '',
+                'RDSID': rds_id,
+                '开始时间': rds_row['start_time'],
+                'RDS结果': rds_row['job_assessment_value']
+            }
+            line_data.update(rds_values.droplevel('id').reindex(keys).dropna().to_dict())
+            lines.append(line_data)
+        sheets[job_id] = lines
+    return {job: sheets[job.id] for job in jobs if sheets.get(job.id)}
+
+
+def _append_perf_sheet(workbook, title, lines, string_columns=()):
+    """
+    以write_only模式逐行写入，string_columns中以=开头的内容不会被当作公式
+    """
+    worksheet = workbook.create_sheet(title=title)
+    columns = list(dict.fromkeys(key for line in lines for key in line))
+    if not columns:
+        return
+    header = []
+    for column in columns:
+        cell = WriteOnlyCell(worksheet, value=column)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    worksheet.append(header)
+    for line in lines:
+        row = []
+        for column in columns:
+            value = line.get(column)
+            if column in string_columns and value is not None:
+                cell = WriteOnlyCell(worksheet, value=str(value))
+                cell.data_type = 's'
+                cell.alignment = Alignment(horizontal='center', vertical='center')
+                value = cell
+            row.append(value)
+        worksheet.append(row)
+
+
+def export_perf_xlsx(tboard, job_res_rule, file_name, progress=None):
+    """
+    产生性能测试结果的excel文件: 每个设备的统计表、每个job的明细表及启动时间表
+    progress(current, total)用于回报进度
+    """
+    jobs = list(tboard.job.all().distinct('job_name'))
+    devices = list(tboard.device.all().distinct('device_label'))
+    total = len(devices) + len(jobs) + 2
+    current = 0
+
+    def step():
+        nonlocal current
+        current += 1
+        if progress is not None:
+            progress(current, total)
+
+    rds, words = load_perf_rds_frame(tboard.id)
+    step()
+
+    workbook = Workbook(write_only=True)
+    for device, lines in perf_avg_sheets(rds, words, jobs, devices, job_res_rule).items():
+        _append_perf_sheet(workbook, f'{device.device_name}统计', lines, string_columns=('标准',))
+        step()
+    job_sheets = perf_job_sheets(rds, words, jobs)
+    for job in jobs:
+        if job in job_sheets:
+            _append_perf_sheet(workbook, job.job_name, job_sheets[job])
+        step()
+
+    # 有 job_duration 数据才写入
+    duration = rds[rds['job_duration'].notnull()].sort_values(['job_name', 'start_time'], kind='mergesort')
+    if not duration.empty:
+        _append_perf_sheet(workbook, '启动时间', [
+            {'用例名称': row.job_name, '设备名称': row.device_name, 'RDSID': row.id, '开始时间': row.start_time,
+             'RDS结果': row.job_assessment_value, '测试结果/s': row.job_duration}
+            for row in duration.itertuples(index=False)
+        ])
+    workbook.save(file_name)
+    step()
+
+
+# 每个Rds开始前/结束后 CONSUMPTION_SEARCH_WINDOW 内最接近的电量/温度(as-of join)
+# 以(device_id, record_datetime)索引对每个Rds做LIMIT 1的查询，不需将范围内的样本全部载入
+TBOARD_CONSUMPTION_SQL = """
+SELECT r.id,
+       sp.battery_level - ep.battery_level,
+       st.temperature - et.temperature
+FROM apiv1_rds r
+JOIN apiv1_job j ON j.id = r.job_id
+LEFT JOIN LATERAL (
+    SELECT battery_level FROM apiv1_devicepower
+    WHERE device_id = r.device_id AND record_datetime BETWEEN r.start_time - %(window)s AND r.start_time
+    ORDER BY record_datetime DESC LIMIT 1
+) sp ON TRUE
+LEFT JOIN LATERAL (
+    SELECT battery_level FROM apiv1_devicepower
+    WHERE device_id = r.device_id AND record_datetime BETWEEN r.end_time AND r.end_time + %(window)s
+    ORDER BY record_datetime LIMIT 1
+) ep ON TRUE
+LEFT JOIN LATERAL (
+    SELECT temperature FROM apiv1_devicetemperature
+    WHERE device_id = r.device_id AND record_datetime BETWEEN r.start_time - %(window)s AND r.start_time
+    ORDER BY record_datetime DESC LIMIT 1
+) st ON TRUE
+LEFT JOIN LATERAL (
+    SELECT temperature FROM apiv1_devicetemperature
+    WHERE device_id = r.device_id AND record_datetime BETWEEN r.end_time AND r.end_time + %(window)s
+    ORDER BY record_datetime LIMIT 1
+) et ON TRUE
+WHERE r.tboard_id = %(tboard_id)s
+AND j.job_type = %(job_type)s
+AND r.device_id IN (SELECT device_id FROM apiv1_tboard_device WHERE tboard_id = %(tboard_id)s)
+"""
+CONSUMPTION_SEARCH_WINDOW = timedelta(minutes=1)
+
+
+def update_tboard_consumption(tboard_id) -> int:
+    """
+    计算Uniq类TBoard中每个Rds的耗电量/温度差，记录至Rds.power_consumption/Rds.temp_consumption
+    开始: 开始前1min内，最接近rds.start_time的电量/温度数据
+    结束: 结束后1min内，最接近rds.end_time的电量/温度数据
+    范围内查无电量/温度信息，则视为数据异常处理
+    回传更新的Rds数量
+    """
+    from apiv1.module.rds.models import Rds
+
+    with connection.cursor() as sql:
+        sql.execute(TBOARD_CONSUMPTION_SQL, {
+            'tboard_id': tboard_id, 'job_type': JOB_TYPE_UNIQ, 'window': CONSUMPTION_SEARCH_WINDOW
+        })
+        rows = sql.fetchall()
+
+    update_list = [
+        Rds(
+            id=rds_id,
+            power_consumption=POWER_CONSUMPTION_ERROR_CODE if power_consumption is None else power_consumption,
+            temp_consumption=TEMP_CONSUMPTION_ERROR_CODE if temp_consumption is None else temp_consumption
+        ) for rds_id, power_consumption, temp_consumption in rows
+    ]
+    Rds.objects.bulk_update(update_list, ("power_consumption", "temp_consumption"), batch_size=1000)
+    return len(update_list)
+
+
+def perf_duration_aggregates(success=Q(), failed=Q(), skip_zero=False, with_durations=False) -> dict:
+    """
+    性能数据统计所需的聚合表达式，搭配 values(分组栏位).annotate(**) 或 aggregate(**) 一次查询取得
+    success/failed: 成功/失败Rds额外的筛选条件
+    skip_zero: job_duration为0的数据不参与avg/max/median统计
+    with_durations: 额外回传成功Rds的job_duration列表(box chart)
+    """
+    success = Q(job_assessment_value='0') & success
+    duration = success & Q(job_duration__isnull=False)
+    if skip_zero:
+        duration &= ~Q(job_duration=0)
+    aggregates = {
+        'success_num': Count('id', filter=success),
+        'failed_num': Count('id', filter=Q(job_assessment_value='1') & failed),
+        'avg': Avg('job_duration', filter=duration),
+        'max': Max('job_duration', filter=duration),
+        'median': Percentile('job_duration', filter=duration),
+    }
+    if with_durations:
+        aggregates['durations'] = ArrayAgg('job_duration', filter=duration)
+    return aggregates
+
+
+# job_duration(保留4位小数)切分为等宽区间，与pd.cut(bins=n)的区间一致:
+# 区间右闭，第一个区间左边界向左扩展0.1%；最大值等于最小值时上下各扩展0.1%
+# width_bucket以(hi, lo)反向传入，使区间为右闭
+PERF_DURATION_HISTOGRAM_SQL = """
+WITH d AS (
+    SELECT round(rds.job_duration::numeric, 4) AS v FROM ({rds_sql}) rds WHERE rds.job_duration > 0
+), r AS (
+    SELECT min(v) AS lo, max(v) AS hi, count(*) AS n FROM d
+), e AS (
+    SELECT CASE WHEN lo = hi THEN lo * 0.999 ELSE lo END AS lo,
+           CASE WHEN lo = hi THEN hi * 1.001 ELSE hi END AS hi,
+           CASE WHEN lo = hi THEN 0 ELSE (hi - lo) * 0.001 END AS adjust,
+           n
+    FROM r WHERE n > 0
+)
+SELECT b.bucket, e.lo, e.hi, e.adjust, e.n, count(d.v)
+FROM e
+CROSS JOIN generate_series(1, %s) AS b(bucket)
+LEFT JOIN d ON greatest(%s + 1 - width_bucket(d.v, e.hi, e.lo, %s), 1) = b.bucket
+GROUP BY b.bucket, e.lo, e.hi, e.adjust, e.n
+ORDER BY b.bucket
+"""
+
+
+def perf_duration_histogram(rds_queryset, bucket_num=5) -> list:
+    """
+    将rds_queryset中大于0的job_duration切分为bucket_num个等宽区间并计数，由数据库一次完成
+    回传 [['左边界-右边界', 数量]]，按区间由小至大排列
+    """
+    try:
+        rds_sql, rds_params = rds_queryset.values('job_duration').query.sql_with_params()
+    except EmptyResultSet:
+        return []
+    with connection.cursor() as sql:
+        sql.execute(PERF_DURATION_HISTOGRAM_SQL.format(rds_sql=rds_sql), (*rds_params, *[bucket_num] * 3))
+        rows = sql.fetchall()
+    if not rows:
+        return []
+
+    _, lo, hi, adjust, total, _ = rows[0]
+    if total == 1:
+        # 只有一笔数据时以该数据上下取整至3位小数作为区间
+        value = (lo + hi) / 2
+        return [[f'{math.floor(1000 * value) / 1000}-{math.ceil(1000 * value) / 1000}', 1]]
+
+    lo, hi, adjust = float(lo), float(hi), float(adjust)
+
+    width = (hi - lo) / bucket_num
+    results = []
+    for bucket, *_, count in rows:
+        left = lo + (bucket - 1) * width - (adjust if bucket == 1 else 0)
+        right = hi if bucket == bucket_num else lo + bucket * width
+        results.append([f'{round(left, 4)}-{round(right, 4)}', count])
+    return results
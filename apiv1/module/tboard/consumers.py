@@ -2,17 +2,32 @@ import json
 
 from asgiref.sync import async_to_sync
 from channels.generic.websocket import WebsocketConsumer
-from channels.layers import get_channel_layer
 
-from apiv1.core.constants import TBOARD_DELETE_GROUP, TBOARD_DELETE_FAIL_GROUP, REDIS_TBOARD_DELETE, \
-    REDIS_TBOARD_DELETE_FAIL
-from apiv1.module.tboard.tasks.tasks import get_hash_data_in_redis, sorted_data, STATE_MAPPING
+from apiv1.core.constants import TBOARD_DELETE_GROUP, TBOARD_DELETE_FAIL_GROUP
+from apiv1.module.tboard.tasks.tasks import sorted_data, STATE_MAPPING, tboard_delete_index, \
+    tboard_delete_fail_index
 
 
-class TBoardDeleteConsumer(WebsocketConsumer):
-    def connect(self):
-        channel_layer = get_channel_layer()
+class DeltaConsumerMixin:
+    """
+    连接时只向该连接发送一次完整列表 {"message": [...]}，
+    之后列表的变化以 {"delta": {"action": "update", "data": {...}}} 或
+    {"delta": {"action": "remove", "id": "..."}} 推送
+    """
+
+    def send_message(self, event):
+        self.send(text_data=json.dumps({
+            "message": event["message"]
+        }))
 
+    def send_delta(self, event):
+        self.send(text_data=json.dumps({
+            "delta": event["delta"]
+        }))
+
+
+class TBoardDeleteConsumer(DeltaConsumerMixin, WebsocketConsumer):
+    def connect(self):
         # Join group
         async_to_sync(self.channel_layer.group_add)(
             TBOARD_DELETE_GROUP,
@@ -20,16 +35,12 @@ class TBoardDeleteConsumer(WebsocketConsumer):
         )
         self.accept()
 
-        # 在每次连接进来之后都会从redis里取出所有tboard_delete的信息，发送一次消息
-        tboard_deleting_message = get_hash_data_in_redis(f'{REDIS_TBOARD_DELETE}:*')
+        # 在每次连接进来之后都会从redis里取出所有tboard_delete的信息，向该连接发送一次消息
         message = sorted_data(
-            tboard_deleting_message,
+            tboard_delete_index.all(),
             lambda e: (e.__getitem__('record_time'), STATE_MAPPING[(e.__getitem__('state'))])
         )
-        async_to_sync(channel_layer.group_send)(TBOARD_DELETE_GROUP, {
-            "type": "send_message",
-            "message": message
-        })
+        self.send_message({"message": message})
 
     def disconnect(self, close_code):
         # Leave group
@@ -41,16 +52,9 @@ class TBoardDeleteConsumer(WebsocketConsumer):
     def receive(self, text_data):
         pass
 
-    def send_message(self, event):
-        self.send(text_data=json.dumps({
-            "message": event["message"]
-        }))
-
 
-class TBoardDeleteFailConsumer(WebsocketConsumer):
+class TBoardDeleteFailConsumer(DeltaConsumerMixin, WebsocketConsumer):
     def connect(self):
-        channel_layer = get_channel_layer()
-
         # Join group
         async_to_sync(self.channel_layer.group_add)(
             TBOARD_DELETE_FAIL_GROUP,
@@ -58,16 +62,12 @@ class TBoardDeleteFailConsumer(WebsocketConsumer):
         )
         self.accept()
 
-        # 在每次连接进来之后都会从redis里取出所有tboard_deleted_fail的信息，发送一次消息
-        tboard_deleted_fail_message = get_hash_data_in_redis(f'{REDIS_TBOARD_DELETE_FAIL}:*')
+        # 在每次连接进来之后都会从redis里取出所有tboard_deleted_fail的信息，向该连接发送一次消息
         message = sorted_data(
-            tboard_deleted_fail_message,
+            tboard_delete_fail_index.all(),
             lambda e: (e.__getitem__('record_time'))
         )
-        async_to_sync(channel_layer.group_send)(TBOARD_DELETE_FAIL_GROUP, {
-            "type": "send_message",
-            "message": message
-        })
+        self.send_message({"message": message})
 
     def disconnect(self, close_code):
         # Leave group
@@ -78,8 +78,3 @@ class TBoardDeleteFailConsumer(WebsocketConsumer):
 
     def receive(self, text_data):
         pass
-
-    def send_message(self, event):
-        self.send(text_data=json.dumps({
-            "message": event["message"]
-        }))
@@ -59,11 +59,10 @@ class TBoard(models.Model):
 
     @property
     def progress(self):
-        rdss = self.rds.all()
-        finished_rds_count = 0
-        for rds in rdss:
-            if rds.end_time is not None:
-                finished_rds_count += 1
+        try:
+            finished_rds_count = self.statistics.finished
+        except TBoardStatistics.DoesNotExist:
+            finished_rds_count = 0
         total = (len(self.device.all()) * len(self.job.all()) * self.repeat_time)
         progress = finished_rds_count / total if total != 0 else 0
         if progress > 1:
@@ -87,3 +86,22 @@ class TBoardStatisticsResult(AbsBase):
 
     tboard = models.ForeignKey(TBoard, on_delete=models.CASCADE, related_name="tboardstatisticsresult", verbose_name="任务关联")
     file_path = models.CharField(max_length=350, verbose_name='文件路径')
+
+
+class TBoardStatistics(models.Model):
+    """
+    TBoard关联Rds的计数汇总，由Rds的signal以增量方式维护，避免每次保存Rds都对整个TBoard的Rds做count
+    total: 关联的Rds数量
+    finished: 已结束(end_time不为空)的Rds数量
+    success/fail/na: 已结束的Rds中，通过(0)/失败(1)/无效(其它值)的数量
+    若计数与Rds实际数据不一致，可通过 rebuild_tboard_statistics 命令重建
+    """
+    tboard = models.OneToOneField(TBoard, on_delete=models.CASCADE, related_name="statistics", verbose_name="任务关联")
+    total = models.IntegerField(default=0, verbose_name='rds总数')
+    finished = models.IntegerField(default=0, verbose_name='已结束rds数量')
+    success = models.IntegerField(default=0, verbose_name='通过rds数量')
+    fail = models.IntegerField(default=0, verbose_name='失败rds数量')
+    na = models.IntegerField(default=0, verbose_name='无效rds数量')
+
+    class Meta:
+        verbose_name_plural = "任务统计"
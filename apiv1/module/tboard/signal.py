@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apiv1.core.cache import invalidate_cache
+
+
+@receiver([post_save, post_delete], sender="apiv1.TBoard", dispatch_uid='tboard_cache_invalidate')
+def tboard_cache_invalidate_handler(sender, instance=None, **kwargs):
+    # tboard写入/删除后使依赖该tboard的缓存失效
+    invalidate_cache('tboard', tboard=instance.id)
@@ -1,11 +1,20 @@
+import time
+from datetime import timedelta
+
+from django.db import connection
 from django.utils import timezone
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from apiv1.core.constants import JOB_TYPE_UNIQ, POWER_CONSUMPTION_ERROR_CODE, TEMP_CONSUMPTION_ERROR_CODE
+from apiv1.module.device.models import DevicePower, DeviceTemperature
+from apiv1.module.job.models import Job
+from apiv1.module.rds.models import Rds
 from apiv1.module.user.models import ReefUser
+from apiv1.module.tboard.business import update_tboard_consumption
 from apiv1.module.tboard.models import TBoard
-from apiv1.core.test import tccounter
+from apiv1.core.test import TestTool, tccounter, benchmark
 from reef.settings import ENABLE_TCCOUNTER
 
 class TestEndTBoard(APITestCase):
@@ -42,4 +51,116 @@ class TestEndTBoard(APITestCase):
         response = self.client.put(reverse('end_tboard', kwargs={'pk': 0}), data={
             'end_time': '2018_07_24_15_06_59'
         })
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestUpdateTBoardConsumption(APITestCase):
+    def setUp(self):
+        self.default_data = TestTool.load_default_data()
+        self.device = self.default_data['device']
+        self.job = self.default_data['job']
+        Job.objects.filter(id=self.job.id).update(job_type=JOB_TYPE_UNIQ)
+        self.tboard = self.default_data['tboard']
+        self.tboard.device.add(self.device)
+        self.start_time = timezone.now() - timedelta(hours=1)
+        self.end_time = self.start_time + timedelta(minutes=10)
+        self.rds = Rds.objects.create(job=self.job, device=self.device, tboard=self.tboard,
+                                      start_time=self.start_time, end_time=self.end_time)
+
+    def create_sample(self, offset, battery_level, temperature):
+        record_datetime = self.start_time + offset
+        DevicePower.objects.create(device=self.device, cabinet=self.default_data['cabinet'], charging=False,
+                                   battery_level=battery_level, record_datetime=record_datetime)
+        DeviceTemperature.objects.create(device=self.device, cabinet=self.default_data['cabinet'],
+                                         temp_port=self.default_data['temp_port'], description='',
+                                         temperature=temperature, record_datetime=record_datetime)
+
+    def test_nearest_sample(self):
+        # 开始前取最接近start_time的一笔，超出1min的不取
+        self.create_sample(timedelta(minutes=-2), 100, 10)
+        self.create_sample(timedelta(seconds=-30), 90, 30)
+        self.create_sample(timedelta(seconds=-1), 80, 31)
+        self.create_sample(timedelta(seconds=1), 70, 40)
+        # 结束后取最接近end_time的一笔
+        self.create_sample(timedelta(minutes=10, seconds=-1), 30, 50)
+        self.create_sample(timedelta(minutes=10, seconds=2), 20, 38)
+        self.create_sample(timedelta(minutes=10, seconds=30), 10, 20)
+
+        self.assertEqual(update_tboard_consumption(self.tboard.id), 1)
+        self.rds.refresh_from_db()
+        self.assertEqual(self.rds.power_consumption, 60)
+        self.assertEqual(self.rds.temp_consumption, -7)
+
+    def test_no_sample_in_window(self):
+        self.create_sample(timedelta(minutes=-2), 100, 10)
+        self.create_sample(timedelta(minutes=12), 10, 20)
+
+        update_tboard_consumption(self.tboard.id)
+        self.rds.refresh_from_db()
+        self.assertEqual(self.rds.power_consumption, POWER_CONSUMPTION_ERROR_CODE)
+        self.assertEqual(self.rds.temp_consumption, TEMP_CONSUMPTION_ERROR_CODE)
+
+    def test_skip_not_uniq_job(self):
+        Job.objects.filter(id=self.job.id).update(job_type='Sysjob')
+        self.assertEqual(update_tboard_consumption(self.tboard.id), 0)
+
+
+@benchmark
+class BenchmarkUpdateTBoardConsumption(APITestCase):
+    """
+    100个device × 100个Rds，每个device每秒各有一笔电量/温度数据，共1M笔
+    单独执行: REEF_BENCHMARK=1 python manage.py test apiv1.module.tboard.tests.test_end_tboard
+    """
+    device_num = 100
+    rds_num = 100
+    # 每个Rds占用的秒数，前后各留5s作为开始前/结束后的数据
+    rds_seconds = 50
+    # 计算及写入耗时上限(秒)
+    max_elapsed = 5
+
+    def setUp(self):
+        default_data = TestTool.load_default_data()
+        job = default_data['job']
+        Job.objects.filter(id=job.id).update(job_type=JOB_TYPE_UNIQ)
+        devices = TestTool.create_benchmark_devices(self.device_num, default_data['device'].rom_version)
+        self.tboard = default_data['tboard']
+        self.tboard.device.add(*devices)
+        begin = timezone.now() - timedelta(days=1)
+        Rds.objects.bulk_create([
+            Rds(start_time=begin + timedelta(seconds=index * self.rds_seconds + 5),
+                end_time=begin + timedelta(seconds=(index + 1) * self.rds_seconds - 5),
+                tboard=self.tboard, device=device, job=job)
+            for device in devices
+            for index in range(self.rds_num)
+        ], batch_size=5000)
+
+        params = {
+            'device_ids': [device.id for device in devices], 'begin': begin,
+            'seconds': self.rds_num * self.rds_seconds, 'cabinet_id': default_data['cabinet'].id,
+            'temp_port_id': default_data['temp_port'].id
+        }
+        with connection.cursor() as sql:
+            sql.execute("""
+                INSERT INTO apiv1_devicepower (device_id, cabinet_id, record_datetime, battery_level, charging)
+                SELECT d, %(cabinet_id)s, %(begin)s + s * INTERVAL '1 second', 100 - s %% 100, FALSE
+                FROM unnest(%(device_ids)s) AS d, generate_series(0, %(seconds)s - 1) AS s
+            """, params)
+            sql.execute("""
+                INSERT INTO apiv1_devicetemperature
+                    (device_id, cabinet_id, temp_port_id, description, record_datetime, temperature)
+                SELECT d, %(cabinet_id)s, %(temp_port_id)s, '', %(begin)s + s * INTERVAL '1 second', s %% 50
+                FROM unnest(%(device_ids)s) AS d, generate_series(0, %(seconds)s - 1) AS s
+            """, params)
+            sql.execute('ANALYZE apiv1_devicepower, apiv1_devicetemperature')
+
+    def test_benchmark(self):
+        start = time.perf_counter()
+        count = update_tboard_consumption(self.tboard.id)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(count, self.device_num * self.rds_num)
+        self.assertFalse(Rds.objects.filter(tboard=self.tboard, power_consumption=POWER_CONSUMPTION_ERROR_CODE)
+                         .exists())
+        self.assertFalse(Rds.objects.filter(tboard=self.tboard, temp_consumption=TEMP_CONSUMPTION_ERROR_CODE)
+                         .exists())
+        self.assertLess(elapsed, self.max_elapsed)
@@ -0,0 +1,88 @@
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.shortcuts import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apiv1.core.test import TestTool, tccounter
+from apiv1.module.rds.models import Rds, RdsDailyStatistics
+from reef.settings import ENABLE_TCCOUNTER
+
+
+class TestGetDataView(APITestCase):
+    def setUp(self):
+        self.default_data = TestTool.load_default_data()
+        self.tboard = self.default_data['tboard']
+        self.today = timezone.localtime(timezone.now()).date()
+
+    def create_rds(self, job_assessment_value, days_ago=0):
+        return Rds.objects.create(
+            job=self.default_data['job'],
+            device=self.default_data['device'],
+            tboard=self.tboard,
+            start_time=timezone.now() - timedelta(days=days_ago),
+            end_time=timezone.now(),
+            job_assessment_value=job_assessment_value
+        )
+
+    def get_daily_statistics(self, day=None):
+        return tuple(RdsDailyStatistics.objects.filter(
+            tboard=self.tboard, day=day or self.today
+        ).values_list('na', 'success', 'fail').first() or (0, 0, 0))
+
+    def test_rds_write_update_daily_statistics(self):
+        """
+        default_data['rds'] 的job_assessment_value为空，计入na
+        """
+        rds = self.create_rds('0')
+        self.create_rds('1')
+        self.assertEqual(self.get_daily_statistics(), (1, 1, 1))
+
+        rds.job_assessment_value = '1'
+        rds.save()
+        self.assertEqual(self.get_daily_statistics(), (1, 0, 2))
+
+        rds.start_time = rds.start_time - timedelta(days=1)
+        rds.save()
+        self.assertEqual(self.get_daily_statistics(), (1, 0, 1))
+        self.assertEqual(self.get_daily_statistics(self.today - timedelta(days=1)), (0, 0, 1))
+
+        rds.delete()
+        self.assertEqual(self.get_daily_statistics(self.today - timedelta(days=1)), (0, 0, 0))
+
+    def test_rebuild_command_fix_daily_statistics(self):
+        self.create_rds('0')
+        RdsDailyStatistics.objects.filter(tboard=self.tboard).update(success=100)
+        call_command('rebuild_tboard_statistics', tboard=[self.tboard.id])
+        self.assertEqual(self.get_daily_statistics(), (1, 1, 0))
+
+    @tccounter("get_data_view", "get", ENABLE_TCCOUNTER)
+    def test_sum_daily_statistics_in_date_range(self):
+        self.create_rds('0')
+        self.create_rds('1', days_ago=2)
+        self.create_rds('0', days_ago=5)
+
+        response = self.client.get(reverse('get_data_view'), {
+            'tboard_id': self.tboard.id,
+            'group_by': 'device',
+            'start_date': (self.today - timedelta(days=2)).strftime('%Y-%m-%d'),
+            'end_date': self.today.strftime('%Y-%m-%d'),
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        row = dict(zip(response.data['fields'], response.data['data'][0]))
+        self.assertEqual(row['device_id'], self.default_data['device'].id)
+        self.assertEqual((row['na'], row['success'], row['fail'], row['total']), (1, 1, 1, 3))
+
+    @tccounter("get_data_view", "get", ENABLE_TCCOUNTER)
+    def test_filter_by_ratio(self):
+        self.create_rds('0')
+        response = self.client.get(reverse('get_data_view'), {
+            'tboard_id': self.tboard.id,
+            'group_by': 'job',
+            'success_ratio': '0.9',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], [])
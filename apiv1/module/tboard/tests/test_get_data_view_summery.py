@@ -0,0 +1,101 @@
+import time
+from datetime import timedelta
+
+from django.shortcuts import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apiv1.core.test import TestTool, tccounter, benchmark
+from apiv1.module.rds.models import Rds
+from apiv1.module.tboard.business import rebuild_rds_daily_statistics
+from reef.settings import ENABLE_TCCOUNTER
+
+
+class TestGetDataViewSummery(APITestCase):
+    def setUp(self):
+        self.default_data = TestTool.load_default_data()
+        self.device = self.default_data['device']
+        self.today = timezone.localtime(timezone.now()).date()
+
+    def create_rds(self, job_assessment_value, days_ago=0):
+        return Rds.objects.create(
+            job=self.default_data['job'],
+            device=self.device,
+            tboard=self.default_data['tboard'],
+            start_time=timezone.now() - timedelta(days=days_ago),
+            end_time=timezone.now(),
+            job_assessment_value=job_assessment_value
+        )
+
+    @tccounter("get_data_view_summery", "get", ENABLE_TCCOUNTER)
+    def test_summery_in_date_range(self):
+        """
+        default_data['rds'] 的job_assessment_value为空，计入na
+        """
+        self.create_rds('0')
+        self.create_rds('1', days_ago=2)
+        self.create_rds('0', days_ago=5)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('get_data_view_summery'), {
+                'devices': str(self.device.id),
+                'start_date': (self.today - timedelta(days=2)).strftime('%Y-%m-%d'),
+                'end_date': self.today.strftime('%Y-%m-%d'),
+            })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'success': 1, 'fail': 1, 'na': 1, 'total': 3,
+            'success_ratio': 0.33, 'fail_ratio': 0.33, 'na_ratio': 0.33
+        })
+
+    @tccounter("get_data_view_summery", "get", ENABLE_TCCOUNTER)
+    def test_summery_without_rds(self):
+        response = self.client.get(reverse('get_data_view_summery'), {'devices': '0'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'success': 0, 'fail': 0, 'na': 0, 'total': 0, 'success_ratio': 0, 'fail_ratio': 0, 'na_ratio': 0
+        })
+
+
+@benchmark
+class BenchmarkGetDataViewSummery(APITestCase):
+    """
+    100个device × 10000条Rds，共1M条，分布在30天内，查询全部device一个月的汇总
+    单独执行: REEF_BENCHMARK=1 python manage.py test apiv1.module.tboard.tests.test_get_data_view_summery
+    """
+    device_num = 100
+    rds_per_device = 10000
+    days = 30
+    # 查询耗时上限(秒)
+    max_elapsed = 0.5
+
+    def setUp(self):
+        default_data = TestTool.load_default_data()
+        self.devices = TestTool.create_benchmark_devices(self.device_num, default_data['device'].rom_version)
+        tboard, job = default_data['tboard'], default_data['job']
+        self.end = timezone.now()
+        self.begin = self.end - timedelta(days=self.days)
+        interval = (self.end - self.begin) / self.rds_per_device
+        for device in self.devices:
+            Rds.objects.bulk_create([
+                Rds(start_time=self.begin + interval * index, end_time=self.begin + interval * index,
+                    job_assessment_value=('0', '1', '-1')[index % 3], tboard=tboard, device=device, job=job)
+                for index in range(self.rds_per_device)
+            ], batch_size=5000)
+        # bulk_create不经过signal，重建每日计数
+        rebuild_rds_daily_statistics()
+
+    def test_benchmark(self):
+        with self.assertNumQueries(1):
+            start = time.perf_counter()
+            response = self.client.get(reverse('get_data_view_summery'), {
+                'devices': ','.join(str(device.id) for device in self.devices),
+                'start_date': timezone.localtime(self.begin).strftime('%Y-%m-%d'),
+                'end_date': timezone.localtime(self.end).strftime('%Y-%m-%d'),
+            })
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], self.device_num * self.rds_per_device)
+        self.assertLess(elapsed, self.max_elapsed)
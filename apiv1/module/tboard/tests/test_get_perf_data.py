@@ -0,0 +1,89 @@
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apiv1.core.test import TestTool, tccounter
+from apiv1.module.rds.models import Rds
+from apiv1.module.tboard.models import TBoardJob
+from reef.settings import ENABLE_TCCOUNTER
+
+
+class TestGetPerfData(APITestCase):
+    def setUp(self):
+        self.default_data = TestTool.load_default_data()
+        self.tboard = self.default_data['tboard']
+        self.job = self.default_data['job']
+        self.device = self.default_data['device']
+        self.phone_model = self.default_data['phone_model']
+        self.rom_version = self.default_data['rom_version']
+        TBoardJob.objects.create(tboard=self.tboard, job=self.job, order=0)
+        self.tboard.device.add(self.device)
+        # default_data中的rds没有结果，不参与统计
+        for job_duration in (1, 2, 4, 10, 0, None):
+            self.create_rds('0', job_duration)
+        self.create_rds('1', 3)
+
+    def create_rds(self, job_assessment_value, job_duration):
+        Rds.objects.create(job=self.job, device=self.device, tboard=self.tboard, phone_model=self.phone_model,
+                           rom_version=self.rom_version, job_assessment_value=job_assessment_value,
+                           job_duration=job_duration)
+
+    def perf_params(self, **kwargs):
+        return {'tboard': self.tboard.id, 'job': self.job.id, **kwargs}
+
+    @tccounter("get_tboard_perf_dtail_data", "get", ENABLE_TCCOUNTER)
+    def test_tboard_detail(self):
+        response = self.client.get(reverse('get_tboard_perf_dtail_data'), {
+            'tboard': self.tboard.id, 'devices': str(self.device.id)
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        job_data, = response.data['job_data']
+        self.assertEqual(job_data['success_num'], 6)
+        self.assertEqual(job_data['failed_num'], 1)
+        self.assertEqual(job_data['avg'], 3.4)
+        self.assertEqual(job_data['median'], 2)
+        self.assertEqual(job_data['max'], 10)
+
+    @tccounter("get_tboard_perf_dtail_data", "get", ENABLE_TCCOUNTER)
+    def test_tboard_detail_without_devices(self):
+        response = self.client.get(reverse('get_tboard_perf_dtail_data'), {'tboard': self.tboard.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        job_data, = response.data['job_data']
+        self.assertEqual(job_data['success_num'], 0)
+        self.assertEqual(job_data['failed_num'], 1)
+        self.assertEqual(job_data['median'], '暂无数据')
+
+    @tccounter("get_perf_data_line_chart", "get", ENABLE_TCCOUNTER)
+    def test_table_chart(self):
+        response = self.client.get(reverse('get_perf_data_line_chart'), self.perf_params(
+            model_rom_version=f'{self.phone_model.id}.{self.rom_version.id}', sizer='table_chart'
+        ))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{
+            'phone_model_name': self.phone_model.phone_model_name, 'rom_version_name': self.rom_version.version,
+            'median': 3, 'avg': 4.25, 'max': 10, 'success_num': 6, 'failed_num': 1
+        }])
+
+    @tccounter("get_perf_data_line_chart", "get", ENABLE_TCCOUNTER)
+    def test_box_chart(self):
+        response = self.client.get(reverse('get_perf_data_line_chart'), self.perf_params(
+            model_rom_version=f'{self.phone_model.id}.{self.rom_version.id}', sizer='box_chart'
+        ))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['x_data'], [f'{self.phone_model.phone_model_name}/{self.rom_version.version}'])
+        self.assertEqual(sorted(response.data['y_data'][0]), [1, 2, 4, 10])
+
+    @tccounter("get_single_device_table_data", "get", ENABLE_TCCOUNTER)
+    def test_single_device_table(self):
+        response = self.client.get(reverse('get_single_device_table_data'), self.perf_params(
+            phone_model_obj=self.phone_model.id, rom_version_obj=self.rom_version.id
+        ))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'avg': 4.25, 'max': 10, 'median': 3, 'failed_num': 1, 'success_num': 6})
+
+    @tccounter("get_perf_data_bar_chart", "get", ENABLE_TCCOUNTER)
+    def test_bar_chart(self):
+        response = self.client.get(reverse('get_perf_data_bar_chart'), self.perf_params(devices=str(self.device.id)))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [['0.991-2.8', 2], ['2.8-4.6', 1], ['4.6-6.4', 0], ['6.4-8.2', 0],
+                                         ['8.2-10.0', 1]])
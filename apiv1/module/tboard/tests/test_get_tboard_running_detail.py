@@ -1,8 +1,10 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from apiv1.core.test import TestTool
+from apiv1.core.test import TestTool, benchmark
 from apiv1.module.device.models import Manufacturer, RomVersion, Device
 from apiv1.module.job.models import Job
 from apiv1.module.rds.models import Rds
@@ -134,4 +136,50 @@ class TestGetTboardRunningDetail(APITestCase):
             reverse('get_tboard_running_detail') + f'?tboard_id={default_data["tboard"].id}'
         )
         self.assertEqual(response.data['jobs'][0]['fail'], 1)
-        self.assertEqual(response.data['jobs'][0]['devices'][0]['fail'], 1)
\ No newline at end of file
+        self.assertEqual(response.data['jobs'][0]['devices'][0]['fail'], 1)
+
+
+@benchmark
+class BenchmarkGetTboardRunningDetail(APITestCase):
+    """
+    100个device × 500个job的TBoard，每个(device, job)各有一条已结束的Rds
+    单独执行: REEF_BENCHMARK=1 python manage.py test apiv1.module.tboard.tests.test_get_tboard_running_detail
+    """
+    device_num = 100
+    job_num = 500
+
+    def setUp(self):
+        default_data = TestTool.load_default_data()
+        devices = TestTool.create_benchmark_devices(self.device_num, default_data['device'].rom_version)
+        jobs = Job.objects.bulk_create([
+            Job(job_label=f'benchmark_job_{index}', job_name=f'benchmark_job_{index}', job_type='Sysjob',
+                description=f'benchmark_job_{index}')
+            for index in range(self.job_num)
+        ])
+        self.tboard = TBoard.objects.create(author=default_data['user'], board_stamp='2018-01-01 00:00:00+0000',
+                                            end_time='2018-01-01 12:00:00+0000')
+        self.tboard.device.add(*devices)
+        TBoardJob.objects.bulk_create([
+            TBoardJob(tboard=self.tboard, job=job, order=order) for order, job in enumerate(jobs)
+        ])
+        Rds.objects.bulk_create([
+            Rds(start_time='2018-01-01 06:00:00+0000', end_time='2018-01-01 08:00:00+0000',
+                job_assessment_value=('0', '1', '-1')[(device_index + job_index) % 3],
+                tboard=self.tboard, device=device, job=job)
+            for device_index, device in enumerate(devices)
+            for job_index, job in enumerate(jobs)
+        ], batch_size=5000)
+
+    def test_benchmark(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('get_tboard_running_detail') + f'?tboard_id={self.tboard.id}')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Rds只查询一次
+        self.assertEqual(len([query for query in queries.captured_queries if '"apiv1_rds"' in query['sql']]), 1)
+        self.assertEqual(len(response.data['jobs']), self.job_num)
+        self.assertEqual(len(response.data['devices']), self.device_num)
+        for job in response.data['jobs']:
+            self.assertEqual(job['total'], self.device_num)
+            self.assertEqual(len(job['devices']), self.device_num)
+            self.assertEqual(job['pass'] + job['fail'] + job['na'], job['total'])
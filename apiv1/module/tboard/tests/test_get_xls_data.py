@@ -0,0 +1,52 @@
+import json
+import os
+
+import openpyxl
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apiv1.core.test import TestTool, tccounter
+from apiv1.module.rds.models import Rds
+from apiv1.module.tboard.models import TBoardJob
+from reef.settings import ENABLE_TCCOUNTER, MEDIA_ROOT
+
+
+class TestGetXlsData(APITestCase):
+    def setUp(self):
+        self.default_data = TestTool.load_default_data()
+        self.tboard = self.default_data['tboard']
+        self.job = self.default_data['job']
+        self.device = self.default_data['device']
+        TBoardJob.objects.create(tboard=self.tboard, job=self.job, order=0)
+        self.tboard.device.add(self.device)
+
+    def create_rds(self, recognize_words):
+        return Rds.objects.create(
+            job=self.job,
+            device=self.device,
+            tboard=self.tboard,
+            job_assessment_value='0',
+            rds_dict=[{'recognize_words': recognize_words}, 'not dict item']
+        )
+
+    @tccounter("get_xls_data", "get", ENABLE_TCCOUNTER)
+    def test_export_recognize_words(self):
+        rds = self.create_rds([{'fps': '30'}, {'delay': ''}])
+        self.create_rds([{'fps': 40}, {'delay': 'x'}])
+        response = self.client.get(reverse('get_xls_data'), {
+            'tboard': self.tboard.id,
+            'job_res_rule': json.dumps({self.job.job_name: {'fps': '=35'}})
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        workbook = openpyxl.load_workbook(os.path.join(MEDIA_ROOT, response.data))
+        avg_rows = list(workbook[f'{self.device.device_name}统计'].values)
+        self.assertEqual(avg_rows[0], ('用例名称', '数据名称', '平均值', '标准', '结果'))
+        self.assertEqual(avg_rows[1], (self.job.job_name, 'fps', 35, '=35', 'pass'))
+        self.assertEqual(avg_rows[2][:2], (self.job.job_name, 'delay'))
+        self.assertIsNone(avg_rows[2][2])
+
+        job_rows = list(workbook[self.job.job_name].values)
+        self.assertEqual(job_rows[0], ('设备名称', 'RDSID', '开始时间', 'RDS结果', 'fps', 'delay'))
+        self.assertEqual(job_rows[1][:2], (self.device.device_name, rds.id))
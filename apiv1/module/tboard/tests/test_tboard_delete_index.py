@@ -0,0 +1,40 @@
+from rest_framework.test import APITestCase
+
+from apiv1.core.redis_index import RedisHashIndex
+from reef.settings import redis_pool_connect
+
+
+class TestRedisHashIndex(APITestCase):
+    def setUp(self):
+        self.index = RedisHashIndex('test:tboard:delete')
+
+    def tearDown(self):
+        redis_pool_connect.delete(self.index.index_key, *[self.index.hash_key(item_id) for item_id in (1, 2, 3)])
+
+    def test_all_order_by_write_time(self):
+        for item_id in (1, 2, 3):
+            self.index.set(item_id, {'id': item_id, 'state': 'to_be_delete'})
+        self.assertEqual([item['id'] for item in self.index.all()], ['3', '2', '1'])
+        self.assertEqual([item['id'] for item in self.index.all(count=1)], ['3'])
+
+    def test_update_and_pop(self):
+        self.index.set(1, {'id': 1, 'state': 'to_be_delete'})
+        self.assertEqual(self.index.update(1, state='deleting'), {'id': '1', 'state': 'deleting'})
+        self.assertEqual(self.index.pop(1), {'id': '1', 'state': 'deleting'})
+        self.assertEqual(self.index.all(), [])
+        self.assertEqual(redis_pool_connect.zcard(self.index.index_key), 0)
+
+    def test_remove_expired_hash_from_index(self):
+        self.index.set(1, {'id': 1})
+        self.index.set(2, {'id': 2})
+        # 模拟hash过期
+        redis_pool_connect.delete(self.index.hash_key(1))
+        self.assertEqual(self.index.all(), [{'id': '2'}])
+        self.assertEqual(redis_pool_connect.zrange(self.index.index_key, 0, -1), [b'2'])
+
+    def test_delete(self):
+        self.index.set(1, {'id': 1})
+        self.index.set(2, {'id': 2})
+        self.index.delete(1, 2)
+        self.assertEqual(self.index.all(), [])
+        self.assertFalse(redis_pool_connect.exists(self.index.hash_key(1)))
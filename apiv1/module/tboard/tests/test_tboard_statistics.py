@@ -0,0 +1,79 @@
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apiv1.core.test import TestTool
+from apiv1.module.rds.models import Rds
+from apiv1.module.tboard.models import TBoard, TBoardStatistics
+
+
+class TestTBoardStatistics(APITestCase):
+    def setUp(self):
+        self.default_data = TestTool.load_default_data()
+        self.tboard = self.default_data['tboard']
+
+    def get_statistics(self, tboard_id=None):
+        statistics = TBoardStatistics.objects.get(tboard_id=tboard_id or self.tboard.id)
+        return statistics.total, statistics.finished, statistics.success, statistics.fail, statistics.na
+
+    def create_rds(self, job_assessment_value, end_time=None, tboard=None):
+        return Rds.objects.create(
+            job=self.default_data['job'],
+            device=self.default_data['device'],
+            tboard=tboard or self.tboard,
+            start_time=timezone.now(),
+            end_time=end_time,
+            job_assessment_value=job_assessment_value
+        )
+
+    def test_create_rds_update_statistics(self):
+        """
+        default_data['rds'] 未结束，只计入total
+        """
+        self.create_rds('0', end_time=timezone.now())
+        self.create_rds('1', end_time=timezone.now())
+        self.create_rds('-2', end_time=timezone.now())
+        self.assertEqual(self.get_statistics(), (4, 3, 1, 1, 1))
+
+    def test_update_rds_update_statistics(self):
+        rds = self.create_rds('0', end_time=timezone.now())
+        rds.job_assessment_value = '1'
+        rds.save()
+        self.assertEqual(self.get_statistics(), (2, 1, 0, 1, 0))
+
+        rds.end_time = None
+        rds.save()
+        self.assertEqual(self.get_statistics(), (2, 0, 0, 0, 0))
+
+    def test_change_tboard_relation_update_statistics(self):
+        tboard_for_test = TBoard.objects.create(
+            author=self.default_data['user'],
+            board_stamp=timezone.now()
+        )
+        rds = self.create_rds('0', end_time=timezone.now())
+        rds.tboard = tboard_for_test
+        rds.save()
+        self.assertEqual(self.get_statistics(), (1, 0, 0, 0, 0))
+        self.assertEqual(self.get_statistics(tboard_for_test.id), (1, 1, 1, 0, 0))
+
+    def test_delete_rds_update_statistics(self):
+        rds = self.create_rds('1', end_time=timezone.now())
+        rds.delete()
+        self.assertEqual(self.get_statistics(), (1, 0, 0, 0, 0))
+
+    def test_rebuild_command_fix_statistics(self):
+        self.create_rds('0', end_time=timezone.now())
+        TBoardStatistics.objects.filter(tboard_id=self.tboard.id).update(total=100, success=0)
+        call_command('rebuild_tboard_statistics', tboard=[self.tboard.id])
+        self.assertEqual(self.get_statistics(), (2, 1, 1, 0, 0))
+        self.assertEqual(TBoard.objects.get(id=self.tboard.id).success_ratio, 1.0)
+
+    def test_queryset_update_unrelated_field_skip_rebuild(self):
+        rds = self.create_rds('0', end_time=timezone.now())
+        TBoardStatistics.objects.filter(tboard_id=self.tboard.id).update(total=100, success=0)
+        # 只更新耗电量不影响计数，不重算
+        Rds.objects.filter(id=rds.id).update(power_consumption=10)
+        self.assertEqual(self.get_statistics(), (100, 1, 0, 0, 0))
+
+        Rds.objects.filter(id=rds.id).update(job_assessment_value='1')
+        self.assertEqual(self.get_statistics(), (2, 1, 0, 1, 0))
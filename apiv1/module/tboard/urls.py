@@ -11,7 +11,7 @@ from apiv1.module.tboard.views.get_data_view_calendar import GetDataViewCalendar
 from apiv1.module.tboard.views.get_data_view_summery import GetDataViewSummeryView
 from apiv1.module.tboard.views.get_perf_data_view import GetPerfTboardDetailData, GetPerfDataJobData, \
     GetPerfDataPhoneModelData, GetPerfDataChart, GetPerfDataBarChart, GetSingleDevicePerfTableData, \
-    GetPerfDataTimeBarChart, GetXlsData, PerfDataPreviewView
+    GetPerfDataTimeBarChart, GetXlsData, GetXlsDataProgress, PerfDataPreviewView
 from apiv1.module.tboard.viewset import DynamicTBoardViewSet, TBoardStatisticsResultViewSet
 
 router = routers.ReefDefaultRouter()
@@ -127,6 +127,11 @@ urlpatterns = [
         GetXlsData.as_view(),
         name='get_xls_data'  # 获取性能测试结果的excel文件下载
     ),
+    path(
+        'cedar/get_xls_data_progress/',
+        GetXlsDataProgress.as_view(),
+        name='get_xls_data_progress'  # 查询异步产生excel文件的进度
+    ),
 
     path(
         'cedar/get_single_device_table_data/',
@@ -1,15 +1,11 @@
-import collections, copy, re, time, os
+import collections, copy, re, os
 import math
 import random
-from datetime import datetime
-from typing import List, Dict
 from pathlib import Path
 from functools import reduce
 
-import requests
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from django.db.models import QuerySet, Count, Q
+from django.db import transaction
+from django.db.models import Count, Q, F
 from django.utils import timezone
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
@@ -20,32 +16,31 @@ from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.throttling import AnonRateThrottle
 
-from apiv1.core.cache import cache_dcr
-from apiv1.core.constants import JOB_TYPE_UNIQ, POWER_CONSUMPTION_ERROR_CODE, TEMP_CONSUMPTION_ERROR_CODE, \
-    TBOARD_DELETE_FAIL_GROUP, REDIS_TBOARD_DELETE, REDIS_TBOARD_DELETE_FAIL, REDIS_CACHE_GET_TBOARD_STATISTIC, \
+from apiv1.core.cache import cache_dcr, cache_tag
+from apiv1.core.constants import JOB_TYPE_UNIQ, TBOARD_DELETE_FAIL_GROUP, REDIS_CACHE_GET_TBOARD_STATISTIC, \
     DEVICE_STATUS_IDLE, DEVICE_STATUS_BUSY, COOLPAD_GET_CRUMB, COOLPAD_UPLOAD_TBOARD_DATA
 from apiv1.core.factory import init_open_module_factory, check_func_execute
-from apiv1.core.request import ReefRequest
+from apiv1.core.request import coral_fan_out, coral_request, coral_transfer_executor
 from apiv1.core.response import reef_400_response, ReefResponse, reef_500_response
 from apiv1.core.status import StatusCode
 from apiv1.core.utils import update_device_matching_rule, OpenAPIAnonRateThrottle, date_format_transverter, ReefLogger, \
     join_path
 from apiv1.core.tool import Checkout, ReefFTP
 from apiv1.core.view.generic import AutoExecuteSerializerGenericAPIView
-from apiv1.module.device.models import Device, DevicePower, DeviceTemperature
+from apiv1.module.device.models import Device
 from apiv1.module.device.signal import update_device_status
+from apiv1.module.job.business import get_job_manifests, job_dispatch_info
 from apiv1.module.job.models import Job, JobParameter
 from apiv1.module.rds.models import Rds
 from apiv1.module.system.models import Cabinet
-from apiv1.module.tboard.models import TBoard
+from apiv1.module.tboard.models import TBoard, TBoardStatistics
 from apiv1.module.tboard.serializer import CreateTBoardSerializer, EndTBoardSerializer, TBoardRunningDetailSerializer, \
     GetTboardStatisticsSerializer, GetJobPriorTboardSerializer, RepeatExecuteTBoardSerializer, \
     GetTBoardFieldsSerializer, TBoardSerializer, CreateRepeatTBoardSerializer, RepeatExecuteTBoardCheckSerializer, \
     ReleaseBusyDeviceSerializer, CoolPadCreateTBoardSerializer, OpenCreateTBoardSerializer
-from apiv1.module.tboard.tasks.tasks import get_hash_data_in_redis, sorted_data, tboard_delete, \
-    prepare_tboard_report_cache
-from reef import settings
-from reef.settings import redis_connect, JOB_RES_FILE_EXPORT_PATH, MEDIA_ROOT
+from apiv1.module.tboard.tasks.tasks import tboard_delete, update_tboard_consumption_task, send_delta, \
+    tboard_delete_index, tboard_delete_fail_index
+from reef.settings import JOB_RES_FILE_EXPORT_PATH, MEDIA_ROOT
 
 
 class CreateTBoardView(generics.GenericAPIView):
@@ -108,7 +103,6 @@ class EndTBoardView(generics.GenericAPIView):
         若范围内查无电量/温度信息，则视为数据异常处理。
         """
         if tboard.finished_flag:
-            search_timedelta = timezone.timedelta(minutes=1)
             # Not uniq job in tboard, Not compute power data and temp data
             if not Job.objects.filter(tboardjob__tboard_id=tboard.id).filter(job_type=JOB_TYPE_UNIQ).exists():
                 if tboard.belong == 'coolpad':
@@ -118,104 +112,8 @@ class EndTBoardView(generics.GenericAPIView):
                     check_func_execute(obj, 'crete_statistics_xlsx', tboard)
                 return Response(self.get_serializer(tboard).data)
 
-            devices: List[int] = Device.objects. \
-                filter(tboard=tboard.id). \
-                order_by("id"). \
-                values_list("id", flat=True)
-
-            rdss: List[Dict] = Rds.objects. \
-                filter(tboard=tboard.id). \
-                filter(device__in=devices). \
-                filter(job__job_type=JOB_TYPE_UNIQ). \
-                order_by("device_id", "start_time"). \
-                values("id", "device_id", "start_time", "end_time")
-
-            if len(rdss) == 0:
-                return Response(self.get_serializer(tboard).data)
-
-            start_time: datetime = min(rdss, key=lambda item: item["start_time"])["start_time"]
-            end_time: datetime = max(rdss, key=lambda item: item["end_time"])["end_time"]
-
-            devicepowers: List[Dict] = DevicePower.objects. \
-                filter(record_datetime__gte=start_time - search_timedelta). \
-                filter(record_datetime__lte=end_time + search_timedelta). \
-                filter(device_id__in=devices). \
-                order_by("device_id", "record_datetime"). \
-                values("device_id", "battery_level", "record_datetime")
-
-            time.sleep(1)  # device temperature 每隔1s往数据库推送一次数据
-            devicetemps: List[Dict] = DeviceTemperature.objects. \
-                filter(record_datetime__gte=start_time - search_timedelta). \
-                filter(record_datetime__lte=end_time + search_timedelta). \
-                filter(device_id__in=devices). \
-                order_by("device_id", "record_datetime"). \
-                values("device_id", "temperature", "record_datetime")
-
-            update_list = []
-            for rds in rdss:
-                start_battery_level = None
-                end_battery_level = None
-                start_temperature = None
-                end_temperature = None
-
-                # device_power
-                for i in range(len(devicepowers) - 1, -1, -1):
-                    devicepower = devicepowers[i]
-                    if rds["device_id"] == devicepower["device_id"]:
-                        if _time_in_range(
-                                devicepower["record_datetime"],
-                                rds["start_time"],
-                                rds["start_time"] - search_timedelta):
-                            start_battery_level = devicepower["battery_level"]
-                            break
-
-                for i in range(0, len(devicepowers)):
-                    devicepower = devicepowers[i]
-                    if rds["device_id"] == devicepower["device_id"]:
-                        if _time_in_range(
-                                devicepower["record_datetime"],
-                                rds["end_time"],
-                                rds["end_time"] + search_timedelta):
-                            end_battery_level = devicepower["battery_level"]
-                            break
-
-                # device_temp
-                for i in range(len(devicetemps) - 1, -1, -1):
-                    devicetemp = devicetemps[i]
-                    if rds["device_id"] == devicetemp["device_id"]:
-                        if _time_in_range(
-                                devicetemp["record_datetime"],
-                                rds["start_time"],
-                                rds["start_time"] - search_timedelta):
-                            start_temperature = devicetemp["temperature"]
-                            break
-
-                for i in range(0, len(devicetemps)):
-                    devicetemp = devicetemps[i]
-                    if rds["device_id"] == devicetemp["device_id"]:
-                        if _time_in_range(
-                                devicetemp["record_datetime"],
-                                rds["end_time"],
-                                rds["end_time"] + search_timedelta):
-                            end_temperature = devicetemp["temperature"]
-                            break
-
-                update_list.append(
-                    Rds(
-                        id=rds["id"],
-                        power_consumption=POWER_CONSUMPTION_ERROR_CODE
-                        if start_battery_level is None or end_battery_level is None
-                        else start_battery_level - end_battery_level,
-                        temp_consumption=TEMP_CONSUMPTION_ERROR_CODE
-                        if start_temperature is None or end_temperature is None
-                        else start_temperature - end_temperature
-                    )
-                )
-
-            Rds.objects.bulk_update(update_list, ("power_consumption", "temp_consumption"), batch_size=100)
-
-            # 预热统计缓存
-            prepare_tboard_report_cache.delay(tboard.id)
+            # 在请求外以celery计算，延迟1s执行: device temperature 每隔1s往数据库推送一次数据
+            transaction.on_commit(lambda: update_tboard_consumption_task.apply_async((tboard.id,), countdown=1))
         return Response(self.get_serializer(tboard).data)
 
 
@@ -240,99 +138,59 @@ class GetTboardRunningDetailView(generics.GenericAPIView):
         return_data = TBoardRunningDetailSerializer(instance=tboard).data
 
         # 对job数据进行去重处理
-        jobs = []
-        _ = [jobs.append(job) for job in return_data['jobs'] if job not in jobs]
-        return_data['jobs'] = jobs
-
-        job_totals = _to_dict(Rds.objects.filter(
-            tboard=tboard_id,
-            end_time__isnull=False
-        ).values(
-            'job_id'
-        ).annotate(
-            total=Count('job_id'),
-        ), 'job_id', 'total')
-
-        job_passses = _to_dict(Rds.objects.filter(
-            tboard=tboard_id,
-            end_time__isnull=False,
-        ).values(
-            'job_id'
-        ).annotate(
-            passs=Count('job_id', filter=Q(job_assessment_value='0')),
-        ), 'job_id', 'passs')
-
-        job_fails = _to_dict(Rds.objects.filter(
-            tboard=tboard_id,
-            end_time__isnull=False,
-        ).values(
-            'job_id'
-        ).annotate(
-            fail=Count('job_id', filter=Q(job_assessment_value='1')),
-        ), 'job_id', 'fail')
-
-        devices = _to_dict(Device.objects.filter(
-            tboard=tboard_id
-        ).values('id', 'device_name'), 'id', 'device_name')
+        jobs = {}
+        for job in return_data['jobs']:
+            jobs.setdefault(job['id'], job)
+        return_data['jobs'] = list(jobs.values())
+        for job in return_data['jobs']:
+            job.update({'total': 0, 'pass': 0, 'fail': 0, 'devices': []})
 
-        device_passses = _to_dict(Rds.objects.filter(
+        # 一次查询取得每个(device, job)已结束Rds的pass/fail/na计数，job的计数由其累加得到
+        counters = Rds.objects.filter(
             tboard=tboard_id,
             end_time__isnull=False
         ).values(
             'device_id', 'job_id'
         ).annotate(
-            passs=Count('device_id', filter=Q(job_assessment_value='0'))
-        ), ('device_id', 'job_id'), 'passs')
+            passs=Count('id', filter=Q(job_assessment_value='0')),
+            fail=Count('id', filter=Q(job_assessment_value='1')),
+            na=Count('id', filter=~(Q(job_assessment_value='0') | Q(job_assessment_value='1'))),
+        )
 
-        device_fails = _to_dict(Rds.objects.filter(
-            tboard=tboard_id,
-            end_time__isnull=False
-        ).values(
-            'device_id', 'job_id'
-        ).annotate(
-            fail=Count('device_id', filter=Q(job_assessment_value='1'))
-        ), ('device_id', 'job_id'), 'fail')
+        devices = {device['id']: device for device in return_data['devices']}
+        device_order = {device_id: index for index, device_id in enumerate(devices)}
+        for counter in counters:
+            job = jobs.get(counter['job_id'])
+            if job is None:
+                continue
+            job['total'] += counter['passs'] + counter['fail'] + counter['na']
+            job['pass'] += counter['passs']
+            job['fail'] += counter['fail']
 
-        device_nas = _to_dict(Rds.objects.filter(
-            tboard=tboard_id,
-            end_time__isnull=False
-        ).values(
-            'device_id', 'job_id'
-        ).annotate(
-            na=Count('device_id', filter=~(Q(job_assessment_value='0') | Q(job_assessment_value='1')))
-        ), ('device_id', 'job_id'), 'na')
+            device = devices.get(counter['device_id'])
+            if device is None:
+                continue
+            device['has_rds'] = True
+            job['devices'].append({
+                'id': device['id'],
+                'device_name': device['device_name'],
+                'pass': counter['passs'],
+                'fail': counter['fail'],
+                'na': counter['na']
+            })
 
         for job in return_data['jobs']:
-            job_id = job.get('id')
-            job['total'] = job_totals.get(job_id, 0)
-            job['pass'] = job_passses.get(job_id, 0)
-            job['fail'] = job_fails.get(job_id, 0)
             job['na'] = job['total'] - job['pass'] - job['fail']
             job['failure'] = float(
                 '{:.2f}'.format(
                     job['fail'] / (job['pass'] + job['fail'])
                 )
             ) if job['pass'] + job['fail'] > 0 else 0
-            job['devices'] = []
-
-            for device in return_data['devices']:
-                device_id = device['id']
-                key = (device_id, job_id)
-                passs = device_passses.get(key, None)
-                fail = device_fails.get(key, None)
-                na = device_nas.get(key, None)
-                if (passs is None) and (fail is None) and (na is None):
-                    continue
-                device['has_rds'] = True
-                dic = {
-                    'id': device_id,
-                    'device_name': devices.get(device_id),
-                    'pass': passs,
-                    'fail': fail,
-                    'na': na
-                }
-                job['devices'].append(dic)
+            # job下的devices与外层devices顺序保持一致
+            job['devices'].sort(key=lambda item: device_order[item['id']])
 
+        # 外层的devices为各job下devices的联集
+        if return_data['jobs']:
             return_data['devices'] = [device for device in return_data['devices'] if device['has_rds']]
 
         return Response(return_data, status=status.HTTP_200_OK)
@@ -347,26 +205,24 @@ class GetTboardStatisticsView(generics.GenericAPIView):
 
     @swagger_auto_schema(manual_parameters=[tboard_id])
     @action(detail=True, methods=['get'])
-    @cache_dcr(key_leading=REDIS_CACHE_GET_TBOARD_STATISTIC, ttl_in_second=300)
+    @cache_dcr(key_leading=REDIS_CACHE_GET_TBOARD_STATISTIC, ttl_in_second=86400 * 7, tags=lambda request: [
+        cache_tag('rds', tboard=request.query_params.get('tboard_id')),
+        cache_tag('tboard', tboard=request.query_params.get('tboard_id')),
+    ])
     def get(self, request: Request):
         tboard_id = request.query_params.get('tboard_id', None)
         if tboard_id is None:
             return Response({'error': 'Need url param "tboard_id"!'}, status=status.HTTP_400_BAD_REQUEST)
 
         tboard = get_object_or_404(TBoard.objects.all(), id=tboard_id)
-        tboard_statistics = TBoard.objects.filter(
-            id=tboard_id,
-            rds__end_time__isnull=False
-        ).aggregate(
-            total=Count('rds'),
-            success=Count('rds', Q(rds__job_assessment_value='0')),
-            fail=Count('rds', Q(rds__job_assessment_value='1')),
-        )
-        for k, v in tboard_statistics.items():
-            setattr(tboard, k, v)
-        tboard.na = tboard_statistics['total'] - tboard_statistics['success'] - tboard_statistics['fail']
-        tboard.failure = tboard_statistics['fail'] / (tboard_statistics['success'] + tboard_statistics['fail']) \
-            if (tboard_statistics['success'] + tboard_statistics['fail']) != 0 else 0
+        # 计数由Rds signal增量维护，这里只统计已结束的Rds
+        tboard_statistics = TBoardStatistics.objects.filter(tboard_id=tboard_id).first() or TBoardStatistics()
+        tboard.total = tboard_statistics.finished
+        tboard.success = tboard_statistics.success
+        tboard.fail = tboard_statistics.fail
+        tboard.na = tboard_statistics.na
+        tboard.failure = tboard.fail / (tboard.success + tboard.fail) \
+            if (tboard.success + tboard.fail) != 0 else 0
         tboard.failure = f'{tboard.failure:.2f}'
 
         return Response(GetTboardStatisticsSerializer(instance=tboard).data)
@@ -397,10 +253,10 @@ class GetTboardProgressView(generics.GenericAPIView):
         if not tboard_ids:
             return Response({'error': 'Lack of effective tboard id'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 根据tboard分组获取完成的rds数量
+        # 完成的rds数量直接读取TBoardStatistics计数
         rds_queryset = list(
-            Rds.objects.filter(tboard_id__in=tboard_ids).exclude(end_time=None).values('tboard_id').annotate(
-                rds_finished_count=Count('tboard_id')))
+            TBoardStatistics.objects.filter(tboard_id__in=tboard_ids).values('tboard_id').annotate(
+                rds_finished_count=F('finished')))
         # 将还没有rds数据的tboard 添加到查询列表中
         if len(rds_queryset) != len(tboard_ids):
             # 比较差值
@@ -695,21 +551,26 @@ class RemoveTBoard(generics.GenericAPIView):
         running_cabinet = [cabinet_id for cabinet_id, running_status in tboard.cabinet_dict.items() if
                            running_status == 1]
 
+        cabinet_ips = dict(Cabinet.objects.filter(id__in=running_cabinet).values_list('id', 'ip_address'))
+        ip_cabinet_ids = {cabinet_ips[int(cabinet_id)]: cabinet_id for cabinet_id in running_cabinet}
+
+        def remove_tboard(ip):
+            res = coral_request(ip, 'delete', f'/tboard/remove_tboard/{tboard_id}/', timeout=30)
+            job_parameter = None
+            if res.status_code != 500:
+                job_parameter = res.json().get('data', {"message": "job parameter not message"})
+            return res.status_code, job_parameter
+
         res_status_code = {}
         job_parameter = None
-        for ip, cabinet_id in [(Cabinet.objects.get(id=cabinet_id).ip_address, cabinet_id) for cabinet_id in running_cabinet]:
-            try:
-                res = requests.delete(
-                    f"http://{ip}:{settings.CORAL_PORT}/tboard/remove_tboard/{tboard_id}/",
-                    timeout=30
-                )
-                res_status_code.update({ip: (res.status_code, cabinet_id)})
-                if res.status_code != 500:
-                    job_parameter = res.json().get('data', {"message": "job parameter not message"})
-                # 模拟返回数据用作测试
-                # res_status_code.update({ip: (random.choice([200, 500]), cabinet_id)})
-            except OSError:
-                res_status_code.update({ip: (500, cabinet_id)})
+        for ip, result in coral_fan_out(remove_tboard, ip_cabinet_ids, deadline=35).items():
+            if isinstance(result, Exception):
+                res_status_code.update({ip: (500, ip_cabinet_ids[ip])})
+                continue
+            status_code, coral_job_parameter = result
+            res_status_code.update({ip: (status_code, ip_cabinet_ids[ip])})
+            if status_code != 500:
+                job_parameter = coral_job_parameter
         # 临时将job tboard 运行参数数据写入到文件中
         import json
         file_path = MEDIA_ROOT + '/job_parameter.log'
@@ -772,10 +633,10 @@ class DeleteTBoard(generics.GenericAPIView):
 
         celery异步删除tboard，删除tboard的信息推送到redis，websocket推送消息
 
-        redis存储数据结构：hash
+        redis存储数据结构：hash，并以sorted set(tboard:delete:index, tboard:deleted_fail:index)记录hash的id
              删除中心列表 ：tboard删除状态有3种： to_be_delete、deleting、deleted
                             存储结构如下：
-                                          key：tboard_delete_{tboard_id}
+                                          key：tboard:delete:{tboard_id}
                                           value：{
                                                 'id': id,
                                                 'board_name': .board_name,
@@ -788,7 +649,7 @@ class DeleteTBoard(generics.GenericAPIView):
 
              删除失败列表 ：删除失败内部提供retry机制，retry失败则会进入删除失败列表
                             存储结构如下：
-                                          key：tboard_deleted_fail_{tboard_id}
+                                          key：tboard:deleted_fail:{tboard_id}
                                           value：{
                                                 'id': id,
                                                 'board_name': .board_name,
@@ -797,7 +658,7 @@ class DeleteTBoard(generics.GenericAPIView):
                                                 'author': tboard.author,
                                                 'record_time': timezone.now
                                           }
-        websocket：数据通过socket连接，实时推送消息
+        websocket：数据通过socket连接，连接时推送完整列表，之后只推送变化的数据
                    有2个consumer ：TBoardDeleteConsumer（删除中心列表）
                                    BoardDeleteFailConsumer（删除失败列表）
 
@@ -812,26 +673,18 @@ class DeleteTBoard(generics.GenericAPIView):
         # 如果tboard is_to_delete字段为true，则说明该tboard为删除失败重试，失败重试的数据从reids移除
         retry_ids = tboards.filter(is_to_delete=True).values_list('id', flat=True)
         if retry_ids:
-            redis_connect.delete(*[f'{REDIS_TBOARD_DELETE_FAIL}:{retry_id}' for retry_id in retry_ids])
+            tboard_delete_fail_index.delete(*retry_ids)
 
-            # 向删除列表发送一次消息，更新删除列表
-            tboard_deleted_fail_message = get_hash_data_in_redis(f'{REDIS_TBOARD_DELETE_FAIL}:*')
-            message = sorted_data(
-                tboard_deleted_fail_message,
-                lambda e: (e.__getitem__('record_time'))
-            )
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(TBOARD_DELETE_FAIL_GROUP, {
-                "type": "send_message",
-                "message": message
-            })
+            # 向删除列表发送消息，更新删除列表
+            for retry_id in retry_ids:
+                send_delta(TBOARD_DELETE_FAIL_GROUP, 'remove', item_id=retry_id)
 
         # 将tboard is_to_delete状态置为True
         tboards.update(is_to_delete=True)
 
         # 将要删除的Tboard的数据往redis里面存一份
         for tboard in tboards:
-            redis_connect.hmset(f'{REDIS_TBOARD_DELETE}:{tboard.id}', {
+            tboard_delete_index.set(tboard.id, {
                 'id': tboard.id,
                 'board_name': tboard.board_name,
                 'board_stamp': tboard.board_stamp.strftime('%Y-%m-%d %H:%M:%S'),
@@ -970,8 +823,8 @@ class RepeatExecuteTBoardView(generics.GenericAPIView):
         }
 
         try:
-            res = requests.post(
-                f"http://{device.cabinet.ip_address}:{settings.CORAL_PORT}/tboard/insert_tboard/",
+            res = coral_request(
+                device.cabinet.ip_address, 'post', '/tboard/insert_tboard/',
                 json={**post_data, 'device_label_list': [device.device_label]}
             )
             if res.status_code != 200:
@@ -1043,19 +896,6 @@ class ReleaseBusyDeviceView(generics.GenericAPIView):
 # helper function                                    #
 ######################################################
 
-def _to_dict(data: QuerySet, key_names, value_key):
-    if isinstance(key_names, str):
-        return {dic[key_names]: dic[value_key] for dic in list(data)}
-    elif isinstance(key_names, tuple):
-        return {tuple([dic[key] for key in key_names]): dic[value_key] for dic in list(data)}
-
-    assert False, 'Params is invalid for function _to_dict'
-
-
-def _time_in_range(target: datetime, datetime1: datetime, datetime2: datetime) -> bool:
-    return min(datetime1, datetime2) <= target <= max(datetime1, datetime2)
-
-
 def prefix_dict(di_, prefix_s=''):
     """
     把字典的每个key都带上前缀prefix_s
@@ -1228,54 +1068,56 @@ def handle_insert_tboard_res(res_status_code, device_cabinet_ips, tboard):
         )
 
 
+def coral_status_codes(results):
+    """
+    将coral_fan_out的结果转为 {ip: status_code}，请求失败或超时记为500
+    """
+    res_status_code = {}
+    for ip, result in results.items():
+        if isinstance(result, Exception):
+            res_status_code[ip] = 500
+        else:
+            res_status_code[ip] = result if isinstance(result, int) else result.status_code
+    return res_status_code
+
+
+def log_coral_request_error(ip, body, e):
+    reef_logger = ReefLogger('debug')
+    reef_logger.debug(
+        f"\n"
+        f"{'-' * 50}\n"
+        f"Info: {{'coral_ip': {ip}, 'body': {body}}}\n"
+        f"Exception info: {e}\n"
+    )
+
+
 def insert_tboard_request(tboard, job_list, device_cabinet_ips, create_level):
+    manifests = get_job_manifests(jobs=job_list)
     post_data = {
         'tboard_id': tboard.id,
         'create_level': create_level,
         'owner_label': str(tboard.author.id),
         'job_random_order': tboard.job_random_order,
-        'jobs': [
-            {
-                'job_label': job.job_label,
-                'flow_execute_mode': job.flow_execute_mode,
-                'updated_time': job.updated_time.strftime('%Y-%m-%d %H:%M:%S'),
-                'url': f'/media/job_res_file_export/{job.job_label}.zip',
-                'job_flows': [
-                    {
-                        'id': job_flow.id,
-                        'order': job_flow.order,
-                        'name': job_flow.name
-                    } for job_flow in job.job_flow.all()
-                ],
-                'inner_job': [
-                    {
-                        'job_label': inner_flow.job.job_label,
-                        'updated_time': inner_flow.job.updated_time.strftime('%Y-%m-%d %H:%M:%S'),
-                        'url': f'/media/job_res_file_export/{inner_flow.job.job_label}.zip',
-                    } for job_flow in job.job_flow.all() for inner_flow in job_flow.inner_flow.all()
-                ]
-            } for job in job_list
-        ],
+        'jobs': [job_dispatch_info(manifests[job.id]) for job in job_list],
         'board_name': tboard.board_name,
         'repeat_time': tboard.repeat_time
     }
 
-    res_status_code = {}
-    for ip in device_cabinet_ips:
-        try:
-            res = requests.post(
-                f"http://{ip}:{settings.CORAL_PORT}/tboard/insert_tboard/",
-                json={**post_data, 'device_label_list': [device.device_label for device in device_cabinet_ips[ip]]},
-                timeout=2
-            )
-            res_status_code.update({ip: res.status_code})
-        except OSError:
-            res_status_code.update({ip: 500})
-    return res_status_code
+    bodies = {
+        ip: {**post_data, 'device_label_list': [device.device_label for device in device_cabinet_ips[ip]]}
+        for ip in device_cabinet_ips
+    }
+    results = coral_fan_out(
+        lambda ip: coral_request(ip, 'post', '/tboard/insert_tboard/', json=bodies[ip], timeout=2),
+        bodies,
+        deadline=5
+    )
+    return coral_status_codes(results)
 
 
 def job_parameter_insert_tboard_request(ftp_path, local_path, tboard, job_data_list, device_cabinet_ips, special_job, create_level):
     # job_data_list: [(job obj, parameter)]
+    manifests = get_job_manifests(jobs=[job for job, _ in job_data_list] + [special_job])
     post_data = {
         'tboard_id': tboard.id,
         'create_level': create_level,
@@ -1283,24 +1125,7 @@ def job_parameter_insert_tboard_request(ftp_path, local_path, tboard, job_data_l
         'job_random_order': tboard.job_random_order,
         'jobs': [
             {
-                'job_label': job.job_label,
-                'flow_execute_mode': job.flow_execute_mode,
-                'updated_time': job.updated_time.strftime('%Y-%m-%d %H:%M:%S'),
-                'url': f'/media/job_res_file_export/{job.job_label}.zip',
-                'job_flows': [
-                    {
-                        'id': job_flow.id,
-                        'order': job_flow.order,
-                        'name': job_flow.name
-                    } for job_flow in job.job_flow.all()
-                ],
-                'inner_job': [
-                    {
-                        'job_label': inner_flow.job.job_label,
-                        'updated_time': inner_flow.job.updated_time.strftime('%Y-%m-%d %H:%M:%S'),
-                        'url': f'/media/job_res_file_export/{inner_flow.job.job_label}.zip',
-                    } for job_flow in job.job_flow.all() for inner_flow in job_flow.inner_flow.all()
-                ],
+                **job_dispatch_info(manifests[job.id]),
                 'job_parameter': parameter,
                 'is_support_parameter': job.is_support_parameter
             } for job, parameter in job_data_list
@@ -1309,47 +1134,27 @@ def job_parameter_insert_tboard_request(ftp_path, local_path, tboard, job_data_l
         'repeat_time': tboard.repeat_time
     }
 
-    special_job_info = {
-        'job_label': special_job.job_label,
-        'flow_execute_mode': special_job.flow_execute_mode,
-        'updated_time': special_job.updated_time.strftime('%Y-%m-%d %H:%M:%S'),
-        'url': f'/media/job_res_file_export/{special_job.job_label}.zip',
-        'job_flows': [
-            {
-                'id': job_flow.id,
-                'order': job_flow.order,
-                'name': job_flow.name
-            } for job_flow in special_job.job_flow.all()
-        ],
-        'inner_job': [
-            {
-                'job_label': inner_flow.job.job_label,
-                'updated_time': inner_flow.job.updated_time.strftime('%Y-%m-%d %H:%M:%S'),
-                'url': f'/media/job_res_file_export/{inner_flow.job.job_label}.zip',
-            } for job_flow in special_job.job_flow.all() for inner_flow in job_flow.inner_flow.all()
-        ],
-    }
+    special_job_info = job_dispatch_info(manifests[special_job.id])
 
-    res_status_code = {}
-    for ip in device_cabinet_ips:
+    def insert_tboard(ip):
         # coral 创建对应目录
-        url = f"http://{ip}:{settings.CORAL_PORT}/pane/mk_dir/"
         # 容器内创建，根目录是app。scp 到宿主机 根目录是TMach_source
         coral_file_path = join_path('/app/source/rom', ftp_path)
         body = {'dir_path': coral_file_path}
-        req = ReefRequest(url, **{"json": body, "timeout": 3})
-        rep = req.post({"coral_ip": ip, "body": body})
-        status_code = getattr(rep, 'status_code', None)
+        status_code = None
+        try:
+            status_code = coral_request(ip, 'post', '/pane/mk_dir/', json=body, timeout=3).status_code
+        except Exception as e:
+            log_coral_request_error(ip, body, e)
         # coral 创建对应目录失败不执行scp，不下发任务
-        if rep is None or rep.status_code != 200:
+        if status_code != 200:
             log_content = f"coral create dir error: \n" \
                           f"coarl ip: {ip}\n" \
                           f"rep status_code: {status_code}\n" \
                           f"coral file path: {coral_file_path}"
             logger = ReefLogger('debug')
             logger.error(log_content)
-            res_status_code.update({ip: 500})
-            continue
+            return 500
         # scp 刷机包到 coral
         try:
             coral_file_path = coral_file_path.replace('app', 'TMach_source', 1)
@@ -1362,8 +1167,7 @@ def job_parameter_insert_tboard_request(ftp_path, local_path, tboard, job_data_l
                               f"coral path: {coral_file_path}"
                 logger = ReefLogger('debug')
                 logger.error(log_content)
-                res_status_code.update({ip: 500})
-                continue
+                return 500
         except Exception as e:
             log_content = f"scp file to coral error:\n" \
                           f"local_path: {local_path}\n" \
@@ -1372,22 +1176,21 @@ def job_parameter_insert_tboard_request(ftp_path, local_path, tboard, job_data_l
                           f"exception info: {e}"
             logger = ReefLogger('debug')
             logger.error(log_content)
-            res_status_code.update({ip: 500})
-            continue
+            return 500
         # 下发任务
-        url = f"http://{ip}:{settings.CORAL_PORT}/tboard/insert_tboard/"
         body = {**post_data,
-                'device_label_list': [device.device_label for device in device_cabinet_ips[ip]],
+                'device_label_list': device_labels[ip],
                 'special_job_info': special_job_info
                 }
-        req = ReefRequest(url, **{"json": body, "timeout": 3})
-        rep = req.post({"coral_ip": ip, "body": body})
-        if rep is None:
-            res_status_code.update({ip: 500})
-            continue
-        res_status_code.update({ip: rep.status_code})
+        try:
+            return coral_request(ip, 'post', '/tboard/insert_tboard/', json=body, timeout=3).status_code
+        except Exception as e:
+            log_coral_request_error(ip, body, e)
+            return 500
 
-    return res_status_code
+    device_labels = {ip: [device.device_label for device in device_cabinet_ips[ip]] for ip in device_cabinet_ips}
+    # scp刷机包的耗时无法预估，在独立线程池中等待所有coral完成，避免回报失败后任务仍被下发
+    return coral_status_codes(coral_fan_out(insert_tboard, device_labels, executor=coral_transfer_executor))
 
 
 def temp_job_parameter_insert_tboard_request(tboard, tboard_parameter, device_cabinet_ips, create_level):
@@ -1395,18 +1198,19 @@ def temp_job_parameter_insert_tboard_request(tboard, tboard_parameter, device_ca
     tboard_parameter['tboard_id'] = tboard.id
     post_data = tboard_parameter
 
-    res_status_code = {}
-    for ip in device_cabinet_ips:
-        url = f"http://{ip}:{settings.CORAL_PORT}/tboard/insert_tboard/"
-        body = {**post_data, 'device_label_list': [device.device_label for device in device_cabinet_ips[ip]]}
-        req = ReefRequest(url, **{"json": body, "timeout": 3})
-        rep = req.post({"coral_ip": ip, "body": body})
-        if rep is None:
-            res_status_code.update({ip: 500})
-            continue
-        res_status_code.update({ip: rep.status_code})
+    bodies = {
+        ip: {**post_data, 'device_label_list': [device.device_label for device in device_cabinet_ips[ip]]}
+        for ip in device_cabinet_ips
+    }
 
-    return res_status_code
+    def insert_tboard(ip):
+        try:
+            return coral_request(ip, 'post', '/tboard/insert_tboard/', json=bodies[ip], timeout=3)
+        except Exception as e:
+            log_coral_request_error(ip, bodies[ip], e)
+            raise
+
+    return coral_status_codes(coral_fan_out(insert_tboard, bodies, deadline=5))
 
 
 def job_prior_insert_tboard(tboard, job_prjob_data, device_cabinet_ips, create_level):
@@ -1418,24 +1222,24 @@ def job_prior_insert_tboard(tboard, job_prjob_data, device_cabinet_ips, create_l
         'device_mapping': [],
         'job_random_order': tboard.job_random_order,
     }
-    res_status_code = {}
-    for ip in device_cabinet_ips:
-        post_data['device_mapping'] = [
-            {
-                'device_label': device.device_label,
-                'job': get_job_info(job_prjob_data.get(device.device_label, []))
-            }
-            for device in device_cabinet_ips[ip]
-        ]
-        try:
-            res = requests.post(
-                f"http://{ip}:{settings.CORAL_PORT}/tboard/insert_tboard/",
-                json={**post_data}
-            )
-            res_status_code.update({ip: res.status_code})
-        except OSError:
-            res_status_code.update({ip: 500})
-    return res_status_code
+    bodies = {
+        ip: {
+            **post_data,
+            'device_mapping': [
+                {
+                    'device_label': device.device_label,
+                    'job': get_job_info(job_prjob_data.get(device.device_label, []))
+                }
+                for device in device_cabinet_ips[ip]
+            ]
+        } for ip in device_cabinet_ips
+    }
+    results = coral_fan_out(
+        lambda ip: coral_request(ip, 'post', '/tboard/insert_tboard/', json=bodies[ip], timeout=3),
+        bodies,
+        deadline=5
+    )
+    return coral_status_codes(results)
 
 
 def get_job_info(job_obj_list):
@@ -315,32 +315,58 @@ def filter_rds_data(tboard, queryset, device=None, job=None):
     return result
 
 
+def data_view_conditions(tboard_id: int = None, start_date: date = None, end_date: date = None,
+                         device_id: int = None, job_id: int = None, devices: List[int] = None,
+                         jobs: List[int] = None):
+    """
+    数据统计页面共用的RdsDailyStatistics筛选条件
+    回传 (以and开头、可直接接在where true之后的条件, 参数)
+    """
+    conds, params = [], []
+    if tboard_id:
+        conds.append("tboard_id = %s")
+        params.append(tboard_id)
+    if start_date:
+        conds.append("day >= %s")
+        params.append(start_date)
+    if end_date:
+        conds.append("day <= %s")
+        params.append(end_date)
+    if device_id:
+        conds.append("device_id = %s")
+        params.append(device_id)
+    if job_id:
+        conds.append("job_id = %s")
+        params.append(job_id)
+    if devices is not None:
+        conds.append("device_id = ANY(%s)")
+        params.append(devices)
+    if jobs is not None:
+        conds.append("job_id = ANY(%s)")
+        params.append(jobs)
+    return "".join(f"and {cond} " for cond in conds), params
+
+
 def get_data_view_result(tboard: TBoard = None, group_by: str = 'device', start_date: date = None,
                          end_date: date = None, device: Device = None, job: Job = None, page: int = 0,
                          devices: List[int] = None, jobs: List[int] = None, ordering: str = 'na_ratio',
                          success_ratio: float = None, fail_ratio: float = None, na_ratio: float = None):
+    """
+    数据统计页面：按device/job分组统计指定条件下Rds的通过/失败/无效数量
+    数据来自按天汇总的RdsDailyStatistics，日期范围内的结果由每日计数求和得到
+    """
     tboard_id: int = tboard.id if tboard else None
     device_id: int = device.id if device else None
     job_id: int = job.id if job else None
-    tboard_cond = f"and tboard_id = {tboard_id} " if tboard_id else ""
-    start_date_cond = f"and start_time >= '{start_date.strftime('%Y-%m-%d %H:%M:%S')}' " if start_date else ""
-    end_date_cond = f"and start_time <= '{end_date.strftime('%Y-%m-%d 23:59:59')}' " if end_date else ""
-    device_id_cond = f"and device_id = {device_id} " if device_id else ""
-    job_id_cond = f"and job_id = {job_id} " if job_id else ""
-    devices_cond = f"and device_id in ({','.join([str(device) for device in devices])}) " if devices is not None else ""
-    jobs_cond = f"and job_id in ({','.join([str(job) for job in jobs])})" if jobs is not None else ""
-
-    success_ratio_cond = f"and round(1.0 * r.success / (r.na + r.fail + r.success), 2) " \
-                         f"{'>' if success_ratio >= 0 else '<'}= {success_ratio if success_ratio > 0 else -success_ratio} " \
-        if success_ratio is not None else ""
-
-    fail_ratio_cond = f"and round(1.0 * r.fail / (r.na + r.fail + r.success), 2) " \
-                      f"{'>' if fail_ratio >= 0 else '<'}= {fail_ratio if fail_ratio > 0 else -fail_ratio} " \
-        if fail_ratio is not None else ""
-
-    na_ratio_cond = f"and round(1.0 * r.na / (r.na + r.fail + r.success), 2) " \
-                    f"{'>' if na_ratio >= 0 else '<'}= {na_ratio if na_ratio > 0 else -na_ratio} " \
-        if na_ratio is not None else ""
+
+    where_cond, params = data_view_conditions(tboard_id, start_date, end_date, device_id, job_id, devices, jobs)
+
+    ratio_conds, ratio_params = [], []
+    for field, ratio in (('success', success_ratio), ('fail', fail_ratio), ('na', na_ratio)):
+        if ratio is None:
+            continue
+        ratio_conds.append(f"and round(1.0 * r.{field} / r.total, 2) {'>' if ratio >= 0 else '<'}= %s ")
+        ratio_params.append(abs(ratio))
 
     sql = f"""
             select
@@ -350,87 +376,53 @@ def get_data_view_result(tboard: TBoard = None, group_by: str = 'device', start_
                 r.na,
                 r.success,
                 r.fail,
-                r.na + r.fail + r.success as total,
+                r.total,
                 CASE
-                when 1.0 * r.na / (r.na + r.fail + r.success) < 0.001 and 1.0 * r.na / (r.na + r.fail + r.success) != 0 then 0.001
-                else round(1.0 * r.na / (r.na + r.fail + r.success), 3) END as na_ratio,
+                when 1.0 * r.na / r.total < 0.001 and r.na != 0 then 0.001
+                else round(1.0 * r.na / r.total, 3) END as na_ratio,
                 CASE
-                when 1.0 * r.fail / (r.na + r.fail + r.success) < 0.001 and 1.0 * r.fail / (r.na + r.fail + r.success) != 0 then 0.001
-                else round(1.0 * r.fail / (r.na + r.fail + r.success), 3) END as fail_ratio,
+                when 1.0 * r.fail / r.total < 0.001 and r.fail != 0 then 0.001
+                else round(1.0 * r.fail / r.total, 3) END as fail_ratio,
                 CASE
-                when 1.0 * r.success / (r.na + r.fail + r.success) < 0.001 and 1.0 * r.success / (r.na + r.fail + r.success) != 0 then 0.001
-                else round(1.0 * r.success / (r.na + r.fail + r.success), 3) END as success_ratio
+                when 1.0 * r.success / r.total < 0.001 and r.success != 0 then 0.001
+                else round(1.0 * r.success / r.total, 3) END as success_ratio
             from
                 (select
-                coalesce(na.{group_by}_id, suc.{group_by}_id, fail.{group_by}_id) as id,
-                coalesce(na.na, 0) as na,
-                coalesce(suc.success, 0) as success,
-                coalesce(fail.fail, 0) as fail
-                from
-                    (select {group_by}_id, count(*) as na
-                    from apiv1_rds
-                    where job_assessment_value!~'^[0-1]$' 
-                    {tboard_cond} 
-                    {start_date_cond}
-                    {end_date_cond}
-                    {device_id_cond}
-                    {job_id_cond}
-                    {devices_cond}
-                    {jobs_cond}
-                    group by {group_by}_id) as na
-                full join
-                    (select {group_by}_id, count(*) as success
-                    from apiv1_rds
-                    where job_assessment_value='0'
-                    {tboard_cond}
-                    {start_date_cond}
-                    {end_date_cond}
-                    {device_id_cond}
-                    {job_id_cond}
-                    {devices_cond}
-                    {jobs_cond}
-                    group by {group_by}_id) as suc
-                on na.{group_by}_id=suc.{group_by}_id
-                full join
-                    (select {group_by}_id, count(*) as fail
-                    from apiv1_rds
-                    where job_assessment_value='1'
-                    {tboard_cond}
-                    {start_date_cond}
-                    {end_date_cond}
-                    {device_id_cond}
-                    {job_id_cond}
-                    {devices_cond}
-                    {jobs_cond}
-                    group by {group_by}_id) as fail
-                on coalesce(na.{group_by}_id, suc.{group_by}_id)=fail.{group_by}_id
-                ) as r
+                {group_by}_id as id,
+                sum(na) as na,
+                sum(success) as success,
+                sum(fail) as fail,
+                sum(na + success + fail) as total
+                from apiv1_rdsdailystatistics
+                where true
+                {where_cond}
+                group by {group_by}_id
+                having sum(na + success + fail) > 0) as r
             left join apiv1_{group_by} as info
             on r.id=info.id
             where true
-            {success_ratio_cond}
-            {fail_ratio_cond}
-            {na_ratio_cond}
+            {"".join(ratio_conds)}
             order by 
             {ordering[1:] if ordering.startswith('-') else ordering} {'DESC' if ordering.startswith('-') else 'ASC'},
             r.id ASC
             limit {COUNT_PER_PAGE}
             offset {COUNT_PER_PAGE} * {page}
             """
+    count_sql = f"""
+            select count(*) from
+                (select {group_by}_id
+                from apiv1_rdsdailystatistics
+                where true
+                {where_cond}
+                group by {group_by}_id
+                having sum(na + success + fail) > 0) as r
+            """
     with connection.cursor() as c:
-        c.execute(sql)
+        c.execute(sql, params + ratio_params)
         ret = c.fetchall()
+        c.execute(count_sql, params)
+        count = math.ceil(c.fetchone()[0] / COUNT_PER_PAGE)
 
-    rds_queryset = Rds.objects.all()
-    rds_queryset = rds_queryset if tboard_id is None else Rds.objects.filter(tboard_id=tboard_id)
-    rds_queryset = rds_queryset if start_date is None else rds_queryset.filter(start_time__gte=start_date)
-    rds_queryset = rds_queryset if end_date is None else rds_queryset.filter(start_time__lte=end_date)
-    rds_queryset = rds_queryset if device_id is None else rds_queryset.filter(device_id=device_id)
-    rds_queryset = rds_queryset if job_id is None else rds_queryset.filter(job_id=job_id)
-    rds_queryset = rds_queryset if devices is None else rds_queryset.filter(device__in=devices)
-    rds_queryset = rds_queryset if jobs is None else rds_queryset.filter(job__in=jobs)
-
-    count = math.ceil(rds_queryset.distinct(f"{group_by}").count() / COUNT_PER_PAGE)
     param = {
         "group_by": group_by,
         "page": page,
@@ -1,5 +1,6 @@
 import re
 
+from django.db import connection
 from rest_framework import generics
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
@@ -8,7 +9,15 @@ from rest_framework.response import Response
 
 from apiv1.core.cache import cache_dcr
 from apiv1.core.constants import REDIS_CACHE_GET_DATA_VIEW_SUMMERY
-from apiv1.module.rds.models import Rds
+from apiv1.module.tboard.views.get_data_view import data_view_conditions
+
+# 由按天汇总的RdsDailyStatistics求和，不需要逐条读取Rds
+DATA_VIEW_SUMMERY_SQL = """
+select coalesce(sum(success), 0), coalesce(sum(fail), 0), coalesce(sum(na), 0)
+from apiv1_rdsdailystatistics
+where true
+{where_cond}
+"""
 
 
 class GetDataViewSummerySerializer(serializers.Serializer):
@@ -44,30 +53,12 @@ class GetDataViewSummeryView(generics.GenericAPIView):
         serializer = self.get_serializer(data=request.query_params)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        rds_queryset = Rds.objects.all()
-        if data["devices"] is not None:
-            rds_queryset = rds_queryset.filter(device__in=data['devices'])
-        if data["start_date"] is not None:
-            rds_queryset = rds_queryset.filter(start_time__gte=data["start_date"])
-        if data["end_date"] is not None:
-            rds_queryset = rds_queryset.filter(start_time__lte=data["end_date"].strftime('%Y-%m-%d 23:59:59'))
-
-        ret = rds_queryset.values_list("job_assessment_value", flat=True)
-        success = fail = na = 0
-
-        for val in ret:
-            try:
-                val = int(val)
-            except (ValueError, TypeError):
-                na += 1
-                continue
-
-            if val == 0:  # pass
-                success += 1
-            elif val == 1:
-                fail += 1
-            else:
-                na += 1
+        where_cond, params = data_view_conditions(
+            start_date=data["start_date"], end_date=data["end_date"], devices=data["devices"]
+        )
+        with connection.cursor() as c:
+            c.execute(DATA_VIEW_SUMMERY_SQL.format(where_cond=where_cond), params)
+            success, fail, na = c.fetchone()
 
         return Response({
             "success": success,
@@ -1,5 +1,6 @@
 from django.urls import path
 
+from apiv1.module.device.consumers import DevicePowerConsumer
 from apiv1.module.system.consumers import LogDeleteConsumer
 from apiv1.module.tboard.consumers import TBoardDeleteConsumer, TBoardDeleteFailConsumer
 
@@ -7,5 +8,7 @@ websocket_urlpatterns = [
     # tboard
     path('ws/tboard/tboard_delete/', TBoardDeleteConsumer),
     path('ws/tboard/tboard_deleted_fail/', TBoardDeleteFailConsumer),
-    path('ws/system/log_delete/', LogDeleteConsumer)
+    path('ws/system/log_delete/', LogDeleteConsumer),
+    # device
+    path('ws/device/device_power/', DevicePowerConsumer)
 ]
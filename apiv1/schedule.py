@@ -7,6 +7,10 @@ celery_app.conf.beat_schedule = {
         'task': 'apiv1.module.job.tasks.periodtasks.delete_expired_job_export_zip',
         'schedule': crontab(hour=7, minute=30)
     },
+    'compact_device_power_temperature': {
+        'task': 'apiv1.module.device.tasks.periodtasks.compact_device_power_temperature',
+        'schedule': crontab(hour=3, minute=0)
+    },
 
 }
 
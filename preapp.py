@@ -4,7 +4,7 @@ from os import path
 
 from PIL import Image
 
-from reef.settings import MEDIA_ROOT, JOB_RES_FILE_EXPORT_PATH
+from reef.settings import MEDIA_ROOT
 
 JOB_ASSETS = f"{MEDIA_ROOT}{os.sep}job_assets{os.sep}"
 if not path.exists(JOB_ASSETS):
@@ -97,5 +97,5 @@ if __name__ == "__main__":
     from apiv1.module.job.models import Job
     from apiv1.module.job.tasks.tasks import update_job_res_file
 
-    if not os.listdir(JOB_RES_FILE_EXPORT_PATH):
-        create_job_res_file_export_zip()
+    # 内容没有变化的job不会重新打包，每次启动都检查，补齐缺少的资源包及manifest
+    create_job_res_file_export_zip()
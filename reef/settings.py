@@ -128,6 +128,11 @@ JOB_RES_FILE_EXPORT = 'job_res_file_export'
 JOB_RES_FILE_EXPORT_PATH = os.path.join(MEDIA_ROOT, JOB_RES_FILE_EXPORT)
 os.makedirs(JOB_RES_FILE_EXPORT_PATH, exist_ok=True)
 
+# job资源文件内容寻址存放位置(sha256 -> 文件)
+JOB_BLOB = 'job_blob'
+JOB_BLOB_ROOT = os.path.join(MEDIA_ROOT, JOB_BLOB)
+os.makedirs(JOB_BLOB_ROOT, exist_ok=True)
+
 # resource excel file space
 RESOURCE_EXCEL_FILE_EXPORT = 'resource_excel_export'
 RESOURCE_EXCEL_FILE_EXPORT_PATH = os.path.join(MEDIA_ROOT, RESOURCE_EXCEL_FILE_EXPORT)
@@ -371,9 +376,11 @@ REST_FRAMEWORK = {
 #####################################################################
 ELASTICSEARCH_DSL = {
     'default': {
-        'hosts': '10.0.0.190:9200'
+        'hosts': os.environ.get('ELASTICSEARCH_HOSTS', '10.0.0.190:9200')
     },
 }
+# 单节点ES(e.g. 本地开发)无法分配副本，可设为0
+ELASTICSEARCH_INDEX_REPLICAS = int(os.environ.get('ELASTICSEARCH_INDEX_REPLICAS', 1))
 
 
 from functools import partial